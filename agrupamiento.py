@@ -0,0 +1,247 @@
+"""
+MediSumma — Agrupamiento de latidos por plantillas
+En un Holter la mayoría de los ~100 000 latidos diarios comparten un puñado
+de morfologías: en lugar de medir cada uno, se alinean en su pico R y se
+correlacionan en bloque contra un conjunto pequeño de plantillas que crece
+según aparecen morfologías nuevas. Cada latido queda asignado a una
+plantilla; la morfología y los intervalos se miden una vez por plantilla
+(la media de sus latidos), y de ahí sale la clase de cada latido:
+
+    N   normal                morfología dominante (o parecida), a su tiempo
+    S   supraventricular      morfología normal pero prematuro
+    V   ventricular           QRS ancho o morfología muy distinta de la dominante
+    X   artefacto             plano, amplitud fuera de escala o sin plantilla
+
+La asignación es un producto de matrices (latidos × muestras) · (muestras ×
+plantillas) por lote; solo la creación de plantillas nuevas es secuencial,
+y afecta a unos pocos latidos.
+"""
+
+import numpy as np
+
+from filtros import filtrar
+from intervalos import medir_intervalos_lote
+
+AGRUP_ANTES_S      = 0.35    # s antes de R en la plantilla (onda P)
+AGRUP_TP_S         = 0.05    # s iniciales de la plantilla: segmento TP
+AGRUP_DESPUES_S    = 0.80    # s después de R (onda T)
+AGRUP_CORR_ANTES_S = 0.10    # ventana que se correlaciona: el QRS y el ST
+AGRUP_CORR_DESPUES_S = 0.20
+AGRUP_CORRELACION  = 0.90    # mínima para asignar un latido a una plantilla
+AGRUP_MAX_PLANTILLAS = 24
+AGRUP_LOTE         = 2048    # latidos por lote de matrices
+AGRUP_RELLENO_S    = 1.0     # s filtrados a cada lado del tramo de un lote
+AGRUP_PREMATURO    = 0.85    # RR previo / RR medio por debajo → prematuro
+AGRUP_RR_LOCAL     = 8       # RR previos del RR medio local
+AGRUP_QRS_ANCHO_MS = 120
+AGRUP_QRS_RELATIVO = 1.25    # QRS ancho: además, × el de la dominante
+AGRUP_CV_REGULAR   = 0.15    # CV de los RR previos: por encima (FA) no hay prematuros
+AGRUP_CORR_VENTRICULAR = 0.70   # con la dominante, por debajo → ventricular
+AGRUP_ESCALA_ARTEFACTO = 4.0    # amplitud frente a la dominante (× o ÷)
+
+CLASES = {"N": "normal", "S": "supraventricular", "V": "ventricular",
+          "X": "artefacto"}
+
+
+class AgrupadorLatidos:
+    """
+    Asignación incremental de latidos a plantillas. agregar(latidos)
+    recibe una matriz (latidos × muestras × canales) de ventanas alineadas
+    en R y devuelve la plantilla de cada uno (−1 si no tiene).
+    """
+
+    def __init__(self, fs: float, n_canales: int = 1):
+        self.fs = fs
+        self.antes = int(round(AGRUP_ANTES_S * fs))
+        self.largo = self.antes + int(round(AGRUP_DESPUES_S * fs))
+        self._corr = slice(self.antes - int(round(AGRUP_CORR_ANTES_S * fs)),
+                           self.antes + int(round(AGRUP_CORR_DESPUES_S * fs)))
+        ancho_corr = (self._corr.stop - self._corr.start) * n_canales
+        self.suma = np.zeros((AGRUP_MAX_PLANTILLAS, self.largo, n_canales))
+        self.cuentas = np.zeros(AGRUP_MAX_PLANTILLAS, dtype=np.int64)
+        self._normalizadas = np.zeros((AGRUP_MAX_PLANTILLAS, ancho_corr))
+        self.n_plantillas = 0
+
+    @staticmethod
+    def _normalizar(x: np.ndarray):
+        """Filas centradas y de norma 1; las planas quedan a cero."""
+        x = x - x.mean(axis=1, keepdims=True)
+        norma = np.linalg.norm(x, axis=1)
+        plana = norma <= 1e-9 * max(1.0, float(norma.max(initial=0.0)))
+        return x / np.where(plana, 1.0, norma)[:, None], plana
+
+    def agregar(self, latidos: np.ndarray) -> np.ndarray:
+        m = len(latidos)
+        xn, plana = self._normalizar(latidos[:, self._corr, :].reshape(m, -1))
+        asignacion = np.full(m, -1, dtype=np.int64)
+        k = self.n_plantillas
+        if k:
+            correlacion = xn @ self._normalizadas[:k].T
+            mejor = np.argmax(correlacion, axis=1)
+            ok = correlacion[np.arange(m), mejor] >= AGRUP_CORRELACION
+            asignacion[ok] = mejor[ok]
+
+        # Morfologías nuevas: el primer latido sin plantilla la inaugura y
+        # se lleva a todos los pendientes que se le parecen
+        pendientes = np.flatnonzero((asignacion < 0) & ~plana)
+        while len(pendientes) and k < AGRUP_MAX_PLANTILLAS:
+            semilla = xn[pendientes[0]]
+            miembros = (xn[pendientes] @ semilla) >= AGRUP_CORRELACION
+            asignacion[pendientes[miembros]] = k
+            self._normalizadas[k] = semilla
+            pendientes = pendientes[~miembros]
+            k += 1
+        self.n_plantillas = k
+
+        # Sumas por plantilla con un producto por la matriz de pertenencia
+        usadas = np.unique(asignacion[asignacion >= 0])
+        if len(usadas):
+            pertenencia = (asignacion[None, :] == usadas[:, None]).astype(np.float64)
+            self.suma[usadas] += np.tensordot(pertenencia, latidos, axes=1)
+            self.cuentas[usadas] += pertenencia.sum(axis=1).astype(np.int64)
+            medias = self.suma[usadas] / self.cuentas[usadas, None, None]
+            self._normalizadas[usadas], _ = self._normalizar(
+                medias[:, self._corr, :].reshape(len(usadas), -1))
+        return asignacion
+
+    @property
+    def plantillas(self) -> np.ndarray:
+        """Latido medio de cada plantilla (plantillas × muestras × canales)."""
+        k = self.n_plantillas
+        return self.suma[:k] / np.maximum(self.cuentas[:k], 1)[:, None, None]
+
+
+def _prematuros(picos: np.ndarray) -> np.ndarray:
+    """
+    Latidos cuyo RR previo queda por debajo de AGRUP_PREMATURO × la media
+    de los AGRUP_RR_LOCAL anteriores, si esos eran regulares (en FA todo
+    sería «prematuro»). Medias y varianzas móviles con sumas acumuladas.
+    """
+    rr = np.diff(picos).astype(np.float64)
+    prematuro = np.zeros(len(picos), dtype=bool)
+    if len(rr) < 2:
+        return prematuro
+    acum = np.concatenate([[0.0], np.cumsum(rr)])
+    acum2 = np.concatenate([[0.0], np.cumsum(rr * rr)])
+    i = np.arange(1, len(rr))
+    desde = np.maximum(0, i - AGRUP_RR_LOCAL)
+    n = i - desde
+    media = (acum[i] - acum[desde]) / n
+    var = np.maximum((acum2[i] - acum2[desde]) / n - media * media, 0.0)
+    regular = np.sqrt(var) <= AGRUP_CV_REGULAR * media
+    prematuro[2:] = (rr[1:] < AGRUP_PREMATURO * media) & regular
+    return prematuro
+
+
+def _medir_plantilla(plantilla: np.ndarray, antes: int, fs: float) -> dict:
+    """
+    Intervalos de una plantilla en su canal de mayor R, con R positiva y
+    referida a la línea isoeléctrica: el segmento TP del principio de la
+    ventana (los primeros AGRUP_TP_S).
+    """
+    tp = plantilla[:max(1, int(AGRUP_TP_S * fs))].mean(axis=0)
+    plantilla = plantilla - tp
+    canal = int(np.argmax(np.abs(plantilla[antes])))
+    senal = plantilla[:, canal] * np.sign(plantilla[antes, canal] or 1.0)
+    lat = medir_intervalos_lote(senal, np.array([antes]), fs)
+    return {
+        "canal":  canal,
+        "senal":  senal,
+        "qrs_ms": float(lat["qrs_ms"][0]),
+        "pr_ms":  float(lat["pr_ms"][0]),
+        "qt_ms":  float(lat["qt_ms"][0]),
+    }
+
+
+def agrupar_latidos(muestras: np.ndarray, picos: np.ndarray, fs: float,
+                    ganancia=None, progreso=None) -> dict:
+    """
+    Agrupa y clasifica los latidos de un registro (vector o matriz muestras
+    × canales, p. ej. el memmap). Lee y filtra por lotes de AGRUP_LOTE
+    latidos, así que la memoria no depende de la duración. Devuelve
+    {plantilla, clase, amplitud} por latido y la lista de plantillas.
+    ganancia: ADC/mV por canal; con ella, la amplitud va en mV.
+    progreso: llamada opcional con las muestras leídas tras cada lote.
+    """
+    muestras = muestras if muestras.ndim == 2 else muestras[:, None]
+    picos = np.asarray(picos, dtype=np.int64)
+    n, n_canales = muestras.shape
+    agrupador = AgrupadorLatidos(fs, n_canales)
+    antes, largo = agrupador.antes, agrupador.largo
+    relleno = int(AGRUP_RELLENO_S * fs)
+    asignacion = np.full(len(picos), -1, dtype=np.int64)
+    amplitud = np.zeros(len(picos))
+    desfase = np.arange(largo) - antes
+    escala = 1.0 / np.broadcast_to(np.asarray(ganancia if ganancia is not None else 1.0,
+                                              dtype=np.float64), (n_canales,))
+
+    for a in range(0, len(picos), AGRUP_LOTE):
+        p = picos[a:a + AGRUP_LOTE]
+        i0 = max(0, int(p[0]) - antes - relleno)
+        i1 = min(n, int(p[-1]) - antes + largo + relleno)
+        bloque = filtrar(np.asarray(muestras[i0:i1], dtype=np.float64),
+                         'band', (0.05, 40), fs, eje=0)
+        idx = np.clip((p - i0)[:, None] + desfase[None, :], 0, len(bloque) - 1)
+        latidos = bloque[idx]                         # latidos × muestras × canales
+        amplitud[a:a + len(p)] = (np.ptp(latidos[:, agrupador._corr, :], axis=1)
+                                  * escala).max(axis=1)
+        asignacion[a:a + len(p)] = agrupador.agregar(latidos)
+        if progreso is not None:
+            progreso(i1)
+
+    plantillas = agrupador.plantillas
+    cuentas = agrupador.cuentas[:agrupador.n_plantillas]
+    clase_plantilla = np.full(len(plantillas), "N", dtype="<U1")
+    descripcion = []
+    if len(plantillas):
+        dominante = int(np.argmax(cuentas))
+        ref = agrupador._normalizadas[dominante]
+        amp_ref = np.ptp(plantillas[dominante][agrupador._corr], axis=0).max()
+        qrs_ref = _medir_plantilla(plantillas[dominante], antes, fs)["qrs_ms"]
+        for k, plantilla in enumerate(plantillas):
+            medida = _medir_plantilla(plantilla, antes, fs)
+            ancho = (medida["qrs_ms"] >= AGRUP_QRS_ANCHO_MS
+                     and not medida["qrs_ms"] < AGRUP_QRS_RELATIVO * qrs_ref)
+            correlacion = float(agrupador._normalizadas[k] @ ref)
+            escala_plantilla = (np.ptp(plantilla[agrupador._corr], axis=0).max()
+                                / (amp_ref or 1.0))
+            if k != dominante and not (1 / AGRUP_ESCALA_ARTEFACTO <= escala_plantilla
+                                       <= AGRUP_ESCALA_ARTEFACTO):
+                clase_plantilla[k] = "X"
+            elif k != dominante and (correlacion < AGRUP_CORR_VENTRICULAR or ancho):
+                clase_plantilla[k] = "V"
+            descripcion.append({**medida, "plantilla": k, "latidos": int(cuentas[k]),
+                                "correlacion_dominante": correlacion,
+                                "escala_dominante": float(escala_plantilla),
+                                "clase": str(clase_plantilla[k])})
+
+    clase = np.full(len(picos), "X", dtype="<U1")
+    asignados = asignacion >= 0
+    clase[asignados] = clase_plantilla[asignacion[asignados]]
+    clase[(clase == "N") & _prematuros(picos)] = "S"
+    return {
+        "plantilla":  asignacion,
+        "clase":      clase,
+        "amplitud":   amplitud,
+        "plantillas": descripcion,
+        "antes":      antes,
+    }
+
+
+def resumir_agrupamiento(grupos: dict, fs: float) -> dict:
+    """Conteos por clase y descripción de las plantillas, para la respuesta."""
+    clase = grupos["clase"]
+    return {
+        "conteo": {nombre: int(np.sum(clase == c)) for c, nombre in CLASES.items()},
+        "plantillas": [
+            {"plantilla":   d["plantilla"],
+             "latidos":     d["latidos"],
+             "clase":       CLASES[d["clase"]],
+             "qrs_ms":      None if np.isnan(d["qrs_ms"]) else int(d["qrs_ms"]),
+             "pr_ms":       None if np.isnan(d["pr_ms"]) else int(d["pr_ms"]),
+             "qt_ms":       None if np.isnan(d["qt_ms"]) else int(d["qt_ms"]),
+             "correlacion_dominante": round(d["correlacion_dominante"], 3),
+             "morfologia":  d.get("morfologia")}
+            for d in grupos["plantillas"]
+        ],
+    }
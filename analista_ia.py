@@ -5,6 +5,8 @@ import scipy.signal as signal
 import cv2
 import os
 
+from extraccion import centroides_columnas, arrastrar_vacios
+
 app = Flask(__name__)
 CORS(app)
 
@@ -51,21 +53,12 @@ def limpiar_y_segmentar(path):
 def extraer_senal_de_recorte(roi):
     """Convierte un pedazo de imagen (una derivada) en datos numéricos"""
     h, w = roi.shape
-    senal = []
-    
-    # Barrido vertical buscando el centro de masa de la tinta
-    for x in range(w):
-        col = roi[:, x]
-        indices = np.where(col > 0)[0]
-        if len(indices) > 0:
-            val = h - np.median(indices) # Invertir eje Y
-            senal.append(val)
-        else:
-            # Interpolación simple si falta un punto
-            senal.append(senal[-1] if len(senal) > 0 else h/2)
-            
+
+    # Mediana de la tinta por columna (todas a la vez); vacíos = último valor
+    medianas, valido = centroides_columnas(roi, "mediana")
+    senal = arrastrar_vacios(h - medianas, valido, h / 2)
+
     # Procesamiento de señal
-    senal = np.array(senal)
     senal = signal.detrend(senal) # Quitar inclinación
     senal = signal.savgol_filter(senal, 11, 3) # Suavizar ruido
     return senal
@@ -5,16 +5,80 @@ Algoritmo: calibración por cuadrícula, extracción de señal multi-derivación
            detección PQRST, intervalos calibrados, diagnóstico con criterios AHA/ESC.
 """
 
-from fastapi import FastAPI, UploadFile, File
+from fastapi import (FastAPI, UploadFile, File, Header, HTTPException, Request,
+                     WebSocket, WebSocketDisconnect)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from typing import List, Literal
+from contextlib import asynccontextmanager
 import numpy as np
-from scipy.signal import find_peaks, butter, filtfilt, savgol_filter
+from scipy.signal import find_peaks, savgol_filter
 from scipy.ndimage import uniform_filter1d
+from scipy.fft import next_fast_len
 import cv2
 import math
+import json
+import hashlib
+import asyncio
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from extraccion import centroides_columnas, interpolar_vacios
+from intervalos import medir_intervalos_lote
+from config import entero_env
+from ejecutor import EjecutorCPU, N_TRABAJADORES
+from holter_stream import (analizar_holter_completo, avanzar_holter, combinar_canales,
+                           AnalizadorHolterStream, HOLTER_BLOQUE_S, HOLTER_PAUSA_S)
+from ingesta import abrir_temporal, descartar
+from formato_holter import (abrir_registro, leer_cabecera, cabecera_crudo,
+                            contar_muestras, DecodificadorIncremental)
+from subidas import LimiteCuerpo, eventos_multipart, SUBIDA_MAX_CAMPO
+from filtros import filtrar, obtener_sos, estadisticas_cache
+from cache_resultados import CacheResultados, huella_codigo
+from codificacion_senal import responder
+from decimacion import decimar_tramo, DECIMACION_MAX
+from qrs import detectar_qrs
+from vfc import analizar_vfc
+from agrupamiento import agrupar_latidos, resumir_agrupamiento
+from estudios import (directorio_provisional, descartar_provisional, guardar_indice,
+                      guardar_senal, publicar, existe, abrir_indice,
+                      ESTUDIOS_MAX_FILAS)
+from trabajos import (ColaTrabajos, AvisoProgreso, TrabajoCancelado,
+                      ESTADOS_FINALES, TRABAJOS_SIMULTANEOS, TRABAJOS_ARRIENDO_S,
+                      TRABAJOS_SONDEO_S)
+from monitor import (SesionMonitor, MONITOR_MAX, MONITOR_MAX_TRAMA,
+                     MONITOR_ASISTOLIA_S, MONITOR_ESTADO_S)
+import metricas
+from metricas import anotar, etapa, tramo, cronometrado, recoger
+
+
+@asynccontextmanager
+async def _ciclo_vida(app: FastAPI):
+    """
+    Arranque y parada del servidor: el pool de análisis y el bucle que
+    reclama los trabajos en segundo plano.
+    """
+    ejecutor.iniciar(_inicializar_trabajador)
+    bucle = asyncio.ensure_future(_bucle_trabajos())
+    try:
+        yield
+    finally:
+        # Los trabajos en curso se retoman cuando vence su arriendo
+        bucle.cancel()
+        try:
+            await bucle
+        except asyncio.CancelledError:
+            pass
+        ejecutor.cerrar()
+
 
-app = FastAPI(title="Cerebro MediSumma v4.0", version="4.0")
+app = FastAPI(title="Cerebro MediSumma v4.0", version="4.0", lifespan=_ciclo_vida)
 
+# Tope de tamaño por ruta (413 temprano); dentro de CORS para que el 413
+# también lleve sus cabeceras
+app.add_middleware(LimiteCuerpo)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -22,6 +86,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if metricas.METRICAS_ACTIVAS:
+    app.middleware("http")(metricas.middleware_tiempos)
 
 print("=== SERVIDOR MEDISUMMA v4.0 — Motor ECG Clínico Avanzado ===")
 
@@ -39,60 +105,144 @@ TARGET_WIDTH     = 2000   # px — ancho de trabajo
 # 1. CALIBRACIÓN: PÍXELES / MM
 # ─────────────────────────────────────────────────────────────────────────────
 
-def calibrar_px_mm(img_gray: np.ndarray) -> float:
+CALIB_MAX_LAG    = 150    # px — lags de autocorrelación evaluados
+CALIB_FALLBACK   = 8.0    # px/mm si la cuadrícula no es detectable
+
+
+def _autocorrelacion_acotada(perfil: np.ndarray, max_lag: int) -> np.ndarray:
     """
-    Detecta la densidad de la cuadrícula ECG mediante autocorrelación.
-    La cuadrícula ECG tiene periodicidad a 1 mm (cuadro pequeño).
-    Devuelve px/mm. Rango esperado: 4–25 px/mm.
+    Autocorrelación de los lags 0..max_lag-1 solamente, vía FFT real.
+    Rellenar a n + max_lag evita el solapamiento circular en esos lags:
+    O(n log n) en vez del O(n²) de np.correlate(mode='full').
     """
-    h, w = img_gray.shape
-    # Usar franja central para evitar bordes y texto
-    y0, y1 = h // 5, 4 * h // 5
-    perfil = np.mean(img_gray[y0:y1, :w // 2].astype(np.float64), axis=0)
-    perfil -= np.mean(perfil)
+    n = len(perfil)
+    nfft = next_fast_len(n + max_lag)
+    espectro = np.fft.rfft(perfil, nfft)
+    return np.fft.irfft(espectro * np.conj(espectro), nfft)[:max_lag]
+
 
+def _periodo_cuadricula(perfil: np.ndarray, referencia: float = None,
+                        escala: float = 1.0) -> tuple:
+    """
+    Periodo de la cuadrícula en un perfil 1D → (px/mm, confianza).
+    La confianza es la autocorrelación normalizada en el periodo elegido
+    (0 = sin cuadrícula, 1 = periodicidad perfecta). Devuelve (None, 0.0)
+    si no hay periodicidad aprovechable.
+    referencia: px/mm del otro eje; descarta lecturas incompatibles con
+    él (ambigüedad 1 mm / 5 mm) salvo que no quede ninguna otra.
+    escala: factor del nivel de pirámide a resolución completa; los
+    periodos se devuelven siempre en px de resolución completa.
+    """
+    perfil = perfil - np.mean(perfil)
     if np.std(perfil) < 1e-3:
-        return 8.0  # fallback
+        return None, 0.0
 
-    # Autocorrelación hasta 150 px
-    max_lag = min(len(perfil) - 1, 150)
-    autocorr = np.correlate(perfil, perfil, mode='full')
-    autocorr = autocorr[len(perfil) - 1: len(perfil) - 1 + max_lag]
+    max_lag = min(len(perfil) - 1, int(CALIB_MAX_LAG / escala))
+    if max_lag < 5:
+        return None, 0.0
+    autocorr = _autocorrelacion_acotada(perfil, max_lag)
     autocorr = autocorr / autocorr[0]  # normalizar
     autocorr[0] = 0  # eliminar lag 0
 
     # Primer pico de autocorrelación = periodo de cuadrícula dominante
     picos, props = find_peaks(autocorr, distance=2, height=0.05)
     if len(picos) == 0:
-        return 8.0
+        return None, 0.0
 
     # Ordenar picos por altura descendente
     ordenados = picos[np.argsort(props['peak_heights'])[::-1]]
 
+    lecturas = []
     for candidato in ordenados:
+        # Refinamiento subpíxel: vértice de la parábola por los 3 lags vecinos
         periodo = float(candidato)
+        if 0 < candidato < max_lag - 1:
+            ym, y0, yp = autocorr[candidato - 1:candidato + 2]
+            denom = ym - 2 * y0 + yp
+            if denom < 0:
+                periodo += 0.5 * (ym - yp) / denom
+        periodo *= escala
+        confianza = float(np.clip(autocorr[candidato], 0.0, 1.0))
         # Si el periodo encaja con 1 mm pequeño (4–20 px) → directo
         if 4.0 <= periodo <= 20.0:
-            return periodo
+            lecturas.append((periodo, confianza))
         # Si encaja con 5 mm grande (20–100 px) → dividir entre 5
-        if 20.0 < periodo <= 100.0:
+        elif 20.0 < periodo <= 100.0:
             px_per_mm = periodo / 5.0
             if 4.0 <= px_per_mm <= 20.0:
-                return px_per_mm
+                lecturas.append((px_per_mm, confianza))
 
-    return 8.0  # fallback seguro
+    if not lecturas:
+        return None, 0.0
+    if referencia:
+        compatibles = [l for l in lecturas if 0.6 <= l[0] / referencia <= 1.6]
+        if compatibles:
+            return compatibles[0]
+    return lecturas[0]
+
+
+def calibrar_cuadricula(img_gray: np.ndarray, escala: float = 1.0) -> dict:
+    """
+    Calibración independiente de ambos ejes de la cuadrícula ECG.
+    Eje X (tiempo): perfil de columnas → px/mm horizontal (25 mm/s).
+    Eje Y (amplitud): perfil de filas → px/mm vertical (10 mm/mV).
+    En fotos tomadas en ángulo los dos ejes difieren; si uno no es
+    detectable se asume píxel cuadrado con confianza 0 en ese eje.
+    img_gray puede ser un nivel reducido de la pirámide (escala = 2, 4…):
+    el resultado se expresa siempre en px/mm de resolución completa.
+    """
+    h, w = img_gray.shape
+    # Usar franja central para evitar bordes y texto
+    y0, y1 = h // 5, 4 * h // 5
+    x0, x1 = w // 5, 4 * w // 5
+    perfil_x = np.mean(img_gray[y0:y1, :w // 2], axis=0, dtype=np.float64)
+    # Las líneas horizontales recorren todo el ancho: basta 1 de cada 4 columnas
+    perfil_y = np.mean(img_gray[:, x0:x1:4], axis=1, dtype=np.float64)
+
+    px_x, conf_x = _periodo_cuadricula(perfil_x, escala=escala)
+    px_y, conf_y = _periodo_cuadricula(perfil_y, referencia=px_x, escala=escala)
+
+    if px_x is None:
+        px_x = px_y if px_y is not None else CALIB_FALLBACK
+    if px_y is None:
+        px_y = px_x
+
+    return {
+        "px_mm_x":     round(float(px_x), 3),
+        "px_mm_y":     round(float(px_y), 3),
+        "confianza_x": round(conf_x, 3),
+        "confianza_y": round(conf_y, 3),
+    }
+
+
+def calibrar_px_mm(img_gray: np.ndarray) -> float:
+    """
+    Detecta la densidad de la cuadrícula ECG mediante autocorrelación.
+    La cuadrícula ECG tiene periodicidad a 1 mm (cuadro pequeño).
+    Devuelve px/mm del eje de tiempo. Rango esperado: 4–25 px/mm.
+    """
+    return calibrar_cuadricula(img_gray)["px_mm_x"]
+
+
+def px_a_mv(valor_px: float, px_mm_y: float) -> float:
+    """Convierte una amplitud en píxeles a mV con la calibración vertical."""
+    return float(valor_px) / (px_mm_y * ECG_GAIN)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 2. PREPROCESAMIENTO Y EXTRACCIÓN DE TRAZA
 # ─────────────────────────────────────────────────────────────────────────────
 
-def eliminar_cuadricula(bin_img: np.ndarray, px_mm: float) -> np.ndarray:
+def eliminar_cuadricula(bin_img: np.ndarray, px_mm: float,
+                        px_mm_y: float = None) -> np.ndarray:
     """
     Elimina las líneas de cuadrícula del ECG binarizado.
     Las líneas de cuadrícula son estructuras lineales de 1 px de grosor.
     La traza ECG es más gruesa (2–6 px) y curvilínea.
+    px_mm_y: calibración vertical (por defecto igual a la horizontal).
     """
+    if px_mm_y is None:
+        px_mm_y = px_mm
     # Detectar líneas horizontales largas
     k_h = cv2.getStructuringElement(
         cv2.MORPH_RECT, (max(3, int(px_mm * 2)), 1))
@@ -100,7 +250,7 @@ def eliminar_cuadricula(bin_img: np.ndarray, px_mm: float) -> np.ndarray:
 
     # Detectar líneas verticales largas
     k_v = cv2.getStructuringElement(
-        cv2.MORPH_RECT, (1, max(3, int(px_mm * 2))))
+        cv2.MORPH_RECT, (1, max(3, int(px_mm_y * 2))))
     lineas_v = cv2.morphologyEx(bin_img, cv2.MORPH_OPEN, k_v)
 
     # Cuadrícula = unión de líneas h y v, dilatadas ligeramente
@@ -117,18 +267,21 @@ def eliminar_cuadricula(bin_img: np.ndarray, px_mm: float) -> np.ndarray:
     return traza
 
 
-def preprocesar_ecg(img_gray: np.ndarray, px_mm: float):
+def preprocesar_ecg(img_gray: np.ndarray, px_mm: float, px_mm_y: float = None,
+                    teselas: tuple = (8, 8)):
     """
     Pipeline completo:
     1. CLAHE para compensar iluminación desigual de foto
     2. Umbral adaptativo local (robusto vs flash/sombras)
     3. Eliminación de cuadrícula
     Devuelve imagen binaria (traza = 255, fondo = 0).
+    teselas: rejilla CLAHE (columnas, filas); en recortes de banda se reduce
+    el nº de filas para conservar el tamaño de tesela de la imagen completa.
     """
     h, w = img_gray.shape
 
     # CLAHE
-    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=teselas)
     img_eq = clahe.apply(img_gray)
 
     # Suavizado leve para reducir ruido antes del umbral
@@ -142,10 +295,123 @@ def preprocesar_ecg(img_gray: np.ndarray, px_mm: float):
         cv2.THRESH_BINARY_INV,
         block, 8)
 
-    traza = eliminar_cuadricula(bin_img, px_mm)
+    traza = eliminar_cuadricula(bin_img, px_mm, px_mm_y)
     return traza
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# 2b. PIRÁMIDE MULTI-RESOLUCIÓN
+# ─────────────────────────────────────────────────────────────────────────────
+# Calibración y localización de las franjas de trazado en un nivel reducido;
+# umbral y limpieza de cuadrícula a resolución completa solo dentro de ellas.
+
+# MEDISUMMA_PIRAMIDE: niveles de reducción ×2 (0 = todo a resolución completa)
+PIRAMIDE_NIVELES = entero_env("MEDISUMMA_PIRAMIDE", 1)
+CALIB_MIN_PERIODO_NIVEL = 4.0   # px — cuadro pequeño mínimo resoluble en un nivel
+
+
+def construir_piramide(img_gray: np.ndarray, niveles: int = PIRAMIDE_NIVELES) -> list:
+    """[resolución completa, 1/2, 1/4, …] con cv2.pyrDown (Gauss + diezmado)."""
+    piramide = [img_gray]
+    for _ in range(niveles):
+        if min(piramide[-1].shape) < 200:
+            break
+        piramide.append(cv2.pyrDown(piramide[-1]))
+    return piramide
+
+
+def calibrar_piramide(piramide: list) -> dict:
+    """
+    Calibración de grueso a fino: se calibra en el nivel más reducido en el
+    que el cuadro pequeño aún mide ≥ CALIB_MIN_PERIODO_NIVEL px y la lectura
+    del eje X se confirma y afina a resolución completa con el perfil de una
+    franja central de h/8 filas contiguas (contiguas: un muestreo con paso
+    fijo puede caer siempre sobre las líneas horizontales). Si el nivel no
+    la resuelve — cuadrícula fina que el diezmado confunde con un múltiplo —
+    se baja al siguiente nivel.
+    """
+    img = piramide[0]
+    h, w = img.shape
+    perfil_fino = None
+    for nivel in range(len(piramide) - 1, 0, -1):
+        escala = 2 ** nivel
+        calib = calibrar_cuadricula(piramide[nivel], escala)
+        periodo_nivel = min(calib["px_mm_x"], calib["px_mm_y"]) / escala
+        if calib["confianza_x"] == 0 or periodo_nivel < CALIB_MIN_PERIODO_NIVEL:
+            continue
+        if perfil_fino is None:
+            perfil_fino = np.mean(img[7 * h // 16:9 * h // 16, :w // 2],
+                                  axis=0, dtype=np.float64)
+        fino, _ = _periodo_cuadricula(perfil_fino)
+        if fino is not None and abs(fino / calib["px_mm_x"] - 1) < 0.1:
+            calib["px_mm_x"] = round(float(fino), 3)
+            return calib
+    return calibrar_cuadricula(img)
+
+
+def bandas_tinta(nivel: np.ndarray, px_mm_y: float, margen_mm: float = 4.0) -> list:
+    """
+    Franjas horizontales con tinta en un nivel reducido (coordenadas del
+    nivel). La proyección de oscuridad por fila se suaviza sobre 5 mm — un
+    cuadro grande —, con lo que la modulación periódica de la cuadrícula se
+    anula y solo sobresalen las filas de trazado. Cada franja se amplía
+    margen_mm por arriba y por abajo; las que se solapan se funden.
+    """
+    h = nivel.shape[0]
+    proyeccion = 255.0 - np.mean(nivel, axis=1)
+    suave = uniform_filter1d(proyeccion, size=max(5, int(px_mm_y * 5)))
+    fondo = np.percentile(suave, 20)
+    pico = np.max(suave)
+    if pico - fondo < 1.0:
+        return []
+    activo = suave > fondo + 0.1 * (pico - fondo)
+
+    cambios = np.diff(np.concatenate([[0], activo.astype(np.int8), [0]]))
+    inicios = np.flatnonzero(cambios == 1)
+    fines = np.flatnonzero(cambios == -1)
+    margen = int(np.ceil(px_mm_y * margen_mm))
+    bandas = []
+    for a, b in zip(inicios, fines):
+        if b - a < px_mm_y * 2:
+            continue
+        a, b = max(0, a - margen), min(h, b + margen)
+        if bandas and a <= bandas[-1][1]:
+            bandas[-1] = (bandas[-1][0], b)
+        else:
+            bandas.append((int(a), int(b)))
+    return bandas
+
+
+def preprocesar_por_bandas(piramide: list, px_mm: float, px_mm_y: float):
+    """
+    Localiza en el nivel más reducido las franjas con trazado, las lleva a
+    resolución completa y solo ahí aplica CLAHE, umbral adaptativo y
+    eliminación de cuadrícula; fuera de ellas la imagen binaria queda a 0.
+    detectar_filas afina después los límites de las filas sobre esa imagen
+    (una proyección, barata). Devuelve (traza_bin completa, nº de filas
+    de imagen efectivamente analizadas).
+    """
+    img = piramide[0]
+    h = img.shape[0]
+    bandas = []
+    if len(piramide) > 1:
+        escala = 2 ** (len(piramide) - 1)
+        bandas = [(min(h, a * escala), min(h, b * escala))
+                  for a, b in bandas_tinta(piramide[-1], px_mm_y / escala)]
+
+    alto_bandas = sum(b - a for a, b in bandas)
+    if not bandas or alto_bandas > 0.9 * h:
+        return preprocesar_ecg(img, px_mm, px_mm_y), h
+
+    traza_bin = np.zeros_like(img)
+    for y0, y1 in bandas:
+        # Misma altura de tesela CLAHE que en la imagen completa
+        filas_tesela = max(1, int(round(8 * (y1 - y0) / h)))
+        traza_bin[y0:y1] = preprocesar_ecg(img[y0:y1], px_mm, px_mm_y,
+                                           teselas=(8, filas_tesela))
+    return traza_bin, alto_bandas
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 3. SEGMENTACIÓN DE FILAS / DERIVACIONES
 # ─────────────────────────────────────────────────────────────────────────────
@@ -155,6 +421,7 @@ def detectar_filas(traza_bin: np.ndarray, px_mm: float) -> list:
     Detecta las bandas verticales con contenido de traza ECG.
     ECG estándar 12 derivaciones: 4 filas (3 de 4 derivaciones + tira ritmo).
     Devuelve lista de (y0, y1) de hasta 4 filas, ordenadas de arriba a abajo.
+    px_mm: calibración vertical (eje de amplitud).
     """
     h, w = traza_bin.shape
 
@@ -214,29 +481,10 @@ def extraer_senal_franja(traza_bin: np.ndarray, y0: int, y1: int,
         x1 = traza_bin.shape[1]
     franja = traza_bin[y0:y1, x0:x1]
     mh = franja.shape[0]
-    w  = franja.shape[1]
-
-    senal = np.zeros(w, dtype=np.float64)
-    valido = np.zeros(w, dtype=bool)
-    ultimo = mh / 2.0
-
-    for col in range(w):
-        col_data = franja[:, col]
-        pixeles = np.where(col_data > 0)[0]
-        if len(pixeles) >= 1:
-            y = float(np.mean(pixeles))
-            senal[col] = y
-            valido[col] = True
-            ultimo = y
-        else:
-            senal[col] = ultimo
 
-    # Interpolar columnas vacías
-    if not np.all(valido):
-        indices = np.arange(w)
-        validos_idx = indices[valido]
-        if len(validos_idx) >= 2:
-            senal = np.interp(indices, validos_idx, senal[valido])
+    # Centroides de todas las columnas en una pasada; interpolar vacíos
+    senal, valido = centroides_columnas(franja, "media")
+    senal = interpolar_vacios(senal, valido, mh / 2.0)
 
     # Invertir: centroide bajo = pico alto
     senal = (mh / 2.0) - senal
@@ -258,8 +506,9 @@ def extraer_senal_franja(traza_bin: np.ndarray, y0: int, y1: int,
 
 def detectar_picos_r(senal: np.ndarray, fs: float) -> np.ndarray:
     """
-    Detección robusta de picos R con umbral adaptativo.
-    fs en px/s (= px_mm × 25).
+    Picos R de una señal completa con el detector en línea (qrs.DetectorQRS).
+    fs en px/s (= px_mm × 25), o Hz en Holter. Con una matriz (muestras ×
+    canales) se filtra cada canal y se detecta sobre su combinación.
     """
     if len(senal) < int(fs * 0.3):
         return np.array([], dtype=int)
@@ -267,26 +516,12 @@ def detectar_picos_r(senal: np.ndarray, fs: float) -> np.ndarray:
     # Eliminar línea de base lenta con filtro pasa-alto
     if len(senal) > 60:
         try:
-            b, a = butter(2, 0.5 / (fs / 2), btype='high')
-            senal_filt = filtfilt(b, a, senal)
+            senal_filt = filtrar(senal, 'high', 0.5, fs, eje=0)
         except Exception:
-            senal_filt = senal - uniform_filter1d(senal, size=int(fs * 0.5))
+            senal_filt = senal - uniform_filter1d(senal, size=int(fs * 0.5), axis=0)
     else:
         senal_filt = senal
-
-    # Umbral: percentil 75 × 0.5 (adaptativo)
-    umbral = np.percentile(senal_filt, 75) * 0.5
-    dist_min = max(3, int(0.25 * fs))  # 250 ms mínimo entre latidos
-
-    picos, props = find_peaks(senal_filt, height=umbral,
-                              distance=dist_min, prominence=0.1 * np.std(senal_filt))
-
-    # Si muy pocos picos, bajar umbral
-    if len(picos) < 2:
-        umbral2 = np.percentile(senal_filt, 60) * 0.3
-        picos, _ = find_peaks(senal_filt, height=umbral2, distance=dist_min)
-
-    return picos
+    return detectar_qrs(combinar_canales(senal_filt), fs)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -298,96 +533,29 @@ def medir_intervalos(senal: np.ndarray, picos: np.ndarray,
     """
     Mide con precisión PR, QRS, QT, QTc y ST.
     Detecta onda P antes del QRS e onda T después.
-    fs en px/s.
+    fs en px/s. Todos los latidos se miden en bloque (intervalos.py);
+    "por_latido" conserva los arrays individuales además de las medianas.
     """
     if len(picos) < 1:
         return _intervalos_fallback()
 
-    qrs_list, pr_list, qt_list, st_list = [], [], [], []
-    p_detectadas = 0
+    lat = medir_intervalos_lote(senal, picos, fs)
+    qrs_list = lat["qrs_ms"][~np.isnan(lat["qrs_ms"])]
+    pr_list  = lat["pr_ms"][~np.isnan(lat["pr_ms"])]
+    qt_list  = lat["qt_ms"][~np.isnan(lat["qt_ms"])]
+    st_list  = lat["st_delta"][~np.isnan(lat["st_delta"])]
+    p_detectadas = len(pr_list)
 
-    for p in picos:
-        amp_r = float(senal[p])
-        if amp_r <= 0:
-            continue
-        umbral_15pct = 0.15 * amp_r
-
-        # ── Inicio y fin QRS ──────────────────────────────────────────────
-        ini_qrs = p
-        for i in range(p - 1, max(0, p - int(0.12 * fs)), -1):
-            if senal[i] <= umbral_15pct:
-                ini_qrs = i
-                break
+    qrs_ms = int(np.median(qrs_list)) if len(qrs_list) else 90
 
-        fin_qrs = p
-        for i in range(p + 1, min(len(senal) - 1, p + int(0.12 * fs))):
-            if senal[i] <= umbral_15pct:
-                fin_qrs = i
-                break
-
-        dur_qrs = int(round((fin_qrs - ini_qrs) / fs * 1000))
-        if 30 <= dur_qrs <= 250:
-            qrs_list.append(dur_qrs)
-
-        # ── Onda P (120–220 ms antes del inicio QRS) ──────────────────────
-        vp0 = max(0, ini_qrs - int(0.22 * fs))
-        vp1 = max(0, ini_qrs - int(0.06 * fs))
-        if vp1 - vp0 >= 5:
-            seg_p = senal[vp0:vp1]
-            picos_p, _ = find_peaks(seg_p,
-                                    height=max(0.05 * amp_r, 0.0),
-                                    distance=max(2, int(0.03 * fs)))
-            if len(picos_p) > 0:
-                mejor_p = picos_p[np.argmax(seg_p[picos_p])]
-                pr_ms = int(round((ini_qrs - (vp0 + mejor_p)) / fs * 1000))
-                if 60 <= pr_ms <= 400:
-                    pr_list.append(pr_ms)
-                    p_detectadas += 1
-
-        # ── Onda T y fin QT ───────────────────────────────────────────────
-        vt0 = fin_qrs + max(1, int(0.05 * fs))  # saltar ST isoelectrico
-        vt1 = min(len(senal) - 1, p + int(0.60 * fs))
-        if vt1 - vt0 >= 5:
-            seg_t = senal[vt0:vt1]
-            amp_abs = np.abs(seg_t)
-            if np.max(amp_abs) >= 0.05 * amp_r:
-                pico_t_local = int(np.argmax(amp_abs))
-                pos_t = vt0 + pico_t_local
-
-                # Fin T: donde la señal regresa a baseline (dentro de 200 ms post-T)
-                baseline = float(np.mean(senal[max(0, ini_qrs - int(0.15 * fs)):
-                                              max(1, ini_qrs - int(0.05 * fs))])) \
-                           if ini_qrs > int(0.15 * fs) else 0.0
-                fin_t = pos_t
-                for j in range(pos_t, min(len(senal) - 1, pos_t + int(0.20 * fs))):
-                    if abs(senal[j] - baseline) < 0.08 * amp_r:
-                        fin_t = j
-                        break
-
-                qt_ms = int(round((fin_t - ini_qrs) / fs * 1000))
-                if 200 <= qt_ms <= 750:
-                    qt_list.append(qt_ms)
-
-        # ── Segmento ST (en J+80 ms) ─────────────────────────────────────
-        j80 = fin_qrs + int(0.08 * fs)
-        if j80 < len(senal):
-            tp_inicio = max(0, ini_qrs - int(0.20 * fs))
-            tp_fin    = max(1, ini_qrs - int(0.06 * fs))
-            if tp_fin > tp_inicio:
-                baseline_tp = float(np.mean(senal[tp_inicio:tp_fin]))
-                delta_st = float(senal[j80] - baseline_tp)
-                st_list.append(delta_st)
-
-    qrs_ms = int(np.median(qrs_list)) if qrs_list else 90
-
-    if pr_list:
+    if len(pr_list):
         pr_ms = int(np.median(pr_list))
     else:
         rr_ms = _rr_medio_ms(picos, fs)
         pr_ms = max(120, min(220, int(rr_ms * 0.20)))
 
-    qt_ms = int(np.median(qt_list)) if qt_list else 400
-    st_delta = float(np.median(st_list)) if st_list else 0.0
+    qt_ms = int(np.median(qt_list)) if len(qt_list) else 400
+    st_delta = float(np.median(st_list)) if len(st_list) else 0.0
 
     return {
         "qrs_ms":        qrs_ms,
@@ -395,6 +563,7 @@ def medir_intervalos(senal: np.ndarray, picos: np.ndarray,
         "qt_ms":         qt_ms,
         "st_delta":      round(st_delta, 4),
         "p_detectadas":  p_detectadas,
+        "por_latido":    lat,
     }
 
 
@@ -428,11 +597,63 @@ LEAD_LAYOUT = [
 ]
 
 
+HILOS_DERIVACIONES = entero_env(
+    "MEDISUMMA_HILOS_DERIV", max(1, (os.cpu_count() or 1) // N_TRABAJADORES), minimo=1)
+
+_pool_derivaciones = None
+_pool_pid = None
+
+
+def _pool_hilos():
+    """Pool de hilos por proceso: se crea tras el fork, nunca se hereda."""
+    global _pool_derivaciones, _pool_pid
+    if _pool_derivaciones is None or _pool_pid != os.getpid():
+        _pool_derivaciones = ThreadPoolExecutor(
+            max_workers=HILOS_DERIVACIONES, thread_name_prefix="medisumma-lead")
+        _pool_pid = os.getpid()
+    return _pool_derivaciones
+
+
+def _analizar_lead(traza_bin, y0, y1, x0, x1, fs_eq, lead_name):
+    """
+    Extracción, picos R y morfología de una celda.
+    Devuelve (descripción | None, amplitud neta | None, ms empleados).
+    """
+    t0 = time.perf_counter()
+    senal = extraer_senal_franja(traza_bin, y0, y1, x0, x1)
+    if len(senal) < 10:
+        return None, None, (time.perf_counter() - t0) * 1000
+
+    picos = detectar_picos_r(senal, fs_eq)
+    if len(picos) == 0:
+        return "No evaluable", 0.0, (time.perf_counter() - t0) * 1000
+
+    # Amplitud neta QRS (R máx - S mín)
+    amp_r = float(np.median([senal[p] for p in picos]))
+    amp_s = float(np.min(senal))
+    net_amp = amp_r - amp_s if amp_s < 0 else amp_r
+
+    # Morfología simplificada
+    desc = _morfologia_lead(senal, picos, fs_eq, lead_name)
+    return desc, net_amp, (time.perf_counter() - t0) * 1000
+
+
+def _analizar_tira(traza_bin, y0, y1, fs_eq):
+    t0 = time.perf_counter()
+    senal_r = extraer_senal_franja(traza_bin, y0, y1)
+    picos_r = detectar_picos_r(senal_r, fs_eq)
+    return senal_r, picos_r, (time.perf_counter() - t0) * 1000
+
+
 def analizar_derivaciones(traza_bin: np.ndarray, filas: list,
-                           px_mm: float) -> dict:
+                           px_mm: float, tiempos: dict = None) -> dict:
     """
     Extrae y analiza cada derivación del ECG.
     Retorna dict con hallazgos por derivación y amplitudes para cálculo de eje.
+    Las 12 celdas y la tira de ritmo son independientes: con
+    MEDISUMMA_HILOS_DERIV > 1 se analizan en paralelo (NumPy/SciPy liberan
+    el GIL) y los resultados se ensamblan en el orden fijo de LEAD_LAYOUT.
+    tiempos: dict opcional que recibe los ms empleados por derivación.
     """
     fs_eq = px_mm * ECG_PAPER_SPEED  # px/s calibrado
     w = traza_bin.shape[1]
@@ -441,48 +662,41 @@ def analizar_derivaciones(traza_bin: np.ndarray, filas: list,
     analisis = {}
     amplitudes = {}  # {lead_name: net_amplitude} para eje
 
+    celdas = []
     for fila_idx, (y0, y1) in enumerate(filas[:3]):  # 3 filas de derivaciones
-        leads_fila = LEAD_LAYOUT[fila_idx]
-
-        for col_idx, lead_name in enumerate(leads_fila):
-            x0 = col_idx * ancho_col
-            x1 = (col_idx + 1) * ancho_col
-
-            senal = extraer_senal_franja(traza_bin, y0, y1, x0, x1)
-            if len(senal) < 10:
-                continue
-
-            picos = detectar_picos_r(senal, fs_eq)
-
-            if len(picos) == 0:
-                analisis[lead_name] = "No evaluable"
-                amplitudes[lead_name] = 0.0
-                continue
-
-            # Amplitud neta QRS (R máx - S mín)
-            amp_r = float(np.median([senal[p] for p in picos]))
-            amp_s = float(np.min(senal))
-            net_amp = amp_r - amp_s if amp_s < 0 else amp_r
-            amplitudes[lead_name] = net_amp
-
-            # Morfología simplificada
-            desc = _morfologia_lead(senal, picos, fs_eq, lead_name)
-            analisis[lead_name] = desc
+        for col_idx, lead_name in enumerate(LEAD_LAYOUT[fila_idx]):
+            celdas.append((traza_bin, y0, y1, col_idx * ancho_col,
+                           (col_idx + 1) * ancho_col, fs_eq, lead_name))
+
+    # Tira de ritmo (fila 4) o, si falta, primera derivación disponible
+    y0r, y1r = filas[3] if len(filas) >= 4 else filas[0]
+
+    if HILOS_DERIVACIONES > 1:
+        pool = _pool_hilos()
+        futuro_tira = pool.submit(_analizar_tira, traza_bin, y0r, y1r, fs_eq)
+        resultados = list(pool.map(lambda c: _analizar_lead(*c), celdas))
+        senal_r, picos_r, ms_tira = futuro_tira.result()
+    else:
+        resultados = [_analizar_lead(*c) for c in celdas]
+        senal_r, picos_r, ms_tira = _analizar_tira(traza_bin, y0r, y1r, fs_eq)
+
+    for celda, (desc, net_amp, ms) in zip(celdas, resultados):
+        lead_name = celda[-1]
+        if tiempos is not None:
+            tiempos[lead_name] = round(ms, 2)
+        if desc is None:
+            continue
+        analisis[lead_name] = desc
+        amplitudes[lead_name] = net_amp
 
-    # Tira de ritmo (fila 4)
+    if tiempos is not None:
+        tiempos["II (tira)"] = round(ms_tira, 2)
     if len(filas) >= 4:
-        y0r, y1r = filas[3]
-        senal_r = extraer_senal_franja(traza_bin, y0r, y1r)
-        picos_r = detectar_picos_r(senal_r, fs_eq)
         fc_r = _calcular_fc(picos_r, fs_eq)
         regular_r = _es_regular(picos_r)
         analisis["II (tira)"] = (
             f"FC {fc_r} lpm — {'regular' if regular_r else 'IRREGULAR'}"
         )
-    else:
-        # Usar primera derivación disponible para tira de ritmo
-        senal_r = extraer_senal_franja(traza_bin, filas[0][0], filas[0][1])
-        picos_r = detectar_picos_r(senal_r, fs_eq)
 
     return analisis, amplitudes, senal_r, picos_r
 
@@ -782,41 +996,388 @@ def diagnosticar_clinico(fc, regular, qrs_ms, pr_ms, qt_ms, qtc_ms,
 # ─────────────────────────────────────────────────────────────────────────────
 
 def butter_bandpass(lowcut, highcut, fs, order=2):
-    nyq = fs / 2
-    b, a = butter(order, [lowcut / nyq, highcut / nyq], btype='band')
-    return b, a
+    """Pasa-banda Butterworth como SOS, desde el banco de filtros cacheado."""
+    return obtener_sos('band', (lowcut, highcut), fs, order)
+
+
+BANDA_ECG = (0.5, 40)
 
 
 def filtrar_ecg(senal, fs=500):
     if len(senal) < 30:
         return senal
-    b, a = butter_bandpass(0.5, 40, fs)
-    return filtfilt(b, a, senal)
+    return filtrar(senal, 'band', BANDA_ECG, fs, eje=0)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
 # ENDPOINTS
 # ─────────────────────────────────────────────────────────────────────────────
 
+HOLTER_SEGUIR_MAX_BLOQUES = 8     # bloques decodificados en espera antes de frenar la subida
+HOLTER_SEGUIR_ESPERA_S    = 10.0  # s — espera de hueco para el análisis final de una subida ya recibida
+
+ejecutor = EjecutorCPU()
+
+# Versión del motor para la caché: versión de la API + huella del código fuente
+_DIR_MOTOR = os.path.dirname(os.path.abspath(__file__))
+MOTOR_VERSION = app.version + "+" + huella_codigo(*[
+    os.path.join(_DIR_MOTOR, m) for m in
+    ("api_medica.py", "extraccion.py", "holter_stream.py", "filtros.py",
+     "intervalos.py", "formato_holter.py", "qrs.py", "decimacion.py",
+     "vfc.py", "agrupamiento.py", "estudios.py")])
+cache = CacheResultados(MOTOR_VERSION)
+
+
+def _inicializar_trabajador():
+    """Un hilo OpenCV por trabajador: el paralelismo lo aporta el pool."""
+    cv2.setNumThreads(1)
+
+
 @app.get("/")
 def home():
     return {"estado": "En línea", "version": "4.0",
-            "mensaje": "MediSumma Brain v4.0 — Motor ECG Clínico Avanzado"}
-
+            "mensaje": "MediSumma Brain v4.0 — Motor ECG Clínico Avanzado",
+            "cache_filtros": estadisticas_cache(),
+            "cache_resultados": cache.estadisticas()}
+
+
+if metricas.METRICAS_ACTIVAS:
+    @app.get("/metrics", include_in_schema=False)
+    def exponer_metricas():
+        """Exposición Prometheus de este worker (tiempos, cola, cachés)."""
+        filtros = estadisticas_cache()
+        resultados = cache.estadisticas()
+        texto = metricas.exponer({
+            "medisumma_cola_pendientes": (
+                "gauge", "Análisis admitidos (en ejecución + en espera)",
+                ejecutor.pendientes),
+            "medisumma_cola_en_espera": (
+                "gauge", "Análisis esperando un trabajador libre",
+                ejecutor.en_cola),
+            "medisumma_cola_capacidad": (
+                "gauge", "Trabajadores + cola máxima", ejecutor.capacidad),
+            "medisumma_rechazadas_total": (
+                "counter", "Peticiones rechazadas con 503 por cola llena",
+                ejecutor.rechazadas),
+            "medisumma_cache_filtros_aciertos_total": (
+                "counter", "Aciertos de la caché de diseños de filtro",
+                filtros["aciertos"]),
+            "medisumma_cache_filtros_fallos_total": (
+                "counter", "Fallos de la caché de diseños de filtro",
+                filtros["fallos"]),
+            "medisumma_cache_resultados_aciertos_total": (
+                "counter", "Aciertos de la caché de resultados",
+                resultados["aciertos_memoria"] + resultados["aciertos_disco"]),
+            "medisumma_cache_resultados_fallos_total": (
+                "counter", "Fallos de la caché de resultados",
+                resultados["fallos"]),
+        })
+        return PlainTextResponse(texto, media_type="text/plain; version=0.0.4")
+
+
+_FORMULARIO_HOLTER = {"requestBody": {"required": True, "content": {
+    "multipart/form-data": {"schema": {
+        "type": "object", "required": ["file"],
+        "properties": {"file":     {"type": "string", "format": "binary"},
+                       "cabecera": {"type": "string", "format": "binary"}}}}}}}
+
+
+def _puntos_vista(puntos: int) -> int:
+    """`puntos` pedidos, acotados a lo que admite el Decimador (2..DECIMACION_MAX)."""
+    return max(2, min(puntos, DECIMACION_MAX))
+
+
+@app.post("/analizar_holter", openapi_extra=_FORMULARIO_HOLTER)
+async def analizar_holter(request: Request, completo: bool = False,
+                          canales: int = 1, fs: float = 500,
+                          senal: Literal["json", "f32", "i16"] = "json",
+                          puntos: int = 0, desde_s: float = 0.0,
+                          hasta_s: float = None,
+                          decimacion: Literal["minmax", "lttb"] = "minmax",
+                          accept: str = Header("")):
+    """
+    Analiza un registro Holter multicanal (multipart: file [+ cabecera]).
+    cabecera: .hea WFDB opcional (formato 16 o 212, canales, fs, ganancia);
+              sin ella, `file` es int16 intercalado con `canales` canales a `fs` Hz.
+    completo=false → primeros 10 s (respuesta rápida).
+    completo=true  → estudio entero por bloques, con resumen de latidos,
+                     FC mín/media/máx y pausas. El análisis avanza en el
+                     pool por bloques de HOLTER_BLOQUE_S según llega `file`
+                     (envía la cabecera antes que el archivo para
+                     aprovecharlo).
+    puntos>0 → senal_grafica es el tramo [desde_s, hasta_s) del primer canal
+               (por defecto, el estudio entero) decimado a `puntos` puntos
+               con `decimacion` (minmax | lttb), con sus instantes en
+               senal_tiempos_s; sin él, las primeras 2000 muestras.
+    senal / Accept: codificación de senal_grafica (ver codificacion_senal.py).
+    """
+    try:
+        formato = cabecera_crudo(canales, fs)
+    except ValueError as e:
+        return {"error": f"Cabecera no válida: {e}"}
+    vista = None
+    if puntos > 0:
+        vista = {"puntos": _puntos_vista(puntos), "desde_s": desde_s,
+                 "hasta_s": hasta_s, "metodo": decimacion}
+
+    ruta = destino = archivo = seguimiento = None
+    indice = directorio_provisional() if completo else None
+    huella = hashlib.sha256()
+    n_bytes = 0
+    try:
+        with etapa("subida"):
+            parte, campo = None, b""
+            async for tipo, valor in eventos_multipart(request):
+                if tipo == "parte":
+                    parte, campo = valor["nombre"], b""
+                    if parte == "file" and ruta is None:
+                        archivo = valor["archivo"]
+                        destino, ruta = abrir_temporal()
+                        if completo and ejecutor.modo != "inline":
+                            # Solapar red y análisis por bloques enteros
+                            seguimiento = _SeguimientoSubida(formato)
+                elif tipo == "datos":
+                    if parte == "file" and destino is not None:
+                        destino.write(valor)
+                        huella.update(valor)
+                        n_bytes += len(valor)
+                        if seguimiento is not None:
+                            await seguimiento.alimentar(valor)
+                    elif parte == "cabecera":
+                        campo += valor
+                        if len(campo) > SUBIDA_MAX_CAMPO:
+                            raise HTTPException(status_code=413,
+                                                detail="Cabecera demasiado grande")
+                else:
+                    if parte == "file" and destino is not None:
+                        destino.close()
+                        destino = None
+                    elif parte == "cabecera":
+                        try:
+                            formato = leer_cabecera(campo.decode("utf-8", "replace"))
+                        except ValueError as e:
+                            return {"error": f"Cabecera no válida: {e}"}
+                    parte = None
+        if ruta is None:
+            raise HTTPException(status_code=422, detail="Falta el archivo 'file'")
+
+        if seguimiento is not None and seguimiento.formato is not formato:
+            # La cabecera llegó después del archivo: ese análisis no sirve
+            await seguimiento.cerrar()
+            seguimiento = None
+
+        clave = cache.clave("holter", huella.digest(), completo=completo,
+                            formato=formato, vista=vista)
+        with etapa("cache"):
+            resultado = await cache.obtener_async(clave)
+        if resultado is not None and "estudio_id" in resultado \
+                and not existe(resultado["estudio_id"]):
+            resultado = None        # el almacén lo purgó: rehacer el índice
+        if resultado is None:
+            with etapa("pool"):
+                continuacion = None
+                if seguimiento is not None:
+                    continuacion = await seguimiento.terminar()
+                    # El archivo ya está entero en disco: esperar un hueco
+                    # un rato antes de responder 503 y tirar la subida
+                    limite = time.monotonic() + HOLTER_SEGUIR_ESPERA_S
+                    while ejecutor.pendientes >= ejecutor.capacidad \
+                            and time.monotonic() < limite:
+                        await asyncio.sleep(0.05)
+                resultado = recoger(await ejecutor.ejecutar(
+                    _pipeline_holter, ruta, archivo, completo, formato, vista,
+                    continuacion, indice))
+            if indice and "error" not in resultado:
+                estudio_id = _id_estudio(huella.digest(), formato)
+                publicar(indice, estudio_id)
+                resultado["estudio_id"] = estudio_id
+            await cache.guardar_async(clave, resultado)
+    finally:
+        if destino is not None:
+            destino.close()
+        if seguimiento is not None:
+            await seguimiento.cerrar()
+        if ruta is not None:
+            descartar(ruta)
+        if indice is not None:
+            descartar_provisional(indice)
+    # El nombre no forma parte de la clave: reflejar el de esta subida
+    if "filename" in resultado:
+        resultado["filename"] = archivo
+    return responder(resultado, senal, accept)
+
+
+def _id_estudio(huella: bytes, formato: dict) -> str:
+    """ID del estudio en el almacén: el contenido subido y su formato."""
+    return cache.clave("estudio", huella, formato=formato)[:32]
+
+
+def _avanzar_subida(analizador: AnalizadorHolterStream, fotogramas: np.ndarray):
+    """Un tramo de bloques enteros de una subida (se ejecuta en el pool)."""
+    avanzar_holter(analizador, fotogramas)
+    return analizador, analizador.retirar_picos()
+
+
+class _SeguimientoSubida:
+    """
+    Estudio completo solapado con su subida. El bucle de eventos decodifica
+    los bytes según llegan y manda al pool solo bloques enteros de
+    HOLTER_BLOQUE_S, uno tras otro, con el estado del analizador de ida y
+    vuelta (sin sus picos, que se acumulan aquí): ningún proceso del pool
+    espera a la red. Tras el último byte, _pipeline_holter continúa el
+    analizador desde el archivo ya entero.
+    Solo ocupa un hueco del ejecutor mientras un tramo está en el pool: una
+    subida lenta o parada no quita sitio a nadie. Con el pool lleno los
+    bloques esperan aquí; si llegan a HOLTER_SEGUIR_MAX_BLOQUES sin hueco,
+    el seguimiento se detiene y el análisis final sigue desde lo ya hecho.
+    """
 
-@app.post("/analizar_holter")
-async def analizar_holter(file: UploadFile = File(...)):
-    contenido = await file.read()
+    def __init__(self, formato: dict):
+        self.formato = formato
+        self.decodificador = DecodificadorIncremental(formato)
+        self.analizador = AnalizadorHolterStream(formato["fs"])
+        self.tam = max(1, int(HOLTER_BLOQUE_S * formato["fs"]))
+        self._pendientes, self._n_pendientes = [], 0
+        self._picos = []
+        self._tarea = None
+        self._fallido = False
+        self._detenido = False
+
+    async def alimentar(self, datos: bytes):
+        if self._fallido or self._detenido:
+            return
+        try:
+            fotogramas = self.decodificador.alimentar(datos)
+        except ValueError:
+            self._fallido = True   # el análisis final dará el error de formato
+            return
+        if len(fotogramas):
+            self._pendientes.append(fotogramas)
+            self._n_pendientes += len(fotogramas)
+        lleno = self._n_pendientes >= HOLTER_SEGUIR_MAX_BLOQUES * self.tam
+        if lleno and self._tarea is not None:
+            await self._tarea      # contrapresión: memoria acotada si el pool va lento
+        self._lanzar()
+        if lleno and self._tarea is None and not self._fallido:
+            # Sin hueco en el pool: dejar de seguir; el resto, desde el archivo
+            self._detenido = True
+            self._pendientes, self._n_pendientes = [], 0
+
+    def _lanzar(self):
+        if (self._tarea is not None or self._fallido or self._detenido
+                or self._n_pendientes < self.tam):
+            return
+        try:
+            ejecutor.admitir()
+        except HTTPException:
+            return                 # pool lleno: se reintenta con el siguiente trozo
+        todo = np.concatenate(self._pendientes)
+        n = len(todo) - len(todo) % self.tam
+        self._pendientes, self._n_pendientes = [todo[n:]], len(todo) - n
+        self._tarea = asyncio.ensure_future(self._avanzar(todo[:n]))
+
+    async def _avanzar(self, fotogramas: np.ndarray):
+        try:
+            self.analizador, picos = await ejecutor.ejecutar_liberando(
+                _avanzar_subida, self.analizador, fotogramas)
+            self._picos.append(picos)
+        except Exception:
+            self._fallido = True   # el análisis final rehará el estudio entero
+        finally:
+            self._tarea = None
+        self._lanzar()
+
+    async def terminar(self):
+        """
+        (analizador, picos) para que _pipeline_holter continúe desde donde
+        quedó el seguimiento, o None si falló (se analiza todo el archivo).
+        """
+        self._detenido = True
+        while self._tarea is not None:
+            await self._tarea
+        if self._fallido:
+            return None
+        picos = np.concatenate(self._picos) if self._picos else np.empty(0, dtype=np.int64)
+        return self.analizador, picos
+
+    async def cerrar(self):
+        """Abandona el seguimiento y espera al tramo en vuelo, si lo hay."""
+        self._fallido = True
+        while self._tarea is not None:
+            await self._tarea
+
+
+@cronometrado
+def _pipeline_holter(ruta: str, filename: str, completo: bool = False,
+                     cabecera: dict = None, vista: dict = None,
+                     continuacion: tuple = None, indice: str = None,
+                     progreso=None) -> dict:
+    """
+    Decodificación, filtrado y detección Holter (se ejecuta en el pool).
+    Las muestras quedan en memmap (muestras × canales): solo se cargan las
+    ventanas usadas, y todos los canales entran juntos en la detección.
+    continuacion: (analizador, picos) de _SeguimientoSubida, que ya analizó
+    los primeros bloques mientras llegaba el archivo; el estudio completo
+    sigue desde ahí.
+    indice: directorio provisional donde dejar el índice de latidos y la
+    señal del estudio completo (estudios.guardar_indice / guardar_senal).
+    progreso: llamada con las muestras recorridas (trabajos en segundo plano):
+    las de la detección y luego, sumadas, las del agrupamiento.
+    """
     try:
-        senal = np.frombuffer(contenido, dtype=np.int16).astype(np.float64)
+        registro = abrir_registro(ruta, cabecera)
     except Exception as e:
         return {"error": f"No se pudo leer el formato: {e}"}
 
-    fs     = 500
-    senal  = senal[:10 * fs]
-    senal_f = filtrar_ecg(senal, fs)
-    picos  = detectar_picos_r(senal_f, fs)
-    fc     = _calcular_fc(picos, fs)
+    with registro:
+        fs     = registro.fs
+        senal  = registro.muestras[:int(10 * fs)].astype(np.float64)
+        tramo("leer")
+        senal_f = filtrar_ecg(senal, fs)
+        tramo("filtrar")
+
+        resumen = variabilidad = clases = None
+        if completo:
+            analizador = None
+            if continuacion is not None:
+                analizador, previos = continuacion
+                analizador.agregar_picos(previos)
+            analizador, resumen = analizar_holter_completo(
+                registro.muestras, fs, progreso=progreso, analizador=analizador)
+            picos   = analizador.picos
+            fc      = resumen["fc_media"]
+            duracion = f"{resumen['duracion_s']:.0f} segundos (estudio completo)"
+            tramo("estudio_completo")
+            variabilidad = analizar_vfc(picos, fs, resumen["duracion_s"])
+            tramo("vfc")
+            # Morfología una vez por plantilla, no por latido
+            grupos = agrupar_latidos(
+                registro.muestras, picos, fs, [c["ganancia"] for c in registro.canales],
+                progreso=progreso and (lambda hechas: progreso(registro.n_muestras + hechas)))
+            for d in grupos["plantillas"]:
+                d["morfologia"] = _morfologia_lead(d["senal"], [grupos["antes"]], fs, "")
+            clases = resumir_agrupamiento(grupos, fs)
+            tramo("agrupar")
+            if indice:
+                guardar_indice(indice, picos, fs, grupos, filename=filename,
+                               senal=guardar_senal(indice, ruta, registro),
+                               duracion_s=resumen["duracion_s"],
+                               n_muestras=registro.n_muestras,
+                               registro=registro.descripcion(),
+                               plantillas=clases["plantillas"])
+                tramo("indice")
+        else:
+            picos  = detectar_picos_r(senal_f, fs)
+            fc     = _calcular_fc(picos, fs)
+            duracion = "10 segundos"
+            tramo("detectar_picos")
+        decimada = None
+        if vista:
+            decimada = decimar_tramo(registro.canal(0), fs, vista["puntos"],
+                                     vista["metodo"], vista["desde_s"],
+                                     vista["hasta_s"])
+            tramo("decimar")
+        descripcion = registro.descripcion()
     regular = _es_regular(picos)
 
     dx = ("Ritmo Sinusal Normal" if fc and 60 <= fc <= 100 and regular
@@ -824,32 +1385,63 @@ async def analizar_holter(file: UploadFile = File(...)):
           else "Taquiarritmia" if fc and fc > 100
           else "Ritmo Irregular")
 
-    return {
-        "filename": file.filename,
-        "duracion_analizada": "10 segundos",
+    respuesta = {
+        "filename": filename,
+        "duracion_analizada": duracion,
         "latidos_detectados": len(picos),
         "frecuencia_cardiaca": fc,
         "diagnostico_texto": dx,
         "detalles": f"FC {fc} lpm — {'regular' if regular else 'irregular'}",
         "alerta_color": "red" if fc and (fc > 150 or fc < 40) else
                         "orange" if not regular else "green",
-        "senal_grafica": senal_f[:2000].tolist(),
+        # La app dibuja un solo trazo: el primer canal
+        "senal_grafica": senal_f[:2000, 0].tolist(),
+        "registro": descripcion,
     }
+    if decimada is not None:
+        respuesta["senal_grafica"] = decimada.pop("valores")
+        respuesta["senal_tiempos_s"] = decimada.pop("t_s")
+        respuesta["decimacion"] = decimada
+    if resumen is not None:
+        respuesta["resumen_estudio"] = resumen
+        respuesta["vfc"] = variabilidad
+        respuesta["clases_latido"] = clases
+    return respuesta
 
 
 @app.post("/analizar_ecg_foto")
-async def analizar_ecg_foto(file: UploadFile = File(...)):
+async def analizar_ecg_foto(file: UploadFile = File(...),
+                            senal: Literal["json", "f32", "i16"] = "json",
+                            accept: str = Header("")):
     """
     Analiza una fotografía de ECG en papel con motor de visión computacional calibrado.
-    Sin API Key. Devuelve JSON compatible con EcgAnalysisResult Flutter.
+    Sin API Key. Devuelve JSON compatible con EcgAnalysisResult Flutter
+    (o msgpack con Accept: application/msgpack).
+    """
+    with etapa("subida"):
+        img_bytes = await file.read()
+    with etapa("cache"):
+        clave = cache.clave("foto", img_bytes)
+        resultado = await cache.obtener_async(clave)
+    if resultado is None:
+        with etapa("pool"):
+            resultado = recoger(await ejecutor.ejecutar(_pipeline_foto, img_bytes))
+        await cache.guardar_async(clave, resultado)
+    return responder(resultado, senal, accept)
+
+
+@cronometrado
+def _pipeline_foto(img_bytes: bytes) -> dict:
+    """
+    Pipeline completo de la foto: decodificación, calibración, preprocesado,
+    derivaciones y diagnóstico. Función de módulo para poder enviarla al pool.
     """
-    img_bytes = await file.read()
-
     # ── Decodificar imagen ────────────────────────────────────────────────
     nparr = np.frombuffer(img_bytes, np.uint8)
     img_color = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     if img_color is None:
         return _error("No se pudo decodificar la imagen — verifica el formato")
+    tramo("decodificar")
 
     # Redimensionar a ancho estándar manteniendo proporción
     h_orig, w_orig = img_color.shape[:2]
@@ -860,27 +1452,42 @@ async def analizar_ecg_foto(file: UploadFile = File(...)):
 
     img_gray = cv2.cvtColor(img_resz, cv2.COLOR_BGR2GRAY)
 
-    # ── Calibración ──────────────────────────────────────────────────────
-    px_mm = calibrar_px_mm(img_gray)
+    piramide = construir_piramide(img_gray)
+    tramo("redimensionar")
+
+    # ── Calibración (ejes independientes, de grueso a fino) ──────────────
+    calib   = calibrar_piramide(piramide)
+    px_mm   = calib["px_mm_x"]   # tiempo
+    px_mm_y = calib["px_mm_y"]   # amplitud
     fs_eq = px_mm * ECG_PAPER_SPEED  # px/s calibrado real
+    tramo("calibrar")
 
-    # ── Preprocesamiento ─────────────────────────────────────────────────
-    traza_bin = preprocesar_ecg(img_gray, px_mm)
+    # ── Preprocesamiento (por bandas) ────────────────────────────────────
+    traza_bin, alto_analizado = preprocesar_por_bandas(piramide, px_mm, px_mm_y)
+    tramo("preprocesar")
 
     # ── Verificar calidad ────────────────────────────────────────────────
+    # Umbral proporcional a la superficie analizada: fuera de las bandas
+    # la imagen binaria es 0 por construcción, no por falta de contraste
     contenido_total = float(np.sum(traza_bin > 0))
-    if contenido_total < (TARGET_WIDTH * 10):
+    if contenido_total < TARGET_WIDTH * 10 * alto_analizado / traza_bin.shape[0]:
         return _error("Imagen con muy poco contraste — fotografía con mejor iluminación y sin flash directo")
 
     # ── Segmentar filas ───────────────────────────────────────────────────
-    filas = detectar_filas(traza_bin, px_mm)
+    filas = detectar_filas(traza_bin, px_mm_y)
+    tramo("detectar_filas")
 
     # ── Análisis por derivaciones ─────────────────────────────────────────
+    tiempos_leads = {}
     try:
         analisis_leads, amplitudes, senal_ritmo, picos_ritmo = \
-            analizar_derivaciones(traza_bin, filas, px_mm)
+            analizar_derivaciones(traza_bin, filas, px_mm, tiempos_leads)
     except Exception as e:
         return _error(f"Error al analizar derivaciones: {e}")
+    tramo("derivaciones")
+    # Por derivación solo en las métricas: el resultado se cachea y es público
+    for lead, ms in tiempos_leads.items():
+        anotar("derivacion_" + lead.split()[-1].strip("()"), ms)
 
     if len(picos_ritmo) < 2:
         return _error("Pocos complejos QRS detectados — alinea mejor la imagen y asegúrate de incluir la tira de ritmo")
@@ -891,6 +1498,7 @@ async def analizar_ecg_foto(file: UploadFile = File(...)):
     intervalos = medir_intervalos(senal_ritmo, picos_ritmo, fs_eq)
     qtc_ms  = calcular_qtc_bazett(intervalos["qt_ms"], fc)
     eje_txt, eje_deg = calcular_eje(amplitudes)
+    tramo("intervalos")
 
     # ── Diagnóstico clínico ───────────────────────────────────────────────
     dx = diagnosticar_clinico(
@@ -906,6 +1514,7 @@ async def analizar_ecg_foto(file: UploadFile = File(...)):
         amplitudes=amplitudes,
         analisis_deriv=analisis_leads,
     )
+    tramo("diagnostico")
 
     # ── Calidad de imagen ─────────────────────────────────────────────────
     n_ciclos = len(picos_ritmo)
@@ -946,7 +1555,8 @@ async def analizar_ecg_foto(file: UploadFile = File(...)):
     # ── Narrativa clínica ─────────────────────────────────────────────────
     narrativa = (
         f"ECG analizado mediante visión computacional calibrada. "
-        f"Calibración estimada: {px_mm:.1f} px/mm ({fs_eq:.0f} px/s equivalente). "
+        f"Calibración estimada: {px_mm:.1f} px/mm en tiempo ({fs_eq:.0f} px/s equivalente), "
+        f"{px_mm_y:.1f} px/mm en amplitud. "
         f"{'Ritmo ' + dx['ritmo_txt'] + '.' if fc > 0 else 'Ritmo no determinable.'} "
         f"Frecuencia cardiaca: {fc} lpm. "
         f"Intervalo PR: {intervalos['pr_ms']} ms. "
@@ -979,6 +1589,16 @@ async def analizar_ecg_foto(file: UploadFile = File(...)):
         "interpretacion_narrativa": narrativa,
         "alerta_nivel":             dx["alerta"],
         "conducta_recomendada":     dx["conducta"],
+        "calibracion": {
+            "px_mm_tiempo":      px_mm,
+            "px_mm_amplitud":    px_mm_y,
+            "confianza_tiempo":  calib["confianza_x"],
+            "confianza_amplitud": calib["confianza_y"],
+            "fs_equivalente":    round(fs_eq, 1),
+        },
+        "st_desnivel_mv":           round(px_a_mv(st_d, px_mm_y), 3),
+        "amplitud_qrs_mv":          {lead: round(px_a_mv(a, px_mm_y), 3)
+                                     for lead, a in amplitudes.items()},
         "advertencia": (
             "Análisis automático por visión computacional — uso exclusivamente educativo y de apoyo. "
             "No reemplaza la interpretación de un cardiólogo certificado. "
@@ -987,11 +1607,540 @@ async def analizar_ecg_foto(file: UploadFile = File(...)):
     }
 
 
+@app.post("/analizar_ecg_foto_lote")
+async def analizar_ecg_foto_lote(files: List[UploadFile] = File(...)):
+    """
+    Analiza un lote de fotografías ECG en una sola petición multipart.
+    Respuesta NDJSON: una línea por imagen en cuanto termina (no en orden de
+    subida), con el esquema de /analizar_ecg_foto o de _error, más
+    "indice" (posición en el lote) y "archivo".
+    """
+    if ejecutor.pendientes >= ejecutor.capacidad:
+        ejecutor.admitir()  # lanza 503 antes de empezar a transmitir
+    return StreamingResponse(_lote_fotos_ndjson(files),
+                             media_type="application/x-ndjson")
+
+
+async def _foto_admitida(img_bytes: bytes, clave: str) -> dict:
+    # El hueco se suelta cuando el hijo acaba, aunque el lote se cancele antes
+    resultado = recoger(await ejecutor.ejecutar_liberando(_pipeline_foto, img_bytes))
+    await cache.guardar_async(clave, resultado)
+    return resultado
+
+
+async def _lote_fotos_ndjson(files: list):
+    """
+    Reparte el lote en el pool con una ventana de tantas imágenes como
+    trabajadores: el lote no acapara la cola compartida y cada imagen se
+    lee de la subida solo cuando va a procesarse.
+    """
+    ventana = max(1, ejecutor.trabajadores)
+    en_vuelo = {}  # tarea → (indice, archivo)
+    siguiente = 0
+    try:
+        while siguiente < len(files) or en_vuelo:
+            while siguiente < len(files) and len(en_vuelo) < ventana:
+                if ejecutor.pendientes >= ejecutor.capacidad:
+                    if en_vuelo:
+                        break  # esperar a que termine una imagen propia
+                    await asyncio.sleep(0.05)
+                    continue
+                f = files[siguiente]
+                # Hueco reservado antes de ceder el bucle (lectura, caché)
+                ejecutor.admitir()
+                try:
+                    img_bytes = await f.read()
+                    clave = cache.clave("foto", img_bytes)
+                    previo = await cache.obtener_async(clave)
+                except BaseException:
+                    ejecutor.liberar()
+                    raise
+                if previo is not None:
+                    ejecutor.liberar()
+                    linea = {"indice": siguiente, "archivo": f.filename, **previo}
+                    yield json.dumps(linea, ensure_ascii=False) + "\n"
+                    siguiente += 1
+                    continue
+                tarea = asyncio.ensure_future(_foto_admitida(img_bytes, clave))
+                en_vuelo[tarea] = (siguiente, f.filename)
+                siguiente += 1
+
+            if not en_vuelo:
+                continue
+
+            hechas, _ = await asyncio.wait(en_vuelo,
+                                           return_when=asyncio.FIRST_COMPLETED)
+            for tarea in hechas:
+                indice, archivo = en_vuelo.pop(tarea)
+                try:
+                    resultado = tarea.result()
+                except Exception as e:
+                    resultado = _error(f"Error al analizar la imagen: {e}")
+                linea = {"indice": indice, "archivo": archivo, **resultado}
+                yield json.dumps(linea, ensure_ascii=False) + "\n"
+    finally:
+        # Cliente desconectado: no dejar trabajo huérfano en la cola
+        for tarea in en_vuelo:
+            tarea.cancel()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# ESTUDIOS ALMACENADOS — consultas sobre el índice de latidos (estudios.py)
+# ─────────────────────────────────────────────────────────────────────────────
+# Cada /analizar_holter?completo=true devuelve estudio_id. Las consultas son
+# búsquedas binarias sobre columnas en memmap y las ventanas de señal leen
+# solo su tramo: milisegundos, sin pasar por el pool.
+
+def _indice_estudio(estudio_id: str):
+    indice = abrir_indice(estudio_id)
+    if indice is None:
+        raise HTTPException(status_code=404, detail="Estudio no encontrado")
+    return indice
+
+
+@app.get("/estudios/{estudio_id}")
+def estudio(estudio_id: str):
+    """Metadatos del estudio (registro, duración, plantillas) y su resumen."""
+    indice = _indice_estudio(estudio_id)
+    return {"estudio_id": estudio_id, **indice.meta, "resumen": indice.resumen()}
+
+
+@app.get("/estudios/{estudio_id}/latidos")
+def estudio_latidos(estudio_id: str, desde_s: float = None, hasta_s: float = None,
+                    clase: Literal["N", "S", "V", "X"] = None, plantilla: int = None,
+                    limite: int = 1000):
+    """
+    Latidos con R en [desde_s, hasta_s), en orden temporal, opcionalmente
+    de una sola clase o plantilla. Columnas: t_s, rr_ms, amplitud_mv,
+    clase, plantilla; `total` cuenta todos los del rango aunque se
+    devuelvan solo `limite`.
+    """
+    indice = _indice_estudio(estudio_id)
+    filas = indice.rango(desde_s, hasta_s, clase, plantilla)
+    devueltas = filas[:max(0, min(limite, ESTUDIOS_MAX_FILAS))]
+    return {"total": len(filas), "devueltos": len(devueltas), **indice.filas(devueltas)}
+
+
+@app.get("/estudios/{estudio_id}/resumen")
+def estudio_resumen(estudio_id: str, desde_s: float = None, hasta_s: float = None):
+    """Latidos, FC media, RR máximo y conteo por clase en [desde_s, hasta_s)."""
+    return _indice_estudio(estudio_id).resumen(desde_s, hasta_s)
+
+
+@app.get("/estudios/{estudio_id}/pausas")
+def estudio_pausas(estudio_id: str, min_s: float = HOLTER_PAUSA_S,
+                   desde_s: float = None, hasta_s: float = None, limite: int = 10):
+    """Pausas (RR ≥ min_s) que tocan [desde_s, hasta_s), de mayor a menor."""
+    indice = _indice_estudio(estudio_id)
+    filas = indice.pausas(min_s, desde_s, hasta_s)
+    devueltas = filas[:max(0, min(limite, ESTUDIOS_MAX_FILAS))]
+    fin = indice.col["posicion"][devueltas]
+    rr = indice.col["rr"][devueltas]
+    return {"total": len(filas), "pausas": [
+        {"inicio_s": round(float(f - r) / indice.fs, 3),
+         "fin_s":    round(float(f) / indice.fs, 3),
+         "duracion_s": round(float(r) / indice.fs, 3)}
+        for f, r in zip(fin.tolist(), rr.tolist())]}
+
+
+@cronometrado
+def _decimar_estudio(estudio_id: str, canal: int, puntos: int, metodo: str,
+                     desde_s: float, hasta_s: float, banda) -> dict:
+    """Vista decimada de un estudio guardado (se ejecuta en el pool)."""
+    indice = abrir_indice(estudio_id)
+    if indice is None:
+        return {"error": "Estudio no encontrado"}
+    try:
+        decimada = indice.decimada(puntos, metodo, desde_s, hasta_s, canal, banda)
+    except ValueError as e:
+        return {"error": str(e)}
+    tramo("decimar")
+    return decimada
+
+
+@app.get("/estudios/{estudio_id}/senal")
+async def estudio_senal(estudio_id: str, desde_s: float = 0.0, hasta_s: float = None,
+                        canal: int = 0, filtrada: bool = True, puntos: int = 0,
+                        decimacion: Literal["minmax", "lttb"] = "minmax",
+                        senal: Literal["json", "f32", "i16"] = "json",
+                        accept: str = Header("")):
+    """
+    Ventana [desde_s, hasta_s) de un canal del registro guardado, en mV,
+    filtrada con la banda de filtrar_ecg si filtrada=true. Lee solo esa
+    ventana (y el relleno del filtro) del memmap: el coste es el mismo en
+    cualquier punto del estudio. Sin `puntos`, hasta_s vale por defecto
+    desde_s + 10 y la ventana no pasa de ESTUDIOS_VENTANA_MAX_S.
+    puntos>0 → el tramo (por defecto, el estudio entero) decimado en el
+               pool a `puntos` puntos con `decimacion`, con sus instantes
+               en senal_tiempos_s: una vista de conjunto sin volver a subir.
+    senal / Accept: como en /analizar_holter.
+    """
+    indice = _indice_estudio(estudio_id)
+    banda = BANDA_ECG if filtrada else None
+    respuesta = {"estudio_id": estudio_id, "canal": canal, "fs": indice.fs,
+                 "filtrada": filtrada}
+    if puntos > 0:
+        decimada = recoger(await ejecutor.ejecutar(
+            _decimar_estudio, estudio_id, canal, _puntos_vista(puntos), decimacion,
+            desde_s, hasta_s, banda))
+        if "error" in decimada:
+            codigo = 404 if decimada["error"] == "Estudio no encontrado" else 422
+            raise HTTPException(status_code=codigo, detail=decimada["error"])
+        respuesta.update(desde_s=decimada.pop("desde_s"), hasta_s=decimada.pop("hasta_s"),
+                         senal_grafica=decimada.pop("valores"),
+                         senal_tiempos_s=decimada.pop("t_s"), decimacion=decimada)
+        return responder(respuesta, senal, accept)
+
+    if hasta_s is None:
+        hasta_s = desde_s + 10.0
+    try:
+        ventana = await asyncio.to_thread(indice.ventana, desde_s, hasta_s, canal, banda)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    respuesta.update(desde_s=ventana["desde_s"], hasta_s=ventana["hasta_s"],
+                     senal_grafica=np.round(ventana["valores"], 4).tolist())
+    return responder(respuesta, senal, accept)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# TRABAJOS EN SEGUNDO PLANO — cola persistente (trabajos.py)
+# ─────────────────────────────────────────────────────────────────────────────
+# Un Holter completo o un lote grande de fotos se envía como trabajo y se
+# consulta por ID: la petición responde en cuanto la entrada está en disco.
+# Cada worker de gunicorn corre un bucle que reclama trabajos de la cola
+# SQLite y los ejecuta en el pool, sin ocupar más de TRABAJOS_SIMULTANEOS
+# huecos para que el tráfico interactivo siga entrando.
+
+cola_trabajos = ColaTrabajos()
+_hay_trabajo = asyncio.Event()   # un envío en este worker despierta al bucle
+
+
+def _ejecutar_trabajo(trabajo: dict) -> dict:
+    """Ejecuta un trabajo reclamado (en el pool). Función de módulo para el pool."""
+    aviso = AvisoProgreso(cola_trabajos, trabajo["id"], trabajo["dueno"], trabajo["total"])
+    parametros = trabajo["parametros"]
+    entradas = cola_trabajos.entradas(trabajo["id"])
+
+    if trabajo["tipo"] == "holter":
+        indice = directorio_provisional()
+        try:
+            resultado = _pipeline_holter(os.path.join(entradas, "senal.dat"),
+                                         parametros["archivo"], True,
+                                         parametros["formato"], None,
+                                         indice=indice, progreso=aviso)
+            if "error" not in resultado:
+                publicar(indice, parametros["estudio_id"])
+                resultado["estudio_id"] = parametros["estudio_id"]
+        finally:
+            descartar_provisional(indice)
+        return resultado
+
+    resultados = []
+    for i, archivo in enumerate(parametros["archivos"]):
+        with open(os.path.join(entradas, f"{i:05d}.img"), "rb") as f:
+            img_bytes = f.read()
+        clave = cache.clave("foto", img_bytes)
+        resultado = cache.obtener(clave)
+        if resultado is None:
+            resultado = recoger(_pipeline_foto(img_bytes))
+            cache.guardar(clave, resultado)
+        resultados.append({"indice": i, "archivo": archivo, **resultado})
+        aviso(i + 1)
+    return {"fotos": resultados}
+
+
+async def _correr_trabajo(trabajo: dict):
+    """Lleva un trabajo reclamado al pool y anota cómo acaba (hueco ya admitido)."""
+    try:
+        resultado = recoger(await ejecutor.ejecutar_admitida(_ejecutar_trabajo, trabajo))
+        if await asyncio.to_thread(cola_trabajos.terminar, trabajo["id"],
+                                   trabajo["dueno"], resultado) \
+                and "clave" in trabajo["parametros"]:
+            await cache.guardar_async(trabajo["parametros"]["clave"], resultado)
+    except TrabajoCancelado:
+        pass
+    except Exception as e:
+        detalle = e.detail if isinstance(e, HTTPException) else str(e)
+        await asyncio.to_thread(cola_trabajos.fallar, trabajo["id"], trabajo["dueno"],
+                                f"{type(e).__name__}: {detalle}")
+    finally:
+        ejecutor.liberar()
+        estado = await asyncio.to_thread(cola_trabajos.consultar, trabajo["id"])
+        if estado is None or estado["estado"] in ESTADOS_FINALES:
+            await asyncio.to_thread(cola_trabajos.borrar_entradas, trabajo["id"])
+
+
+async def _bucle_trabajos():
+    """
+    Reclama trabajos mientras haya hueco propio y en el pool, renueva los
+    arriendos de los que ejecuta y purga de vez en cuando los antiguos.
+    Todo acceso a SQLite va a un hilo: el bucle de eventos no espera al disco.
+    """
+    dueno = f"{socket.gethostname()}:{os.getpid()}"
+    en_curso = {}   # id → tarea
+    renovado = purgado = 0.0
+    while True:
+        try:
+            for trabajo_id in [t for t, tarea in list(en_curso.items()) if tarea.done()]:
+                del en_curso[trabajo_id]
+            while (len(en_curso) < TRABAJOS_SIMULTANEOS
+                   and ejecutor.pendientes < ejecutor.capacidad):
+                # Hueco reservado antes de reclamar: nadie lo ocupa mientras
+                # se espera a la base
+                ejecutor.admitir()
+                try:
+                    trabajo = await asyncio.to_thread(cola_trabajos.reclamar, dueno)
+                except BaseException:
+                    ejecutor.liberar()
+                    raise
+                if trabajo is None:
+                    ejecutor.liberar()
+                    break
+                en_curso[trabajo["id"]] = asyncio.ensure_future(_correr_trabajo(trabajo))
+            ahora = time.monotonic()
+            if ahora - renovado >= TRABAJOS_ARRIENDO_S / 3:
+                for trabajo_id in list(en_curso):
+                    await asyncio.to_thread(cola_trabajos.renovar, trabajo_id, dueno)
+                renovado = ahora
+            if ahora - purgado >= 3600:
+                await asyncio.to_thread(cola_trabajos.purgar)
+                purgado = ahora
+        except Exception as e:
+            print(f"[trabajos] error en el bucle de la cola: {e}")
+        try:
+            await asyncio.wait_for(_hay_trabajo.wait(), TRABAJOS_SONDEO_S)
+        except asyncio.TimeoutError:
+            pass
+        _hay_trabajo.clear()
+
+
+def _trabajo_o_404(trabajo_id: str) -> dict:
+    estado = cola_trabajos.consultar(trabajo_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return estado
+
+
+@app.post("/trabajos/holter", status_code=202, openapi_extra=_FORMULARIO_HOLTER)
+async def enviar_trabajo_holter(request: Request, canales: int = 1, fs: float = 500):
+    """
+    Encola el análisis del estudio completo de un Holter (multipart: file
+    [+ cabecera], como /analizar_holter?completo=true). Responde con el
+    estado del trabajo; el progreso se cuenta en muestras recorridas (la
+    detección y el agrupamiento recorren cada uno el registro entero, así
+    que total = 2 × muestras) y el resultado es el de /analizar_holter,
+    con estudio_id.
+    """
+    try:
+        formato = cabecera_crudo(canales, fs)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Cabecera no válida: {e}")
+    trabajo_id, entradas = await asyncio.to_thread(cola_trabajos.nuevo)
+    huella = hashlib.sha256()
+    n_bytes = 0
+    archivo = previo = None
+    enviado = False
+    try:
+        with open(os.path.join(entradas, "senal.dat"), "wb") as destino:
+            parte, campo = None, b""
+            async for tipo, valor in eventos_multipart(request):
+                if tipo == "parte":
+                    parte, campo = valor["nombre"], b""
+                    if parte == "file":
+                        archivo = valor["archivo"]
+                elif tipo == "datos":
+                    if parte == "file":
+                        destino.write(valor)
+                        huella.update(valor)
+                        n_bytes += len(valor)
+                    elif parte == "cabecera":
+                        campo += valor
+                        if len(campo) > SUBIDA_MAX_CAMPO:
+                            raise HTTPException(status_code=413,
+                                                detail="Cabecera demasiado grande")
+                else:
+                    if parte == "cabecera":
+                        try:
+                            formato = leer_cabecera(campo.decode("utf-8", "replace"))
+                        except ValueError as e:
+                            raise HTTPException(status_code=422,
+                                                detail=f"Cabecera no válida: {e}")
+                    parte = None
+        if archivo is None:
+            raise HTTPException(status_code=422, detail="Falta el archivo 'file'")
+
+        estudio_id = _id_estudio(huella.digest(), formato)
+        clave = cache.clave("holter", huella.digest(), completo=True,
+                            formato=formato, vista=None)
+        previo = await cache.obtener_async(clave)
+        if previo is not None and not existe(previo.get("estudio_id")):
+            previo = None
+        if previo is not None:
+            previo["filename"] = archivo
+        muestras = contar_muestras(max(0, n_bytes - formato.get("desplazamiento", 0)), formato)
+        await asyncio.to_thread(cola_trabajos.enviar, trabajo_id, "holter",
+                                {"archivo": archivo, "formato": formato,
+                                 "estudio_id": estudio_id, "clave": clave},
+                                2 * muestras, "muestras", previo)
+        enviado = True
+        _hay_trabajo.set()
+    finally:
+        if not enviado or previo is not None:
+            await asyncio.to_thread(cola_trabajos.borrar_entradas, trabajo_id)
+    return await asyncio.to_thread(cola_trabajos.consultar, trabajo_id)
+
+
+@app.post("/trabajos/fotos", status_code=202)
+async def enviar_trabajo_fotos(files: List[UploadFile] = File(...)):
+    """
+    Encola un lote de fotografías ECG. El progreso se cuenta en fotos
+    analizadas; el resultado es {"fotos": [...]} con una entrada por
+    imagen, en el orden de subida, como las líneas de /analizar_ecg_foto_lote.
+    """
+    trabajo_id, entradas = await asyncio.to_thread(cola_trabajos.nuevo)
+    enviado = False
+    try:
+        for i, f in enumerate(files):
+            with open(os.path.join(entradas, f"{i:05d}.img"), "wb") as destino:
+                while trozo := await f.read(1 << 20):
+                    destino.write(trozo)
+        await asyncio.to_thread(cola_trabajos.enviar, trabajo_id, "fotos",
+                                {"archivos": [f.filename for f in files]},
+                                len(files), "fotos")
+        enviado = True
+        _hay_trabajo.set()
+    finally:
+        if not enviado:
+            await asyncio.to_thread(cola_trabajos.borrar_entradas, trabajo_id)
+    return await asyncio.to_thread(cola_trabajos.consultar, trabajo_id)
+
+
+@app.get("/trabajos/{trabajo_id}")
+def estado_trabajo(trabajo_id: str):
+    """Estado, progreso (progreso / total en `unidad`), intentos y error."""
+    return _trabajo_o_404(trabajo_id)
+
+
+@app.get("/trabajos/{trabajo_id}/resultado")
+def resultado_trabajo(trabajo_id: str, senal: Literal["json", "f32", "i16"] = "json",
+                      accept: str = Header("")):
+    """
+    Resultado de un trabajo terminado (senal / Accept como en el análisis
+    síncrono). 202 con el estado si aún no ha acabado; 409 si falló o se
+    canceló.
+    """
+    estado = _trabajo_o_404(trabajo_id)
+    if estado["estado"] == "terminado":
+        return responder(cola_trabajos.resultado(trabajo_id), senal, accept)
+    if estado["estado"] in ESTADOS_FINALES:
+        raise HTTPException(status_code=409, detail=estado)
+    return JSONResponse(status_code=202, content=estado)
+
+
+@app.delete("/trabajos/{trabajo_id}")
+def cancelar_trabajo(trabajo_id: str):
+    """
+    Cancela un trabajo pendiente o en curso (este se detiene en su
+    siguiente aviso de progreso). Devuelve el estado resultante.
+    """
+    anterior = cola_trabajos.cancelar(trabajo_id)
+    if anterior is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if anterior == "pendiente":
+        cola_trabajos.borrar_entradas(trabajo_id)
+    return cola_trabajos.consultar(trabajo_id)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MONITOR EN VIVO — WebSocket con estado por conexión
+# ─────────────────────────────────────────────────────────────────────────────
+
+_monitores_activos = 0
+
+
+def _estado_monitor(sesion: SesionMonitor, nuevos: np.ndarray) -> dict:
+    """FC, regularidad y alerta sobre la ventana deslizante de RR de la sesión."""
+    fs = sesion.fs
+    picos = sesion.picos_recientes
+    pausa = sesion.latidos > 0 and sesion.sin_latidos_s() >= MONITOR_ASISTOLIA_S
+    baja = not pausa and sesion.calidad_baja
+    fc = 0 if pausa or baja else _calcular_fc(picos, fs)
+    regular = not baja and _es_regular(picos)
+    return {
+        "tipo":         "estado",
+        "t_s":          round(sesion.n_muestras / fs, 3),
+        "picos_s":      np.round(nuevos / fs, 3).tolist(),
+        # Recuperados por search-back: llegan hasta ~1,66 RR tarde
+        "picos_tardios_s": np.round(sesion.tardios / fs, 3).tolist(),
+        "latidos":      sesion.latidos,
+        "frecuencia_cardiaca": fc,
+        "regular":      bool(regular),
+        "pausa":        bool(pausa),
+        "calidad":      "baja" if baja else "buena",
+        "alerta_color": "red" if pausa or (fc and (fc > 150 or fc < 40)) else
+                        "orange" if baja or not regular else "green",
+        # Muestra R → aviso, en tiempo de señal (sin contar la red)
+        "retardo_ms":   round((sesion.n_muestras - int(nuevos[-1])) / fs * 1000)
+                        if len(nuevos) else None,
+    }
+
+
+@app.websocket("/ws/monitor")
+async def monitor_en_vivo(ws: WebSocket, fs: float = 500, canales: int = 1,
+                          canal: int = 0):
+    """
+    Tramas binarias de muestras int16 little-endian (intercaladas si
+    canales > 1). Se responde con un mensaje "estado" por cada trama que
+    confirma latidos, y al menos cada MONITOR_ESTADO_S de señal aunque no
+    los haya (así llega la alerta de pausa).
+    """
+    global _monitores_activos
+    await ws.accept()
+    if _monitores_activos >= MONITOR_MAX:
+        await ws.close(code=1013, reason="Monitor lleno, reintente más tarde")
+        return
+    try:
+        if not 50 <= fs <= 2000:
+            raise ValueError("fs fuera de rango (50–2000 Hz)")
+        sesion = SesionMonitor(fs, canales, canal)
+    except ValueError as e:
+        await ws.close(code=1008, reason=str(e))
+        return
+
+    _monitores_activos += 1
+    try:
+        ultimo_aviso = 0
+        while True:
+            mensaje = await ws.receive()
+            if mensaje["type"] == "websocket.disconnect":
+                break
+            trama = mensaje.get("bytes")
+            if trama is None:
+                await ws.close(code=1003, reason="Se esperaban tramas binarias int16")
+                break
+            if len(trama) > MONITOR_MAX_TRAMA:
+                await ws.close(code=1009, reason="Trama demasiado grande")
+                break
+            try:
+                nuevos = sesion.procesar(trama)
+            except ValueError as e:
+                await ws.close(code=1007, reason=str(e))
+                break
+            if (not len(nuevos) and sesion.n_muestras - ultimo_aviso
+                    < MONITOR_ESTADO_S * fs):
+                continue
+            ultimo_aviso = sesion.n_muestras
+            await ws.send_json(_estado_monitor(sesion, nuevos))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _monitores_activos -= 1
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # CHAT IA — Endpoint de consulta médica (API Key server-side)
 # ─────────────────────────────────────────────────────────────────────────────
 
-import os
 import httpx
 from pydantic import BaseModel
 
@@ -1013,22 +2162,23 @@ async def chat_medico(req: ChatRequest):
     )
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "Content-Type": "application/json",
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                },
-                json={
-                    "model": "claude-haiku-4-5-20251001",
-                    "max_tokens": 1024,
-                    "system": system,
-                    "messages": req.messages,
-                },
-                timeout=30.0,
-            )
+        with etapa("chat_ia"):
+            async with httpx.AsyncClient() as client:
+                resp = await client.post(
+                    "https://api.anthropic.com/v1/messages",
+                    headers={
+                        "Content-Type": "application/json",
+                        "x-api-key": api_key,
+                        "anthropic-version": "2023-06-01",
+                    },
+                    json={
+                        "model": "claude-haiku-4-5-20251001",
+                        "max_tokens": 1024,
+                        "system": system,
+                        "messages": req.messages,
+                    },
+                    timeout=30.0,
+                )
         if resp.status_code == 200:
             data = resp.json()
             return {"reply": data["content"][0]["text"]}
@@ -0,0 +1,248 @@
+"""
+MediSumma — Benchmark del pipeline de fotos ECG
+Renderiza hojas sintéticas (sintetico.py) en varios escenarios —
+resolución, color de cuadrícula, rotación, ruido, iluminación — y mide
+sobre _pipeline_foto:
+    · latencia extremo a extremo (p50 / p95) y por etapa (metricas.py)
+    · rendimiento con el pool de procesos (imágenes/s)
+    · memoria pico del proceso que analiza (ru_maxrss)
+    · exactitud frente a la verdad sintética: |FC detectada − FC| y
+      |px/mm detectado − px/mm|
+La imagen se renderiza en un proceso hijo y se analiza en otro recién
+bifurcado, para que la memoria pico medida sea solo la del análisis. Los
+resultados se añaden como JSON por línea a --salida (por defecto en
+resultados/, fuera de git); con --comparar se contrastan con la ejecución
+anterior del mismo escenario y se sale con código 1 si alguno empeora: la
+latencia mínima (la menos sensible al ruido de la máquina) más que
+--tolerancia, o el error de FC más de --tolerancia-fc lpm. Un error de FC
+por encima de --tolerancia-fc se marca siempre en la salida.
+
+    python benchmark.py                       # todos los escenarios
+    python benchmark.py --rapido --comparar   # subconjunto, contra la última
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("MEDISUMMA_METRICAS", "1")
+os.environ.setdefault("MEDISUMMA_CACHE", "0")
+
+import numpy as np
+
+import api_medica
+from metricas import CLAVE_TIEMPOS
+from sintetico import renderizar_ecg, codificar
+
+ESCENARIOS = {
+    # nombre: parámetros de renderizar_ecg (+ formato de codificación)
+    "base_8pxmm":        dict(px_mm=8),
+    "alta_12pxmm":       dict(px_mm=12),
+    "baja_6pxmm":        dict(px_mm=6),
+    "cuadricula_roja":   dict(px_mm=8, cuadricula="rojo"),
+    "cuadricula_verde":  dict(px_mm=8, cuadricula="verde"),
+    "cuadricula_gris":   dict(px_mm=8, cuadricula="gris"),
+    "rotada_2grados":    dict(px_mm=8, rotacion_grados=2.0),
+    "ruido_alto":        dict(px_mm=8, ruido=12.0),
+    "iluminacion":       dict(px_mm=8, gradiente=0.45),
+    "taquicardia_140":   dict(px_mm=8, fc=140),
+    "bradicardia_45":    dict(px_mm=8, fc=45),
+    "foto_movil":        dict(px_mm=10, rotacion_grados=1.0, ruido=6.0,
+                              gradiente=0.3),
+    "png_sin_perdidas":  dict(px_mm=8, formato="png"),
+}
+RAPIDOS = ("base_8pxmm", "rotada_2grados", "foto_movil")
+SALIDA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      "resultados", "benchmark.jsonl")
+
+
+def _percentil(valores, q):
+    return round(float(np.percentile(valores, q)), 2) if len(valores) else None
+
+
+def _rss_mb() -> float:
+    # Linux: ru_maxrss en KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def generar_imagen(parametros: dict):
+    """Renderiza y codifica un escenario → (bytes, verdad)."""
+    parametros = dict(parametros)
+    formato = parametros.pop("formato", "jpg")
+    img, verdad = renderizar_ecg(**parametros)
+    return codificar(img, formato), verdad
+
+
+def medir_escenario(nombre: str, parametros: dict, datos: bytes,
+                    verdad: dict, repeticiones: int) -> dict:
+    """Latencia, etapas, memoria y exactitud de un escenario (en el hijo)."""
+    api_medica._inicializar_trabajador()
+    rss_inicial = _rss_mb()
+    api_medica._pipeline_foto(datos)  # calentamiento (cachés, hilos)
+
+    totales, etapas, resultado = [], {}, {}
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        resultado = api_medica._pipeline_foto(datos)
+        totales.append((time.perf_counter() - t0) * 1000)
+        for etapa, ms in resultado.pop(CLAVE_TIEMPOS, {}).items():
+            etapas.setdefault(etapa, []).append(ms)
+
+    calib = resultado.get("calibracion", {})
+    fc = resultado.get("frecuencia_cardiaca", 0)
+    px_mm = calib.get("px_mm_tiempo")
+    evaluable = not str(resultado.get("calidad_imagen", "")).startswith("Error")
+    return {
+        "escenario":       nombre,
+        "parametros":      {"formato": "jpg", **parametros},
+        "bytes_imagen":    len(datos),
+        "repeticiones":    repeticiones,
+        "latencia_ms":     {"p50": _percentil(totales, 50),
+                            "p95": _percentil(totales, 95),
+                            "min": round(min(totales), 2)},
+        "etapas_ms_p50":   {e: _percentil(v, 50) for e, v in etapas.items()},
+        "rss_pico_mb":     round(_rss_mb(), 1),
+        "rss_incremento_mb": round(_rss_mb() - rss_inicial, 1),
+        "exactitud": {
+            "fc_verdad":      verdad["fc"],
+            "fc_detectada":   fc,
+            "px_mm_verdad":   verdad["px_mm"],
+            "px_mm_detectado": px_mm,
+            "evaluable":      evaluable,
+            "error_fc":       round(abs(fc - verdad["fc"]), 1) if evaluable else None,
+            "error_px_mm":    (round(abs(px_mm - verdad["px_mm"]), 3)
+                               if evaluable and px_mm is not None else None),
+        },
+    }
+
+
+def medir_rendimiento(datos: bytes, trabajadores: int, n_imagenes: int) -> float:
+    """Imágenes/s con un pool como el del servidor, ya precalentado."""
+    with ProcessPoolExecutor(max_workers=trabajadores,
+                             mp_context=multiprocessing.get_context("fork"),
+                             initializer=api_medica._inicializar_trabajador) as pool:
+        list(pool.map(api_medica._pipeline_foto, [datos] * trabajadores))
+        t0 = time.perf_counter()
+        list(pool.map(api_medica._pipeline_foto, [datos] * n_imagenes))
+        return round(n_imagenes / (time.perf_counter() - t0), 2)
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _anteriores(ruta: str) -> dict:
+    """Último registro de cada escenario en el archivo de resultados."""
+    previos = {}
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    continue
+                previos[registro.get("escenario")] = registro
+    except FileNotFoundError:
+        pass
+    return previos
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--escenarios", nargs="*", choices=sorted(ESCENARIOS),
+                        help="escenarios a medir (por defecto: todos)")
+    parser.add_argument("--rapido", action="store_true",
+                        help=f"solo {', '.join(RAPIDOS)}")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--rendimiento", type=int, default=0, metavar="N",
+                        help="además, N imágenes por el pool para medir imágenes/s")
+    parser.add_argument("--salida", default=SALIDA,
+                        help="JSON por línea donde se acumulan las ejecuciones "
+                             "(por defecto resultados/benchmark.jsonl)")
+    parser.add_argument("--comparar", action="store_true",
+                        help="contrastar con la ejecución anterior de cada escenario")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="empeoramiento relativo admitido de la latencia "
+                             "mínima (por defecto 0.25)")
+    parser.add_argument("--tolerancia-fc", type=float, default=5.0,
+                        help="error de FC admitido, en lpm (por defecto 5)")
+    args = parser.parse_args(argv)
+
+    nombres = args.escenarios or (list(RAPIDOS) if args.rapido else list(ESCENARIOS))
+    previos = _anteriores(args.salida) if args.comparar else {}
+    comun = {
+        "fecha":        time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit":       _commit_actual(),
+        "motor":        api_medica.MOTOR_VERSION,
+        "trabajadores": api_medica.N_TRABAJADORES,
+        "hilos_deriv":  api_medica.HILOS_DERIVACIONES,
+        "piramide":     api_medica.PIRAMIDE_NIVELES,
+    }
+
+    regresiones = []
+    ctx = multiprocessing.get_context("fork")
+    os.makedirs(os.path.dirname(os.path.abspath(args.salida)), exist_ok=True)
+    with open(args.salida, "a", encoding="utf-8") as salida:
+        for nombre in nombres:
+            # Procesos nuevos para renderizar y para analizar: memoria pico aislada
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as hijo:
+                datos, verdad = hijo.submit(generar_imagen,
+                                            ESCENARIOS[nombre]).result()
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as hijo:
+                registro = hijo.submit(medir_escenario, nombre, ESCENARIOS[nombre],
+                                       datos, verdad, args.repeticiones).result()
+            if args.rendimiento:
+                registro["imagenes_por_s"] = medir_rendimiento(
+                    datos, api_medica.N_TRABAJADORES, args.rendimiento)
+            registro = {**comun, **registro}
+            salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            salida.flush()
+
+            lat = registro["latencia_ms"]
+            ex = registro["exactitud"]
+            linea = (f"{nombre:<18} p50 {lat['p50']:>8.1f} ms  p95 {lat['p95']:>8.1f} ms  "
+                     f"RSS {registro['rss_pico_mb']:>6.0f} MB  "
+                     f"FC {ex['fc_detectada']}/{ex['fc_verdad']:.0f}")
+            error_fc = ex["error_fc"]
+            if error_fc is None:
+                linea += " (no evaluable)"
+            else:
+                linea += f" (±{error_fc:.0f})"
+                if error_fc > args.tolerancia_fc:
+                    linea += " ← FC"
+            previo = previos.get(nombre)
+            if previo:
+                antes = previo["latencia_ms"]["min"]
+                cambio = (lat["min"] - antes) / antes if antes else 0.0
+                linea += f"  Δmin {cambio:+.0%} vs {previo.get('commit') or '?'}"
+                if cambio > args.tolerancia:
+                    regresiones.append(nombre)
+                    linea += "  ← REGRESIÓN"
+                error_antes = previo.get("exactitud", {}).get("error_fc")
+                if error_antes is not None and \
+                        (error_fc is None or error_fc - error_antes > args.tolerancia_fc):
+                    regresiones.append(nombre)
+                    linea += f"  ← REGRESIÓN FC (antes ±{error_antes:.0f})"
+            print(linea)
+
+    if regresiones:
+        print(f"Escenarios que empeoran más que la tolerancia: "
+              f"{', '.join(dict.fromkeys(regresiones))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
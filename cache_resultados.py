@@ -0,0 +1,220 @@
+"""
+MediSumma — Caché de resultados direccionada por contenido
+Clave = SHA-256 de (versión del motor, tipo de análisis, parámetros, bytes
+subidos): la misma foto o el mismo .dat devuelven el resultado guardado en
+milisegundos, venga del dispositivo que venga.
+
+Dos niveles:
+    memoria  LRU por worker, acotada en bytes de JSON serializado
+    disco    SQLite (modo WAL) compartido por todos los workers de gunicorn
+
+Desde el bucle de eventos se usan obtener_async/guardar_async: el nivel
+en memoria se resuelve ahí mismo y el de disco va a un hilo.
+
+    MEDISUMMA_CACHE           0 desactiva la caché (por defecto: 1)
+    MEDISUMMA_CACHE_DIR       directorio del SQLite (por defecto: temporal del sistema)
+    MEDISUMMA_CACHE_MB        tope del nivel en memoria (por defecto: 32)
+    MEDISUMMA_CACHE_DISCO_MB  tope del nivel en disco (por defecto: 512)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from config import real_env
+
+CACHE_ACTIVA   = os.environ.get("MEDISUMMA_CACHE", "1") != "0"
+CACHE_DIR      = os.environ.get("MEDISUMMA_CACHE_DIR") or tempfile.gettempdir()
+CACHE_MB       = real_env("MEDISUMMA_CACHE_MB", 32)
+CACHE_DISCO_MB = real_env("MEDISUMMA_CACHE_DISCO_MB", 512)
+
+
+def huella_codigo(*rutas: str) -> str:
+    """
+    Huella corta del código fuente del motor: cualquier cambio desplegado
+    invalida las entradas antiguas sin tener que subir versiones a mano.
+    """
+    h = hashlib.sha256()
+    for ruta in rutas:
+        try:
+            with open(ruta, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(ruta.encode())
+    return h.hexdigest()[:12]
+
+
+class CacheResultados:
+    """Caché de dos niveles (LRU en memoria + SQLite compartido)."""
+
+    def __init__(self, version_motor: str, activa: bool = CACHE_ACTIVA,
+                 directorio: str = CACHE_DIR, max_mb: float = CACHE_MB,
+                 max_disco_mb: float = CACHE_DISCO_MB):
+        self.version_motor = version_motor
+        self.activa = activa
+        self.ruta_db = os.path.join(directorio, "medisumma_resultados.sqlite")
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_bytes_disco = int(max_disco_mb * 1024 * 1024)
+        self._memoria = OrderedDict()  # clave → JSON (bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._lock_disco = threading.Lock()   # una conexión, un hilo a la vez
+        self._conexion = None
+        self._pid = None
+        self._escrituras = 0
+        self.contadores = {"aciertos_memoria": 0, "aciertos_disco": 0,
+                           "fallos": 0, "guardados": 0, "expulsados": 0}
+
+    # ── Claves ───────────────────────────────────────────────────────────
+    def nueva_huella(self, tipo: str, **parametros):
+        """Hash incremental ya sembrado con versión, tipo y parámetros."""
+        h = hashlib.sha256()
+        h.update(self.version_motor.encode())
+        h.update(tipo.encode())
+        h.update(json.dumps(parametros, sort_keys=True).encode())
+        return h
+
+    def clave(self, tipo: str, contenido: bytes, **parametros) -> str:
+        h = self.nueva_huella(tipo, **parametros)
+        h.update(contenido)
+        return h.hexdigest()
+
+    # ── Nivel disco ──────────────────────────────────────────────────────
+    def _db(self):
+        # Una conexión por proceso: las conexiones SQLite no sobreviven a fork
+        if self._conexion is None or self._pid != os.getpid():
+            con = sqlite3.connect(self.ruta_db, timeout=5.0,
+                                  check_same_thread=False,
+                                  isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS resultados (
+                               clave    TEXT PRIMARY KEY,
+                               valor    BLOB NOT NULL,
+                               tamano   INTEGER NOT NULL,
+                               accedido REAL NOT NULL)""")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_accedido "
+                        "ON resultados(accedido)")
+            self._conexion, self._pid = con, os.getpid()
+        return self._conexion
+
+    def _recortar_disco(self, con):
+        total = con.execute(
+            "SELECT COALESCE(SUM(tamano), 0) FROM resultados").fetchone()[0]
+        while total > self.max_bytes_disco:
+            filas = con.execute(
+                "SELECT clave, tamano FROM resultados "
+                "ORDER BY accedido LIMIT 64").fetchall()
+            if not filas:
+                break
+            con.executemany("DELETE FROM resultados WHERE clave = ?",
+                            [(c,) for c, _ in filas])
+            total -= sum(t for _, t in filas)
+
+    def _de_disco(self, clave: str):
+        try:
+            with self._lock_disco:
+                con = self._db()
+                fila = con.execute(
+                    "SELECT valor FROM resultados WHERE clave = ?",
+                    (clave,)).fetchone()
+                if fila is not None:
+                    con.execute("UPDATE resultados SET accedido = ? "
+                                "WHERE clave = ?", (time.time(), clave))
+        except sqlite3.Error:
+            fila = None
+        if fila is None:
+            self.contadores["fallos"] += 1
+            return None
+        valor = bytes(fila[0])
+        self._a_memoria(clave, valor)
+        self.contadores["aciertos_disco"] += 1
+        return valor
+
+    def _a_disco(self, clave: str, valor: bytes):
+        try:
+            with self._lock_disco:
+                con = self._db()
+                con.execute("INSERT OR REPLACE INTO resultados "
+                            "(clave, valor, tamano, accedido) VALUES (?, ?, ?, ?)",
+                            (clave, valor, len(valor), time.time()))
+                self._escrituras += 1
+                if self._escrituras % 32 == 0:
+                    self._recortar_disco(con)
+        except sqlite3.Error:
+            pass  # el disco es un nivel opcional: sin él seguimos en memoria
+
+    # ── Nivel memoria ────────────────────────────────────────────────────
+    def _a_memoria(self, clave: str, valor: bytes):
+        with self._lock:
+            previo = self._memoria.pop(clave, None)
+            if previo is not None:
+                self._bytes -= len(previo)
+            self._memoria[clave] = valor
+            self._bytes += len(valor)
+            while self._bytes > self.max_bytes and len(self._memoria) > 1:
+                _, expulsado = self._memoria.popitem(last=False)
+                self._bytes -= len(expulsado)
+                self.contadores["expulsados"] += 1
+
+    def _de_memoria(self, clave: str):
+        with self._lock:
+            valor = self._memoria.get(clave)
+            if valor is not None:
+                self._memoria.move_to_end(clave)
+                self.contadores["aciertos_memoria"] += 1
+        return valor
+
+    def _serializar(self, clave: str, resultado: dict) -> bytes:
+        """JSON del resultado, ya retenido en memoria."""
+        valor = json.dumps(resultado, ensure_ascii=False).encode()
+        self._a_memoria(clave, valor)
+        self.contadores["guardados"] += 1
+        return valor
+
+    # ── API ──────────────────────────────────────────────────────────────
+    def obtener(self, clave: str):
+        """Resultado guardado (dict nuevo en cada llamada) o None."""
+        if not self.activa:
+            return None
+        valor = self._de_memoria(clave)
+        if valor is None:
+            valor = self._de_disco(clave)
+        return None if valor is None else json.loads(valor)
+
+    async def obtener_async(self, clave: str):
+        """obtener() sin bloquear el bucle: SQLite solo si falla la memoria."""
+        if not self.activa:
+            return None
+        valor = self._de_memoria(clave)
+        if valor is None:
+            valor = await asyncio.to_thread(self._de_disco, clave)
+        return None if valor is None else json.loads(valor)
+
+    def guardar(self, clave: str, resultado: dict):
+        if self.activa:
+            self._a_disco(clave, self._serializar(clave, resultado))
+
+    async def guardar_async(self, clave: str, resultado: dict):
+        """guardar() sin bloquear el bucle: la escritura en SQLite va a un hilo."""
+        if self.activa:
+            valor = self._serializar(clave, resultado)
+            await asyncio.to_thread(self._a_disco, clave, valor)
+
+    def estadisticas(self) -> dict:
+        c = self.contadores
+        aciertos = c["aciertos_memoria"] + c["aciertos_disco"]
+        total = aciertos + c["fallos"]
+        return {
+            **c,
+            "activa":         self.activa,
+            "tasa_acierto":   round(aciertos / total, 4) if total else 0.0,
+            "entradas_memoria": len(self._memoria),
+            "bytes_memoria":  self._bytes,
+        }
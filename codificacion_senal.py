@@ -0,0 +1,114 @@
+"""
+MediSumma — Codificación compacta de señales en las respuestas
+Por defecto las señales (senal_grafica, y senal_tiempos_s si va decimada)
+viajan como lista JSON de float64, que es lo que espera EcgAnalysisResult
+en la app Flutter. Un cliente que lo pida puede recibirlas empaquetadas:
+
+    ?senal=f32     base64 de float32 little-endian (4 bytes por muestra)
+    ?senal=i16     base64 de int16 little-endian (2 bytes por muestra);
+                   valor = entero · escala + desplazamiento
+    Accept: application/msgpack
+                   respuesta entera en msgpack, con la señal como binario
+                   (bin) en lugar de base64; por defecto float32. Usa el
+                   paquete msgpack (requirements.txt); si no está
+                   instalado, se responde JSON.
+
+Una señal empaquetada es un objeto {codificacion, dtype, n, escala,
+desplazamiento, datos}. Los instantes (senal_tiempos_s) van siempre en
+float32 relativos al primero, que viaja en `desplazamiento` (float64): en
+un estudio de 24 h un float32 absoluto solo resuelve ~8 ms.
+
+La codificación se aplica al responder, después de la caché de
+resultados, que sigue guardando el JSON de siempre. Toda respuesta
+negociada lleva Vary: Accept, también la JSON, para que un proxy no sirva
+a un cliente la codificación pedida por otro.
+"""
+
+import base64
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:       # sin msgpack, solo JSON
+    msgpack = None
+
+CAMPOS_SENAL   = ("senal_grafica",)
+CAMPOS_TIEMPO  = ("senal_tiempos_s",)   # siempre float32 relativo al primer instante
+TIPOS_SENAL    = ("json", "f32", "i16")
+TIPOS_MSGPACK  = ("application/msgpack", "application/x-msgpack")
+MEDIA_MSGPACK  = "application/msgpack"
+CABECERAS      = {"Vary": "Accept"}
+
+
+def empaquetar_senal(valores, tipo: str = "f32", binario: bool = False,
+                     relativo: bool = False) -> dict:
+    """
+    Empaqueta una señal como float32 o como int16 cuantizado al rango de
+    la señal (error máximo: escala / 2). relativo=True guarda el float32
+    como diferencia con el primer valor, que va en `desplazamiento`.
+    binario=True deja los bytes tal cual (msgpack); si no, van en base64.
+    """
+    x = np.asarray(valores, dtype=np.float64)
+    escala, desplazamiento = 1.0, 0.0
+    if tipo == "i16":
+        lo, hi = (float(x.min()), float(x.max())) if len(x) else (0.0, 0.0)
+        desplazamiento = (hi + lo) / 2
+        escala = (hi - lo) / 65534 or 1.0
+        datos = np.clip(np.rint((x - desplazamiento) / escala),
+                        -32767, 32767).astype("<i2").tobytes()
+        dtype = "int16"
+    else:
+        if relativo and len(x):
+            desplazamiento = float(x[0])
+        datos = (x - desplazamiento).astype("<f4").tobytes()
+        dtype = "float32"
+    return {
+        "codificacion":   "binario" if binario else "base64",
+        "dtype":          dtype,
+        "n":              int(len(x)),
+        "escala":         escala,
+        "desplazamiento": desplazamiento,
+        "datos":          datos if binario else base64.b64encode(datos).decode("ascii"),
+    }
+
+
+def desempaquetar_senal(paquete: dict) -> np.ndarray:
+    """Inversa de empaquetar_senal (para clientes Python y pruebas)."""
+    datos = paquete["datos"]
+    if paquete["codificacion"] == "base64":
+        datos = base64.b64decode(datos)
+    dtype = "<i2" if paquete["dtype"] == "int16" else "<f4"
+    x = np.frombuffer(datos, dtype=dtype).astype(np.float64)
+    return x * paquete["escala"] + paquete["desplazamiento"]
+
+
+def quiere_msgpack(accept: str) -> bool:
+    """True si el cliente acepta msgpack y el paquete está instalado."""
+    if msgpack is None or not accept:
+        return False
+    tipos = {parte.split(";")[0].strip().lower() for parte in accept.split(",")}
+    return not tipos.isdisjoint(TIPOS_MSGPACK)
+
+
+def responder(resultado: dict, senal: str = "json", accept: str = ""):
+    """
+    Respuesta negociada: JSON con el dict tal cual (por defecto) o con las
+    señales en base64, o msgpack. No modifica `resultado`.
+    """
+    binario = quiere_msgpack(accept)
+    if senal == "json" and not binario:
+        return JSONResponse(resultado, headers=CABECERAS)
+    tipo = "f32" if senal == "json" else senal
+    salida = dict(resultado)
+    for campo in CAMPOS_SENAL:
+        if isinstance(salida.get(campo), list):
+            salida[campo] = empaquetar_senal(salida[campo], tipo, binario)
+    for campo in CAMPOS_TIEMPO:
+        if isinstance(salida.get(campo), list):
+            salida[campo] = empaquetar_senal(salida[campo], "f32", binario, relativo=True)
+    if binario:
+        return Response(msgpack.packb(salida, use_bin_type=True),
+                        media_type=MEDIA_MSGPACK, headers=CABECERAS)
+    return JSONResponse(salida, headers=CABECERAS)
@@ -0,0 +1,30 @@
+"""
+MediSumma — Ajustes numéricos por variables de entorno
+Lectura tolerante de los MEDISUMMA_* numéricos, compartida por todos los
+módulos: un valor vacío o mal escrito no impide arrancar el servidor (se
+usa el valor por defecto) y uno por debajo del mínimo se sube al mínimo.
+Cada módulo documenta sus propias variables.
+"""
+
+import math
+import os
+
+
+def entero_env(nombre: str, defecto: int, minimo: int = 0) -> int:
+    """Entero de la variable `nombre`, o `defecto` si falta o no es válida."""
+    try:
+        valor = int(os.environ.get(nombre, defecto))
+    except ValueError:
+        valor = defecto
+    return max(minimo, valor)
+
+
+def real_env(nombre: str, defecto: float, minimo: float = 0.0) -> float:
+    """Real de la variable `nombre`, o `defecto` si falta, no es válida o no es finita."""
+    try:
+        valor = float(os.environ.get(nombre, defecto))
+    except ValueError:
+        valor = float(defecto)
+    if not math.isfinite(valor):
+        valor = float(defecto)
+    return max(float(minimo), valor)
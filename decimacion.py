@@ -0,0 +1,183 @@
+"""
+MediSumma — Decimación para visualización
+Reduce cualquier tramo de una señal a N puntos de pantalla sin perder los
+picos QRS, por bloques y en O(n):
+
+    minmax  N/2 cubetas de muestras consecutivas; de cada una se conservan
+            el mínimo y el máximo, en orden temporal (envolvente exacta).
+    lttb    Largest-Triangle-Three-Buckets: un punto por cubeta, el que
+            forma el triángulo de mayor área con sus vecinas. En lugar del
+            punto elegido en la cubeta anterior se usa su media, lo que
+            rompe la dependencia secuencial y permite resolver todas las
+            cubetas de un bloque a la vez; la forma resultante es la misma
+            a efectos de visualización.
+
+Las cubetas tienen un tamaño fijo calculado sobre la longitud total del
+tramo, así que el resultado no depende del tamaño de bloque con que se
+alimente el Decimador.
+"""
+
+import math
+
+import numpy as np
+
+from filtros import FiltroEstado
+from ingesta import ventanas
+
+DECIMACION_METODOS = ("minmax", "lttb")
+DECIMACION_BLOQUE  = 1 << 18   # muestras leídas y filtradas por iteración
+DECIMACION_MAX     = 20000     # puntos de pantalla admitidos
+DECIMACION_CALENTAR_S = 2.0    # s filtrados antes del tramo y descartados
+
+
+class Decimador:
+    """
+    Decimación incremental de una señal de `n_total` muestras a `puntos`
+    puntos: agregar(bloque) tantas veces como haga falta y finalizar()
+    devuelve (índices, valores). Si la señal ya cabe en `puntos`, se
+    devuelve entera.
+    """
+
+    def __init__(self, n_total: int, puntos: int, metodo: str = "minmax"):
+        if metodo not in DECIMACION_METODOS:
+            raise ValueError(f"método de decimación desconocido: {metodo}")
+        if puntos < 2:
+            raise ValueError("se necesitan al menos 2 puntos")
+        self.metodo = metodo
+        self.identidad = n_total <= puntos
+        cubetas = puntos // 2 if metodo == "minmax" else puntos
+        self.k = 1 if self.identidad else math.ceil(n_total / cubetas)
+        self._pendiente = np.empty(0)
+        self._inicio = 0              # índice absoluto de _pendiente[0]
+        self._media_previa = None     # (x, y) de la cubeta anterior (lttb)
+        self._indices, self._valores = [], []
+
+    def _emitir(self, idx: np.ndarray, val: np.ndarray):
+        self._indices.append(idx)
+        self._valores.append(val)
+
+    def _minmax(self, cubetas: np.ndarray, base: int):
+        m, k = cubetas.shape
+        filas = np.arange(m)
+        i_min = np.argmin(cubetas, axis=1)
+        i_max = np.argmax(cubetas, axis=1)
+        primero = np.minimum(i_min, i_max)
+        segundo = np.maximum(i_min, i_max)
+        idx = np.stack([primero, segundo], axis=1) + (filas * k)[:, None]
+        val = np.stack([cubetas[filas, primero], cubetas[filas, segundo]], axis=1)
+        self._emitir(idx.ravel() + base, val.ravel())
+
+    def _lttb(self, cubetas: np.ndarray, base: int, siguiente):
+        """
+        Elige un punto por fila de `cubetas` (m × k). `siguiente` es (x, y)
+        del vértice que sigue a la última fila.
+        """
+        m, k = cubetas.shape
+        centros = base + np.arange(m) * k + (k - 1) / 2
+        medias = cubetas.mean(axis=1)
+        previa = self._media_previa or (float(base), float(cubetas[0, 0]))
+        xa = np.concatenate([[previa[0]], centros[:-1]])
+        ya = np.concatenate([[previa[1]], medias[:-1]])
+        xc = np.concatenate([centros[1:], [siguiente[0]]])
+        yc = np.concatenate([medias[1:], [siguiente[1]]])
+        xb = base + np.arange(m)[:, None] * k + np.arange(k)[None, :]
+        area = np.abs((xa - xc)[:, None] * (cubetas - ya[:, None])
+                      - (xa[:, None] - xb) * (yc - ya)[:, None])
+        elegido = np.argmax(area, axis=1)
+        filas = np.arange(m)
+        self._emitir(xb[filas, elegido], cubetas[filas, elegido])
+        self._media_previa = (float(centros[-1]), float(medias[-1]))
+
+    def agregar(self, bloque: np.ndarray):
+        buf = np.concatenate([self._pendiente, np.asarray(bloque, dtype=np.float64)])
+        if self.identidad:
+            self._emitir(self._inicio + np.arange(len(buf)), buf)
+            self._inicio += len(buf)
+            return
+        m = len(buf) // self.k
+        # lttb necesita la media de la cubeta siguiente: la última completa espera
+        listas = m - 1 if self.metodo == "lttb" else m
+        if listas > 0:
+            cubetas = buf[:listas * self.k].reshape(listas, self.k)
+            if self.metodo == "minmax":
+                self._minmax(cubetas, self._inicio)
+            else:
+                sig = buf[listas * self.k:(listas + 1) * self.k]
+                self._lttb(cubetas, self._inicio,
+                           (self._inicio + listas * self.k + (self.k - 1) / 2,
+                            float(sig.mean())))
+            buf = buf[listas * self.k:]
+            self._inicio += listas * self.k
+        self._pendiente = buf
+
+    def finalizar(self):
+        buf = self._pendiente
+        if len(buf) and not self.identidad:
+            completas = len(buf) // self.k
+            resto = len(buf) - completas * self.k
+            if self.metodo == "minmax":
+                if completas:
+                    self._minmax(buf[:completas * self.k].reshape(completas, self.k),
+                                 self._inicio)
+                if resto:
+                    self._minmax(buf[completas * self.k:][None, :],
+                                 self._inicio + completas * self.k)
+            else:
+                ultimo = (float(self._inicio + len(buf) - 1), float(buf[-1]))
+                if completas:
+                    self._lttb(buf[:completas * self.k].reshape(completas, self.k),
+                               self._inicio, ultimo)
+                if resto:
+                    # La cubeta final incompleta: su último punto, como en LTTB
+                    self._emitir(np.array([self._inicio + len(buf) - 1]), buf[-1:])
+        self._pendiente = np.empty(0)
+        if not self._indices:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        idx = np.concatenate(self._indices).astype(np.int64)
+        val = np.concatenate(self._valores)
+        # minmax: si mín y máx coinciden (cubeta plana) queda un duplicado
+        unicos = np.concatenate([[True], np.diff(idx) > 0])
+        return idx[unicos], val[unicos]
+
+
+def decimar(senal: np.ndarray, puntos: int, metodo: str = "minmax"):
+    """Decimación de una señal en memoria → (índices, valores)."""
+    decimador = Decimador(len(senal), puntos, metodo)
+    decimador.agregar(senal)
+    return decimador.finalizar()
+
+
+def decimar_tramo(canal: np.ndarray, fs: float, puntos: int,
+                  metodo: str = "minmax", desde_s: float = 0.0,
+                  hasta_s: float = None, banda=(0.5, 40.0)) -> dict:
+    """
+    Filtra y decima el tramo [desde_s, hasta_s) de un canal crudo (vector
+    int16, p. ej. una vista de memmap) leyéndolo por bloques: memoria
+    constante sea cual sea la duración. El filtro causal se calienta con
+    DECIMACION_CALENTAR_S previos al tramo para no dibujar su transitorio;
+    banda=None decima la señal sin filtrar.
+    Devuelve {t_s, valores, desde_s, hasta_s, metodo, puntos, muestras_origen}.
+    """
+    n = len(canal)
+    i0 = min(n, max(0, int(round(desde_s * fs))))
+    i1 = n if hasta_s is None else min(n, max(i0, int(round(hasta_s * fs))))
+    decimador = Decimador(i1 - i0, puntos, metodo)
+    filtro = FiltroEstado('band', banda, fs) if banda else None
+
+    calentar = canal[max(0, i0 - int(DECIMACION_CALENTAR_S * fs)):i0]
+    if filtro is not None and len(calentar):
+        filtro.aplicar(np.asarray(calentar, dtype=np.float64))
+    for _, bloque in ventanas(canal[i0:i1], DECIMACION_BLOQUE):
+        bloque = np.asarray(bloque, dtype=np.float64)
+        decimador.agregar(bloque if filtro is None else filtro.aplicar(bloque))
+    idx, val = decimador.finalizar()
+
+    return {
+        "t_s":             np.round((idx + i0) / fs, 4).tolist(),
+        "valores":         np.round(val, 3).tolist(),
+        "desde_s":         round(i0 / fs, 3),
+        "hasta_s":         round(i1 / fs, 3),
+        "metodo":          metodo,
+        "puntos":          int(len(idx)),
+        "muestras_origen": int(i1 - i0),
+    }
@@ -0,0 +1,197 @@
+"""
+MediSumma — Capa de ejecución CPU
+Saca el trabajo pesado (OpenCV / SciPy) del event loop de asyncio y lo envía
+a un pool de procesos precalentado, con una cola acotada: cuando está llena
+se responde 503 de inmediato en lugar de acumular peticiones.
+
+El pool del arranque se crea con fork (rápido, hereda lo ya importado):
+aún no ha corrido ningún asyncio.to_thread. El que se recrea tras caerse
+un hijo, con forkserver: un hijo forkeado entonces heredaría tomados los
+locks que esos hilos tuvieran (caché de resultados, cola de trabajos) y
+se bloquearía en ellos.
+
+Configuración por variables de entorno:
+    MEDISUMMA_EJECUTOR   proceso | hilo | inline   (por defecto: proceso)
+    MEDISUMMA_PROCESOS   trabajadores del pool      (por defecto: nº de CPUs, máx 4)
+    MEDISUMMA_COLA_MAX   tareas en espera además de las que se ejecutan (por defecto: 8)
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException
+
+from config import entero_env
+
+MODO_EJECUTOR = os.environ.get("MEDISUMMA_EJECUTOR", "proceso").lower()
+N_TRABAJADORES = entero_env("MEDISUMMA_PROCESOS", min(4, os.cpu_count() or 1), minimo=1)
+COLA_MAX = entero_env("MEDISUMMA_COLA_MAX", 8)
+
+
+def _calentar():
+    """Tarea vacía: fuerza el arranque del proceso hijo antes del primer request."""
+    return os.getpid()
+
+
+def _contexto_procesos(reinicio: bool):
+    """fork en el arranque; forkserver (o spawn) al recrear el pool."""
+    if not reinicio:
+        return multiprocessing.get_context("fork")
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+
+
+class EjecutorCPU:
+    """
+    Pool de ejecución con admisión acotada.
+    Capacidad total = trabajadores + cola_max; por encima → HTTP 503.
+    El contador de pendientes solo se toca desde el event loop (sin locks).
+    """
+
+    def __init__(self, modo: str = MODO_EJECUTOR,
+                 trabajadores: int = N_TRABAJADORES,
+                 cola_max: int = COLA_MAX):
+        if modo not in ("proceso", "hilo", "inline"):
+            raise ValueError(f"MEDISUMMA_EJECUTOR inválido: {modo}")
+        self.modo = modo
+        self.trabajadores = trabajadores
+        self.cola_max = cola_max
+        self.pendientes = 0
+        self.rechazadas = 0
+        self._pool = None
+        self._inicializador = None
+        self._arranque = None
+
+    @property
+    def capacidad(self) -> int:
+        return self.trabajadores + self.cola_max
+
+    @property
+    def en_cola(self) -> int:
+        """Tareas admitidas que aún esperan un trabajador libre."""
+        return max(0, self.pendientes - self.trabajadores)
+
+    def iniciar(self, inicializador=None, reinicio: bool = False):
+        """
+        Crea el pool y arranca todos los trabajadores (precalentado). Bloquea
+        hasta que están listos: fuera del arranque, llamar desde un hilo y
+        con reinicio=True (ver _pool_listo).
+        """
+        self._inicializador = inicializador
+        if self.modo == "inline":
+            return
+        if self.modo == "hilo":
+            self._pool = ThreadPoolExecutor(max_workers=self.trabajadores,
+                                            thread_name_prefix="medisumma-cpu",
+                                            initializer=inicializador)
+            return
+        pool = ProcessPoolExecutor(
+            max_workers=self.trabajadores,
+            mp_context=_contexto_procesos(reinicio),
+            initializer=inicializador)
+        try:
+            futuros = [pool.submit(_calentar) for _ in range(self.trabajadores)]
+            for f in futuros:
+                f.result()
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._pool = pool   # visible solo ya caliente
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def admitir(self):
+        """Reserva un hueco en la cola o lanza 503 si está llena."""
+        if self.pendientes >= self.capacidad:
+            self.rechazadas += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado — demasiados análisis en curso, reintenta en unos segundos",
+                headers={"Retry-After": "2"})
+        self.pendientes += 1
+
+    def liberar(self):
+        self.pendientes -= 1
+
+    async def ejecutar(self, fn, *args):
+        """Ejecuta fn(*args) fuera del event loop respetando la cola acotada."""
+        self.admitir()
+        return await self.ejecutar_liberando(fn, *args)
+
+    async def ejecutar_admitida(self, fn, *args):
+        """Como ejecutar(), para llamadores que ya reservaron su hueco."""
+        if self.modo == "inline":
+            return fn(*args)
+        return await self._en_pool(fn, args)
+
+    async def ejecutar_liberando(self, fn, *args):
+        """
+        Como ejecutar_admitida(), y libera el hueco cuando el trabajo acaba
+        en el pool, no cuando deja de esperarlo quien lo pidió: si este se
+        cancela (cliente desconectado), el hijo sigue ocupado y la admisión
+        tiene que seguir contándolo.
+        """
+        if self.modo == "inline":
+            try:
+                return fn(*args)
+            finally:
+                self.liberar()
+        loop = asyncio.get_running_loop()
+        enviado = False
+
+        def al_terminar(_):
+            try:
+                loop.call_soon_threadsafe(self.liberar)
+            except RuntimeError:
+                pass            # bucle ya cerrado (parada del servidor)
+
+        def enviar(futuro):
+            nonlocal enviado
+            enviado = True
+            futuro.add_done_callback(al_terminar)
+
+        try:
+            return await self._en_pool(fn, args, enviar)
+        finally:
+            if not enviado:
+                self.liberar()   # no llegó al pool
+
+    async def _en_pool(self, fn, args, enviado=None):
+        pool = await self._pool_listo()
+        try:
+            futuro = pool.submit(fn, *args)
+            if enviado is not None:
+                enviado(futuro)
+            return await asyncio.wrap_future(futuro)
+        except BrokenProcessPool:
+            # Un hijo murió (OOM, señal): el siguiente recrea el pool. Solo
+            # se cierra si es aún el actual, no uno ya recreado por otro.
+            if self._pool is pool:
+                self.cerrar()
+            raise HTTPException(status_code=503,
+                                detail="Trabajador de análisis reiniciado — reintenta",
+                                headers={"Retry-After": "1"})
+
+    async def _pool_listo(self):
+        """
+        El pool, creándolo si no existe (tras cerrar() por un hijo caído).
+        Se crea en un hilo —el precalentado espera a los hijos— y una sola
+        vez aunque lo pidan varias peticiones a la vez.
+        """
+        if self._pool is None:
+            if self._arranque is None:
+                self._arranque = asyncio.ensure_future(
+                    asyncio.to_thread(self.iniciar, self._inicializador, True))
+            arranque = self._arranque
+            try:
+                await asyncio.shield(arranque)
+            finally:
+                if arranque.done() and self._arranque is arranque:
+                    self._arranque = None
+        return self._pool
@@ -0,0 +1,375 @@
+"""
+MediSumma — Almacén de estudios Holter analizados
+Cada estudio completo analizado deja en disco un índice de latidos
+columnar, direccionado por un ID derivado del contenido subido: las
+preguntas posteriores («la pausa más larga», «la FC a las 03:15», «los
+latidos de la plantilla 2») se responden sobre él con búsqueda binaria,
+sin volver a subir ni a tocar la señal.
+
+Un estudio es un directorio <ID>/ con un .npy por columna (memmap al
+abrirlo) y estudio.json con los metadatos:
+
+    posicion          int64    muestra del pico R (ordenada)
+    rr                int32    muestras desde el latido anterior (0 en el primero)
+    amplitud          float32  mV, la mayor entre canales
+    clase             uint8    índice en CLASES_INDICE (N, S, V, X)
+    plantilla         int16    plantilla del agrupamiento (-1: ninguna)
+    <grupo>_orden     int32    latidos de cada clase / plantilla, en orden temporal
+    <grupo>_posicion  int64    su posición, para buscar por tiempo dentro del grupo
+    <grupo>_inicios   int64    dónde empieza cada grupo en las dos anteriores
+    rr_orden          int32    latidos ordenados por RR
+    rr_ordenado       int32    los RR en ese orden (pausas ≥ x: una búsqueda)
+
+Un rango de tiempo son dos searchsorted sobre `posicion`; un rango dentro
+de una clase o plantilla, dos sobre su tramo de <grupo>_posicion.
+
+Junto al índice se guarda la señal, senal.dat (int16 intercalado, muestras
+× canales): un enlace duro al archivo subido si ya tenía ese formato, o
+una copia por bloques si no (212, cabecera con desplazamiento). Una
+ventana [t0, t1) de un canal se lee del memmap con solo el contexto que
+necesita el filtro (filtros.relleno_filtro), así que su coste no depende
+de dónde caiga dentro de un estudio de 24 h. Para una vista de conjunto,
+decimada() reduce cualquier tramo (el estudio entero incluido) a N puntos
+leyéndolo por bloques (decimacion.decimar_tramo).
+
+El índice se escribe en un directorio provisional dentro del almacén y se
+publica con un rename atómico; al publicar se borran los estudios más
+antiguos si el almacén supera su tope.
+
+    MEDISUMMA_ESTUDIOS_DIR   directorio del almacén (por defecto: temporal del sistema)
+    MEDISUMMA_ESTUDIOS_MB    tope del almacén en disco (por defecto: 4096)
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from agrupamiento import CLASES
+from config import real_env
+from decimacion import decimar_tramo
+from filtros import filtrar, relleno_filtro
+from formato_holter import abrir_registro
+
+ESTUDIOS_DIR = (os.environ.get("MEDISUMMA_ESTUDIOS_DIR")
+                or os.path.join(tempfile.gettempdir(), "medisumma_estudios"))
+ESTUDIOS_MB  = real_env("MEDISUMMA_ESTUDIOS_MB", 4096)
+ESTUDIOS_ABIERTOS = 32        # índices abiertos (memmap) por worker
+ESTUDIOS_MAX_FILAS = 20000    # latidos por respuesta de consulta
+ESTUDIOS_VENTANA_MAX_S = 300.0   # s por ventana de señal
+ESTUDIOS_BLOQUE    = 1 << 20  # muestras por iteración al copiar la señal
+CLASES_INDICE = "".join(CLASES)
+_ID_VALIDO = re.compile(r"^[0-9a-f]{8,64}$")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  ESCRITURA
+# ─────────────────────────────────────────────────────────────────────────────
+
+def directorio_provisional() -> str:
+    """Directorio donde el análisis escribe el índice antes de publicarlo."""
+    os.makedirs(ESTUDIOS_DIR, exist_ok=True)
+    return tempfile.mkdtemp(prefix=".parcial_", dir=ESTUDIOS_DIR)
+
+
+def descartar_provisional(ruta: str):
+    """Borra un índice provisional que no llegó a publicarse."""
+    shutil.rmtree(ruta, ignore_errors=True)
+
+
+def _agrupado(codigos: np.ndarray, n_grupos: int, posicion: np.ndarray):
+    """(orden, posición en ese orden, inicios) de los latidos por código 0..n_grupos-1."""
+    orden = np.argsort(codigos, kind="stable").astype(np.int32)
+    inicios = np.concatenate([[0], np.cumsum(np.bincount(codigos, minlength=n_grupos))])
+    return orden, posicion[orden], inicios.astype(np.int64)
+
+
+def guardar_indice(directorio: str, picos: np.ndarray, fs: float, grupos: dict,
+                   **meta):
+    """
+    Escribe el índice de latidos en `directorio` (directorio_provisional):
+    picos del detector y agrupamiento.agrupar_latidos (amplitud en mV).
+    `meta` se añade a estudio.json (duración, canales, plantillas...).
+    """
+    posicion = np.asarray(picos, dtype=np.int64)
+    rr = np.diff(posicion, prepend=posicion[:1]).astype(np.int32)
+    clase = np.zeros(len(posicion), dtype=np.uint8)
+    for i, c in enumerate(CLASES_INDICE):
+        clase[grupos["clase"] == c] = i
+    plantilla = grupos["plantilla"].astype(np.int16)
+    n_plantillas = int(plantilla.max()) + 1 if len(plantilla) else 0
+
+    columnas = {
+        "posicion":  posicion,
+        "rr":        rr,
+        "amplitud":  grupos["amplitud"].astype(np.float32),
+        "clase":     clase,
+        "plantilla": plantilla,
+    }
+    for nombre, codigos, n in (("clase", clase, len(CLASES_INDICE)),
+                               ("plantilla", plantilla + 1, n_plantillas + 1)):
+        orden, pos, inicios = _agrupado(codigos.astype(np.int64), n, posicion)
+        columnas.update({f"{nombre}_orden": orden, f"{nombre}_posicion": pos,
+                         f"{nombre}_inicios": inicios})
+    rr_orden = np.argsort(rr, kind="stable").astype(np.int32)
+    columnas.update({"rr_orden": rr_orden, "rr_ordenado": rr[rr_orden]})
+
+    for nombre, valores in columnas.items():
+        np.save(os.path.join(directorio, nombre + ".npy"), valores)
+    with open(os.path.join(directorio, "estudio.json"), "w", encoding="utf-8") as f:
+        json.dump({**meta, "fs": fs, "latidos": int(len(posicion)),
+                   "clases": CLASES_INDICE, "creado": time.time()}, f)
+
+
+def guardar_senal(directorio: str, ruta: str, registro) -> dict:
+    """
+    Deja las muestras de `registro` (abierto desde `ruta`) en senal.dat y
+    devuelve la cabecera con que leerlo (formato 16, sin desplazamiento).
+    """
+    destino = os.path.join(directorio, "senal.dat")
+    n, n_canales = registro.muestras.shape
+    cabecera = {**registro.cabecera, "formato": 16, "desplazamiento": 0, "n_muestras": n}
+    tal_cual = (registro.cabecera["formato"] == 16
+                and not registro.cabecera.get("desplazamiento")
+                and os.path.getsize(ruta) == 2 * n * n_canales)
+    if tal_cual:
+        try:
+            os.link(ruta, destino)
+            return cabecera
+        except OSError:     # otro sistema de archivos: copiar
+            pass
+    with open(destino, "wb") as f:
+        for i in range(0, n, ESTUDIOS_BLOQUE):
+            f.write(np.ascontiguousarray(registro.muestras[i:i + ESTUDIOS_BLOQUE],
+                                         dtype="<i2").tobytes())
+    return cabecera
+
+
+def publicar(provisional: str, estudio_id: str) -> str:
+    """
+    Mueve el índice provisional a su sitio definitivo (rename atómico). Si
+    el estudio ya existía, se conserva el existente. Devuelve su ruta.
+    """
+    destino = os.path.join(ESTUDIOS_DIR, estudio_id)
+    try:
+        os.rename(provisional, destino)
+    except OSError:
+        if not os.path.isdir(destino):
+            raise
+        descartar_provisional(provisional)
+    _purgar(conservar=estudio_id)
+    return destino
+
+
+def _purgar(conservar: str = None):
+    """Borra los estudios más antiguos mientras el almacén pase de ESTUDIOS_MB."""
+    estudios = []
+    for entrada in os.scandir(ESTUDIOS_DIR):
+        if not entrada.is_dir() or entrada.name.startswith("."):
+            continue
+        tam = sum(a.stat().st_size for a in os.scandir(entrada.path) if a.is_file())
+        estudios.append((entrada.stat().st_mtime, tam, entrada.name))
+    total = sum(tam for _, tam, _ in estudios)
+    tope = ESTUDIOS_MB * 1024 * 1024
+    for _, tam, nombre in sorted(estudios):
+        if total <= tope:
+            break
+        if nombre == conservar:
+            continue
+        shutil.rmtree(os.path.join(ESTUDIOS_DIR, nombre), ignore_errors=True)
+        total -= tam
+
+
+def existe(estudio_id: str) -> bool:
+    return (bool(_ID_VALIDO.match(estudio_id or ""))
+            and os.path.isfile(os.path.join(ESTUDIOS_DIR, estudio_id, "estudio.json")))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CONSULTA
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _cargar(ruta: str) -> np.ndarray:
+    try:
+        return np.load(ruta, mmap_mode="r")
+    except ValueError:      # columna vacía: no se puede mapear
+        return np.load(ruta)
+
+
+class IndiceLatidos:
+    """
+    Índice de latidos de un estudio publicado, con las columnas en memmap.
+    Los tiempos de las consultas van en segundos; los resultados, en
+    índices de latido (filas de las columnas).
+    """
+
+    def __init__(self, directorio: str):
+        with open(os.path.join(directorio, "estudio.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.fs = self.meta["fs"]
+        self.col = {a.name[:-4]: _cargar(a.path) for a in os.scandir(directorio)
+                    if a.name.endswith(".npy")}
+        self._senal = None
+        if "senal" in self.meta and os.path.isfile(os.path.join(directorio, "senal.dat")):
+            self._senal = abrir_registro(os.path.join(directorio, "senal.dat"),
+                                         self.meta["senal"])
+
+    def __len__(self) -> int:
+        return len(self.col["posicion"])
+
+    def _muestra(self, t_s: float, defecto: int) -> int:
+        return defecto if t_s is None else int(round(t_s * self.fs))
+
+    def _grupo(self, nombre: str, codigo: int):
+        """(orden, posición) de los latidos de un grupo: tramos de las columnas."""
+        inicios = self.col[f"{nombre}_inicios"]
+        if not 0 <= codigo < len(inicios) - 1:
+            return self.col[f"{nombre}_orden"][:0], self.col[f"{nombre}_posicion"][:0]
+        a, b = int(inicios[codigo]), int(inicios[codigo + 1])
+        return self.col[f"{nombre}_orden"][a:b], self.col[f"{nombre}_posicion"][a:b]
+
+    def rango(self, desde_s: float = None, hasta_s: float = None, clase: str = None,
+              plantilla: int = None) -> np.ndarray:
+        """
+        Latidos con R en [desde_s, hasta_s), opcionalmente solo los de una
+        clase (letra) o una plantilla. Sin filtro devuelve un range de
+        índices; con filtro, el tramo de la columna de orden del grupo.
+        """
+        i0 = self._muestra(desde_s, 0)
+        i1 = self._muestra(hasta_s, np.iinfo(np.int64).max)
+        if clase is None and plantilla is None:
+            pos = self.col["posicion"]
+            return np.arange(np.searchsorted(pos, i0), np.searchsorted(pos, i1))
+        if clase is not None:
+            orden, pos = self._grupo("clase", CLASES_INDICE.find(clase))
+        else:
+            orden, pos = self._grupo("plantilla", plantilla + 1)
+        return orden[np.searchsorted(pos, i0):np.searchsorted(pos, i1)]
+
+    def resumen(self, desde_s: float = None, hasta_s: float = None) -> dict:
+        """
+        Agregados del rango: latidos y FC media salen de dos búsquedas
+        sobre `posicion`, el conteo por clase de dos por clase; solo el RR
+        máximo recorre las filas del rango.
+        """
+        i0 = self._muestra(desde_s, 0)
+        i1 = self._muestra(hasta_s, np.iinfo(np.int64).max)
+        pos = self.col["posicion"]
+        a, b = int(np.searchsorted(pos, i0)), int(np.searchsorted(pos, i1))
+        conteo = {}
+        for k, c in enumerate(CLASES_INDICE):
+            _, pos_clase = self._grupo("clase", k)
+            conteo[CLASES[c]] = int(np.searchsorted(pos_clase, i1)
+                                    - np.searchsorted(pos_clase, i0))
+        fc = rr_max = None
+        if b - a >= 2:
+            fc = round(60.0 * (b - a - 1) * self.fs / float(pos[b - 1] - pos[a]), 1)
+            rr_max = round(float(self.col["rr"][a + 1:b].max()) / self.fs, 3)
+        return {"latidos": b - a, "fc_media": fc, "rr_max_s": rr_max, "conteo": conteo}
+
+    def pausas(self, min_s: float, desde_s: float = None, hasta_s: float = None) -> np.ndarray:
+        """
+        Latidos que cierran un RR ≥ min_s, de mayor a menor pausa: una
+        búsqueda en rr_ordenado; el rango de tiempo filtra solo esas filas.
+        """
+        rr_min = max(1, int(np.ceil(min_s * self.fs)))
+        j = np.searchsorted(self.col["rr_ordenado"], rr_min)
+        filas = np.asarray(self.col["rr_orden"][j:])[::-1]
+        if desde_s is not None or hasta_s is not None:
+            # La pausa está entre el latido anterior y el que la cierra
+            fin = self.col["posicion"][filas]
+            inicio = fin - self.col["rr"][filas]
+            dentro = np.ones(len(filas), dtype=bool)
+            if desde_s is not None:
+                dentro &= fin > self._muestra(desde_s, 0)
+            if hasta_s is not None:
+                dentro &= inicio < self._muestra(hasta_s, 0)
+            filas = filas[dentro]
+        return filas
+
+    @property
+    def tiene_senal(self) -> bool:
+        return self._senal is not None
+
+    def _comprobar_canal(self, canal: int):
+        if self._senal is None:
+            raise ValueError("el estudio no conserva la señal")
+        if not 0 <= canal < self._senal.n_canales:
+            raise ValueError(f"canal {canal} fuera de rango (0..{self._senal.n_canales - 1})")
+
+    def ventana(self, desde_s: float, hasta_s: float, canal: int = 0,
+                banda=None) -> dict:
+        """
+        Ventana [desde_s, hasta_s) de un canal en mV, filtrada en `banda`
+        si se indica. Solo lee del memmap la ventana y el relleno del
+        filtro a cada lado. Lanza ValueError si la petición no es válida.
+        """
+        self._comprobar_canal(canal)
+        if hasta_s - desde_s > ESTUDIOS_VENTANA_MAX_S:
+            raise ValueError(f"la ventana supera {ESTUDIOS_VENTANA_MAX_S:g} s")
+        n = self._senal.n_muestras
+        i0 = min(n, max(0, int(round(desde_s * self.fs))))
+        i1 = min(n, max(i0, int(round(hasta_s * self.fs))))
+        relleno = relleno_filtro("band", banda, self.fs) if banda else 0
+        a, b = max(0, i0 - relleno), min(n, i1 + relleno)
+        c = self._senal.canales[canal]
+        x = (np.asarray(self._senal.canal(canal)[a:b], dtype=np.float64)
+             - c["base"]) / c["ganancia"]
+        if banda and len(x) >= 30:      # como filtrar_ecg: sosfiltfilt necesita margen
+            x = filtrar(x, "band", banda, self.fs)
+        return {"desde_s": round(i0 / self.fs, 4), "hasta_s": round(i1 / self.fs, 4),
+                "valores": x[i0 - a:i1 - a]}
+
+    def decimada(self, puntos: int, metodo: str = "minmax", desde_s: float = 0.0,
+                 hasta_s: float = None, canal: int = 0, banda=None) -> dict:
+        """
+        Tramo [desde_s, hasta_s) de un canal (por defecto, el estudio
+        entero) decimado a `puntos` puntos, en mV y filtrado en `banda` si
+        se indica; sin tope de duración. Lanza ValueError si la petición
+        no es válida. Devuelve el dict de decimar_tramo.
+        """
+        self._comprobar_canal(canal)
+        c = self._senal.canales[canal]
+        decimada = decimar_tramo(self._senal.canal(canal), self.fs, puntos, metodo,
+                                 desde_s, hasta_s, banda)
+        # Con filtro paso banda la línea base ya es 0; sin él, se resta
+        base = 0 if banda else c["base"]
+        decimada["valores"] = np.round((np.asarray(decimada["valores"]) - base)
+                                       / c["ganancia"], 4).tolist()
+        return decimada
+
+    def filas(self, indices: np.ndarray) -> dict:
+        """Columnas legibles de unas filas del índice (listas para JSON)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        rr = self.col["rr"][indices]
+        return {
+            "t_s":         np.round(self.col["posicion"][indices] / self.fs, 3).tolist(),
+            "rr_ms":       [None if r == 0 else round(1000.0 * r / self.fs, 1) for r in rr.tolist()],
+            "amplitud_mv": np.round(self.col["amplitud"][indices].astype(np.float64), 3).tolist(),
+            "clase":       [CLASES_INDICE[c] for c in self.col["clase"][indices].tolist()],
+            "plantilla":   self.col["plantilla"][indices].tolist(),
+        }
+
+
+@lru_cache(maxsize=ESTUDIOS_ABIERTOS)
+def _abrir(estudio_id: str, marca: float) -> IndiceLatidos:
+    return IndiceLatidos(os.path.join(ESTUDIOS_DIR, estudio_id))
+
+
+def abrir_indice(estudio_id: str) -> IndiceLatidos:
+    """
+    Índice de un estudio publicado, o None si no existe. Los índices
+    abiertos se reutilizan (la marca de tiempo invalida uno republicado).
+    """
+    if not existe(estudio_id):
+        return None
+    try:
+        marca = os.stat(os.path.join(ESTUDIOS_DIR, estudio_id, "estudio.json")).st_mtime
+        return _abrir(estudio_id, marca)
+    except (OSError, ValueError):
+        return None
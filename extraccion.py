@@ -0,0 +1,68 @@
+"""
+MediSumma — Motor de extracción de traza
+Convierte una franja binarizada (traza = >0, fondo = 0) en una señal 1D
+calculando el centroide de todas las columnas a la vez, sin bucles Python.
+Compartido por api_medica (FastAPI) y analista_ia (Flask).
+"""
+
+import numpy as np
+
+
+def centroides_columnas(franja: np.ndarray, metodo: str = "media"):
+    """
+    Posición vertical de la tinta en cada columna, en una sola pasada.
+    metodo = "media"   → media de las filas activas (suma ponderada / conteo).
+    metodo = "mediana" → mediana de las filas activas (rango por suma acumulada).
+    Devuelve (y, valido): y en filas desde arriba, valido = columna con tinta.
+    Las columnas vacías quedan con y = 0 y valido = False.
+    """
+    mascara = franja > 0
+    mh, w = mascara.shape
+    conteo = np.count_nonzero(mascara, axis=0)
+    valido = conteo > 0
+    y = np.zeros(w, dtype=np.float64)
+    if not np.any(valido):
+        return y, valido
+
+    if metodo == "media":
+        # Suma de índices de fila ponderada por la máscara (exacta en float64)
+        filas = np.arange(mh, dtype=np.float64)
+        suma = filas @ mascara.astype(np.float64)
+        y[valido] = suma[valido] / conteo[valido]
+    elif metodo == "mediana":
+        # Fila del k-ésimo píxel activo = primera fila donde cumsum ≥ k
+        acumulado = np.cumsum(mascara, axis=0, dtype=np.int32)
+        k_bajo = (conteo - 1) // 2 + 1
+        k_alto = conteo // 2 + 1
+        fila_baja = np.argmax(acumulado >= k_bajo, axis=0)
+        fila_alta = np.argmax(acumulado >= k_alto, axis=0)
+        y[valido] = (fila_baja[valido] + fila_alta[valido]) / 2.0
+    else:
+        raise ValueError(f"Método de centroide desconocido: {metodo}")
+
+    return y, valido
+
+
+def arrastrar_vacios(y: np.ndarray, valido: np.ndarray,
+                     inicial: float) -> np.ndarray:
+    """
+    Rellena cada columna vacía con el último valor válido a su izquierda
+    (o con `inicial` si aún no hubo ninguno). Vectorizado con maximum.accumulate.
+    """
+    idx = np.where(valido, np.arange(len(y)), -1)
+    idx = np.maximum.accumulate(idx)
+    return np.where(idx >= 0, y[np.maximum(idx, 0)], inicial)
+
+
+def interpolar_vacios(y: np.ndarray, valido: np.ndarray,
+                      inicial: float) -> np.ndarray:
+    """
+    Interpola linealmente las columnas vacías entre columnas válidas.
+    Con menos de 2 columnas válidas no hay recta posible: arrastra el valor.
+    """
+    if np.all(valido):
+        return y
+    validos_idx = np.flatnonzero(valido)
+    if len(validos_idx) >= 2:
+        return np.interp(np.arange(len(y)), validos_idx, y[validos_idx])
+    return arrastrar_vacios(y, valido, inicial)
@@ -0,0 +1,121 @@
+"""
+MediSumma — Banco de filtros SOS
+Diseña cada filtro Butterworth una sola vez por (tipo, banda, orden, fs
+cuantizada) y lo guarda en una caché LRU en forma de secciones de segundo
+orden (SOS), numéricamente estable en cortes bajos donde la forma b/a
+pierde precisión. Se aplica con sosfiltfilt (fase cero, por lotes) o con
+FiltroEstado (sosfilt causal con zi arrastrado, por bloques).
+
+Los contadores de consultas/fallos viven en memoria compartida creada
+antes del fork, así que agregan también lo que hacen los procesos del
+pool. Los fallos se cuentan dentro de la función cacheada (solo corre al
+fallar) y los aciertos se deducen: consultas − fallos.
+"""
+
+import multiprocessing
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import butter, sosfilt, sosfilt_zi, sosfiltfilt
+
+FILTROS_CACHE_MAX = 64    # diseños distintos retenidos (LRU)
+FILTROS_FS_PASO   = 1.0   # Hz — cuantización de fs para reutilizar diseños
+FILTROS_RELLENO_TOL   = 1e-4   # fracción de la respuesta al impulso que se desprecia
+FILTROS_RELLENO_MAX_S = 10.0   # s — tope del contexto de un tramo recortado
+
+_consultas = multiprocessing.Value("q", 0)
+_fallos   = multiprocessing.Value("q", 0)
+
+
+@lru_cache(maxsize=FILTROS_CACHE_MAX)
+def _disenar(tipo: str, banda: tuple, orden: int, fs: float) -> np.ndarray:
+    with _fallos.get_lock():
+        _fallos.value += 1
+    corte = banda[0] if len(banda) == 1 else list(banda)
+    # Compartido por todos los llamadores: no modificar in situ
+    return butter(orden, corte, btype=tipo, fs=fs, output="sos")
+
+
+def _sos(tipo: str, banda: tuple, orden: int, fs: float) -> np.ndarray:
+    with _consultas.get_lock():
+        _consultas.value += 1
+    return _disenar(tipo, banda, orden, fs)
+
+
+def cuantizar_fs(fs: float) -> float:
+    return max(FILTROS_FS_PASO, round(fs / FILTROS_FS_PASO) * FILTROS_FS_PASO)
+
+
+def obtener_sos(tipo: str, banda, fs: float, orden: int = 2) -> np.ndarray:
+    """
+    SOS cacheado. tipo: 'low' | 'high' | 'band'; banda: corte en Hz o (f1, f2).
+    """
+    banda = tuple(float(b) for b in np.atleast_1d(banda))
+    return _sos(tipo, banda, int(orden), cuantizar_fs(fs))
+
+
+def filtrar(senal: np.ndarray, tipo: str, banda, fs: float,
+            orden: int = 2, eje: int = -1) -> np.ndarray:
+    """
+    Filtrado de fase cero (ida y vuelta) con el diseño cacheado.
+    eje=0 filtra cada columna de una matriz (muestras × canales).
+    """
+    return sosfiltfilt(obtener_sos(tipo, banda, fs, orden), senal, axis=eje)
+
+
+@lru_cache(maxsize=FILTROS_CACHE_MAX)
+def _relleno(tipo: str, banda: tuple, orden: int, fs: float) -> int:
+    sos = _sos(tipo, banda, orden, fs)
+    impulso = np.zeros(int(FILTROS_RELLENO_MAX_S * fs))
+    impulso[0] = 1.0
+    h = np.abs(sosfilt(sos, impulso))
+    return int(np.flatnonzero(h > FILTROS_RELLENO_TOL * h.max())[-1]) + 1
+
+
+def relleno_filtro(tipo: str, banda, fs: float, orden: int = 2) -> int:
+    """
+    Muestras de contexto a cada lado para que filtrar() sobre un tramo
+    recortado coincida con el de la señal entera: lo que tarda la
+    respuesta al impulso en caer por debajo de FILTROS_RELLENO_TOL de su
+    máximo (acotado a FILTROS_RELLENO_MAX_S).
+    """
+    banda = tuple(float(b) for b in np.atleast_1d(banda))
+    return _relleno(tipo, banda, int(orden), cuantizar_fs(fs))
+
+
+class FiltroEstado:
+    """
+    Filtro causal con estado para procesar una señal por bloques:
+    el zi se arrastra entre llamadas, así que concatenar las salidas
+    equivale a filtrar la señal entera de una vez. Los bloques pueden ser
+    vectores o matrices (muestras × canales), filtradas por columnas.
+    """
+
+    def __init__(self, tipo: str, banda, fs: float, orden: int = 2):
+        self.sos = obtener_sos(tipo, banda, fs, orden)
+        self.zi = None
+
+    def aplicar(self, bloque: np.ndarray) -> np.ndarray:
+        if len(bloque) == 0:
+            return np.asarray(bloque, dtype=np.float64)
+        if self.zi is None:
+            # Arrancar en estado estacionario con la primera muestra: sin escalón
+            zi = sosfilt_zi(self.sos)
+            self.zi = zi.reshape(zi.shape + (1,) * (bloque.ndim - 1)) * bloque[0]
+        salida, self.zi = sosfilt(self.sos, bloque, axis=0, zi=self.zi)
+        return salida
+
+
+def estadisticas_cache() -> dict:
+    """Aciertos, fallos y tasa de acierto de la caché de diseños."""
+    # Fallos antes que consultas: cada consulta se cuenta antes que su
+    # posible fallo, así la resta nunca sale negativa
+    fallos = _fallos.value
+    total = max(_consultas.value, fallos)
+    aciertos = total - fallos
+    return {
+        "aciertos":      aciertos,
+        "fallos":        fallos,
+        "tasa_acierto":  round(aciertos / total, 4) if total else 0.0,
+        "capacidad":     FILTROS_CACHE_MAX,
+    }
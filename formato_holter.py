@@ -0,0 +1,298 @@
+"""
+MediSumma — Formatos de registro Holter
+Capa de formato entre el archivo subido y el análisis: interpreta la
+cabecera WFDB (.hea) — canales, fs, ganancia, línea de base, formato — y
+expone las muestras como una matriz (muestras × canales) int16 en memmap,
+de la que cada canal es una vista con paso (sin copia).
+
+Formatos de muestra admitidos:
+    16    int16 little-endian intercalado (el .dat "crudo" de siempre)
+    212   WFDB 12 bits empaquetados: 2 muestras en 3 bytes. Se decodifica
+          por trozos con operaciones de array a un temporal int16, y a
+          partir de ahí se trata igual que el formato 16.
+Sin cabecera se asume formato 16 con el nº de canales y fs indicados.
+
+DecodificadorIncremental hace la misma decodificación sobre bytes que
+llegan en trozos de cualquier tamaño (una subida en curso), guardando el
+resto que no completa un fotograma para el trozo siguiente.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from ingesta import INGESTA_DIR, descartar
+
+WFDB_GANANCIA_DEFECTO = 200.0     # ADC/mV cuando la cabecera no la indica
+WFDB_FORMATOS         = (16, 212)
+WFDB_TROZO_212        = 3 << 20   # bytes decodificados por iteración
+
+
+def _numero(texto: str, tipo=float):
+    try:
+        return tipo(texto)
+    except ValueError:
+        raise ValueError(f"valor no numérico en la cabecera: {texto!r}") from None
+
+
+def leer_cabecera(texto: str) -> dict:
+    """
+    Cabecera WFDB de un registro de un solo archivo de señal:
+        <registro> <n_señales> <fs> [<n_muestras> ...]
+        <archivo> <formato>[+desplazamiento] <ganancia>(<base>)/<unidades> ... <descripción>
+    Devuelve {fs, n_muestras, formato, desplazamiento, canales: [{nombre,
+    ganancia, base, unidades}]}. Lanza ValueError si no se puede leer.
+    """
+    lineas = [l.strip() for l in texto.splitlines()]
+    lineas = [l for l in lineas if l and not l.startswith("#")]
+    if not lineas:
+        raise ValueError("cabecera vacía")
+
+    campos = lineas[0].split()
+    if len(campos) < 2:
+        raise ValueError("línea de registro incompleta")
+    n_senales = _numero(campos[1].split("/")[0], int)
+    # fs puede venir como "360/1" (frecuencia de contador): vale la primera parte
+    fs = _numero(campos[2].split("/")[0]) if len(campos) > 2 else 250.0
+    n_muestras = _numero(campos[3], int) if len(campos) > 3 else None
+    if n_senales < 1 or len(lineas) < 1 + n_senales:
+        raise ValueError(f"la cabecera declara {n_senales} señales y describe "
+                         f"{len(lineas) - 1}")
+    if not fs > 0:
+        raise ValueError(f"fs no válida: {fs}")
+
+    canales, archivos, formatos, desplazamientos = [], set(), set(), set()
+    for i, linea in enumerate(lineas[1:1 + n_senales]):
+        campos = linea.split()
+        if len(campos) < 2:
+            raise ValueError(f"línea de señal {i + 1} incompleta")
+        archivos.add(campos[0])
+        # formato[xfactor][:sesgo][+desplazamiento]
+        formato, _, desplazamiento = campos[1].partition("+")
+        formatos.add(_numero(formato.split("x")[0].split(":")[0], int))
+        desplazamientos.add(_numero(desplazamiento or "0", int))
+
+        ganancia, base, unidades = WFDB_GANANCIA_DEFECTO, None, "mV"
+        if len(campos) > 2:
+            texto_g, _, unidades = campos[2].partition("/")
+            unidades = unidades or "mV"
+            if "(" in texto_g:
+                texto_g, _, texto_b = texto_g.partition("(")
+                base = _numero(texto_b.rstrip(")"), int)
+            ganancia = _numero(texto_g) or WFDB_GANANCIA_DEFECTO
+        if base is None:
+            # Sin base explícita, WFDB usa el cero del ADC (5.º campo)
+            base = _numero(campos[4], int) if len(campos) > 4 else 0
+        nombre = " ".join(campos[8:]) if len(campos) > 8 else f"canal {i + 1}"
+        canales.append({"nombre": nombre, "ganancia": ganancia, "base": base,
+                        "unidades": unidades})
+
+    if len(archivos) > 1 or len(formatos) > 1 or len(desplazamientos) > 1:
+        raise ValueError("solo se admiten registros con todas las señales "
+                         "en un mismo archivo y formato")
+    formato = formatos.pop()
+    if formato not in WFDB_FORMATOS:
+        raise ValueError(f"formato WFDB {formato} no soportado "
+                         f"(admitidos: {', '.join(map(str, WFDB_FORMATOS))})")
+    return {"fs": fs, "n_muestras": n_muestras, "formato": formato,
+            "desplazamiento": desplazamientos.pop(), "canales": canales}
+
+
+def cabecera_crudo(n_canales: int = 1, fs: float = 500.0,
+                   ganancia: float = 1000.0) -> dict:
+    """Cabecera implícita de un .dat int16 intercalado sin .hea."""
+    if n_canales < 1:
+        raise ValueError("n_canales debe ser ≥ 1")
+    if not fs > 0:
+        raise ValueError(f"fs no válida: {fs}")
+    return {"fs": fs, "n_muestras": None, "formato": 16, "desplazamiento": 0,
+            "canales": [{"nombre": f"canal {i + 1}", "ganancia": ganancia,
+                         "base": 0, "unidades": "mV"} for i in range(n_canales)]}
+
+
+def escribir_cabecera(registro: str, cabecera: dict) -> str:
+    """Texto .hea WFDB equivalente a `cabecera` para el archivo `registro`.dat."""
+    canales = cabecera["canales"]
+    primera = f"{registro} {len(canales)} {cabecera['fs']:g}"
+    if cabecera.get("n_muestras") is not None:
+        primera += f" {cabecera['n_muestras']}"
+    formato = str(cabecera["formato"])
+    if cabecera.get("desplazamiento"):
+        formato += f"+{cabecera['desplazamiento']}"
+    bits = 16 if cabecera["formato"] == 16 else 12
+    lineas = [primera] + [
+        f"{registro}.dat {formato} {c['ganancia']:g}({c['base']})/{c['unidades']} "
+        f"{bits} 0 0 0 0 {c['nombre']}" for c in canales]
+    return "\n".join(lineas) + "\n"
+
+
+def decodificar_212(crudo: np.ndarray, n_muestras: int = None) -> np.ndarray:
+    """
+    Formato 212 → int16. Cada grupo de 3 bytes guarda dos muestras de 12
+    bits en complemento a dos: la 1.ª en el byte 0 y el nibble bajo del
+    byte 1, la 2.ª en el byte 2 y el nibble alto del byte 1. Todo el
+    trozo se decodifica de una vez; `crudo` debe empezar en un grupo.
+    """
+    crudo = np.asarray(crudo, dtype=np.uint8)
+    resto = len(crudo) % 3
+    if resto:
+        crudo = np.concatenate([crudo, np.zeros(3 - resto, dtype=np.uint8)])
+    grupos = crudo.reshape(-1, 3).astype(np.int16)
+    salida = np.empty((len(grupos), 2), dtype=np.int16)
+    salida[:, 0] = grupos[:, 0] | ((grupos[:, 1] & 0x0F) << 8)
+    salida[:, 1] = grupos[:, 2] | ((grupos[:, 1] & 0xF0) << 4)
+    salida -= (salida & 0x800) << 1   # extensión de signo de 12 bits
+    salida = salida.reshape(-1)
+    return salida[:n_muestras] if n_muestras is not None else salida
+
+
+class DecodificadorIncremental:
+    """
+    Bytes del archivo de muestras → fotogramas (n × canales) int16, a
+    medida que llegan. Respeta el desplazamiento y el nº de muestras de
+    la cabecera; alimentar() devuelve solo fotogramas completos.
+    """
+
+    def __init__(self, cabecera: dict):
+        self.formato = cabecera["formato"]
+        if self.formato not in WFDB_FORMATOS:
+            raise ValueError(f"formato {self.formato} no soportado")
+        self.n_canales = len(cabecera["canales"])
+        self._saltar = cabecera.get("desplazamiento", 0)
+        self._restantes = cabecera.get("n_muestras")   # fotogramas por emitir
+        self._bytes = b""
+        self._muestras = np.empty(0, dtype=np.int16)
+
+    def alimentar(self, datos: bytes) -> np.ndarray:
+        if self._saltar:
+            omitidos = min(self._saltar, len(datos))
+            datos = datos[omitidos:]
+            self._saltar -= omitidos
+        datos = self._bytes + datos
+        if self.formato == 16:
+            util = len(datos) - len(datos) % (2 * self.n_canales)
+            muestras = np.frombuffer(datos[:util], dtype="<i2")
+        else:
+            util = len(datos) - len(datos) % 3
+            muestras = np.concatenate([self._muestras,
+                                       decodificar_212(np.frombuffer(datos[:util],
+                                                                     dtype=np.uint8))])
+            completas = len(muestras) - len(muestras) % self.n_canales
+            self._muestras = muestras[completas:]
+            muestras = muestras[:completas]
+        self._bytes = datos[util:]
+        fotogramas = muestras.reshape(-1, self.n_canales)
+        if self._restantes is not None:
+            fotogramas = fotogramas[:self._restantes]
+            self._restantes -= len(fotogramas)
+        return fotogramas
+
+
+class RegistroHolter:
+    """
+    Registro abierto: `muestras` es una matriz (n × canales) int16 de solo
+    lectura (memmap); canal(i) devuelve la columna como vista con paso.
+    cerrar() borra el temporal de decodificación, si lo hubo.
+    """
+
+    def __init__(self, muestras: np.ndarray, cabecera: dict, temporal: str = None):
+        self.muestras = muestras
+        self.cabecera = cabecera
+        self.fs = cabecera["fs"]
+        self.canales = cabecera["canales"]
+        self._temporal = temporal
+
+    @property
+    def n_canales(self) -> int:
+        return self.muestras.shape[1]
+
+    @property
+    def n_muestras(self) -> int:
+        return self.muestras.shape[0]
+
+    def canal(self, i: int) -> np.ndarray:
+        return self.muestras[:, i]
+
+    def a_mv(self, bloque: np.ndarray) -> np.ndarray:
+        """Convierte un bloque (n × canales) de unidades ADC a mV."""
+        ganancia = np.array([c["ganancia"] for c in self.canales])
+        base = np.array([c["base"] for c in self.canales])
+        return (np.asarray(bloque, dtype=np.float64) - base) / ganancia
+
+    def descripcion(self) -> dict:
+        return {"formato": self.cabecera["formato"], "fs": self.fs,
+                "canales": [dict(c) for c in self.canales]}
+
+    def cerrar(self):
+        self.muestras = None
+        if self._temporal:
+            descartar(self._temporal)
+            self._temporal = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+
+def contar_muestras(n_bytes: int, cabecera: dict) -> int:
+    """Fotogramas completos en `n_bytes` de datos (sin el desplazamiento)."""
+    n_can = len(cabecera["canales"])
+    if cabecera["formato"] == 16:
+        n = n_bytes // (2 * n_can)
+    elif cabecera["formato"] == 212:
+        n = (n_bytes * 2 // 3) // n_can
+    else:
+        raise ValueError(f"formato {cabecera['formato']} no soportado")
+    limite = cabecera.get("n_muestras")
+    return n if limite is None else min(n, limite)
+
+
+def abrir_registro(ruta: str, cabecera: dict = None) -> RegistroHolter:
+    """
+    Abre el archivo de muestras `ruta` según `cabecera` (leer_cabecera /
+    cabecera_crudo; por defecto, un canal int16 a 500 Hz). Las muestras
+    sobrantes de un último fotograma incompleto se ignoran.
+    """
+    cabecera = cabecera or cabecera_crudo()
+    n_can = len(cabecera["canales"])
+    desplazamiento = cabecera.get("desplazamiento", 0)
+    n_bytes = max(0, os.path.getsize(ruta) - desplazamiento)
+
+    if cabecera["formato"] == 16:
+        n = contar_muestras(n_bytes, cabecera)
+        if n == 0:
+            return RegistroHolter(np.empty((0, n_can), dtype="<i2"), cabecera)
+        datos = np.memmap(ruta, dtype="<i2", mode="r", offset=desplazamiento,
+                          shape=(n, n_can))
+        return RegistroHolter(datos, cabecera)
+
+    if cabecera["formato"] == 212:
+        n = contar_muestras(n_bytes, cabecera)
+        if n == 0:
+            return RegistroHolter(np.empty((0, n_can), dtype="<i2"), cabecera)
+        total = n * n_can
+        crudo = np.memmap(ruta, dtype=np.uint8, mode="r", offset=desplazamiento)
+        fd, temporal = tempfile.mkstemp(prefix="medisumma_212_", suffix=".dat",
+                                        dir=INGESTA_DIR)
+        os.close(fd)
+        try:
+            destino = np.memmap(temporal, dtype="<i2", mode="w+", shape=(total,))
+            hecho = 0
+            for inicio in range(0, (total + 1) // 2 * 3, WFDB_TROZO_212):
+                trozo = decodificar_212(crudo[inicio:inicio + WFDB_TROZO_212],
+                                        total - hecho)
+                destino[hecho:hecho + len(trozo)] = trozo
+                hecho += len(trozo)
+            destino.flush()
+            del destino
+            datos = np.memmap(temporal, dtype="<i2", mode="r", shape=(n, n_can))
+        except BaseException:
+            descartar(temporal)
+            raise
+        return RegistroHolter(datos, cabecera, temporal)
+
+    raise ValueError(f"formato {cabecera['formato']} no soportado")
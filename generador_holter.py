@@ -0,0 +1,422 @@
+"""
+MediSumma — Generador de registros Holter sintéticos
+Produce estudios de horas, multicanal, en int16 little-endian intercalado
+(el formato que lee /analizar_holter con un canal), para pruebas de carga y
+de exactitud del análisis Holter.
+
+Todo el estudio se planifica primero como arrays de latidos (instante,
+tipo, amplitud) — FC con tendencia circadiana y tramos configurables, VFC
+(ruido AR(1) + arritmia respiratoria), extrasístoles, fibrilación
+auricular y pausas — y después se sintetiza por bloques: cada bloque
+coloca de una vez todas las plantillas de sus latidos con np.bincount, sin
+bucles Python por latido, y se vuelca al disco. Junto al .dat se escriben
+la cabecera WFDB (.hea, formato 16), las anotaciones de referencia
+(.anotaciones.csv) y los metadatos (.json).
+
+    python generador_holter.py estudio.dat --horas 24 --canales 2 --fa 0.1
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+from scipy.signal import lfilter
+
+from formato_holter import escribir_cabecera
+
+GEN_FS       = 500      # Hz
+GEN_GANANCIA = 1000.0   # unidades ADC por mV (como generar_paciente.py)
+GEN_BLOQUE_S = 60.0     # s sintetizados por bloque
+GEN_PRE_S    = 0.45     # s de plantilla antes del pico R
+GEN_POST_S   = 0.55     # s de plantilla después del pico R
+
+# Proyección de cada onda en cada canal: (P, QRS, T)
+CANALES = {
+    "II": (1.0, 1.0, 1.0),
+    "V5": (0.6, 1.2, 1.1),
+    "V1": (0.5, -0.6, -0.3),
+}
+TIPOS = ("N", "S", "V", "F")   # normal, supraventricular, ventricular, conducido en FA
+
+
+def _ondas(t: np.ndarray, tipo: str):
+    """
+    Componentes P, QRS y T de un latido (mV) con el pico R en t = 0.
+    Mismo modelo que cerebro.crear_latido, desplazado al pico R; el latido
+    ventricular no tiene P, su QRS es ancho y su T va en sentido contrario.
+    """
+    g = lambda a, c, v: a * np.exp(-((t - c) ** 2) / (2 * v))
+    if tipo == "V":
+        p = np.zeros_like(t)
+        qrs = g(1.3, 0.0, 0.006) + g(-0.35, 0.09, 0.002)
+        tw = g(-0.4, 0.32, 0.012)
+        return p, qrs, tw
+    p = g(0.15, -0.20, 0.005)
+    if tipo == "S":
+        p = g(0.08, -0.16, 0.003)     # P ectópica, más precoz y pequeña
+    elif tipo == "F":
+        p = np.zeros_like(t)          # FA: sin P (ondas f aparte)
+    qrs = g(-0.1, -0.02, 0.0005) + g(1.0, 0.0, 0.001) + g(-0.2, 0.02, 0.0005)
+    tw = g(0.25, 0.25, 0.01)
+    return p, qrs, tw
+
+
+def plantillas(fs: float, canales: list) -> dict:
+    """{tipo: array (canales × L)} con el pico R en la muestra GEN_PRE_S·fs."""
+    pre, post = int(GEN_PRE_S * fs), int(GEN_POST_S * fs)
+    t = (np.arange(-pre, post)) / fs
+    salida = {}
+    for tipo in TIPOS:
+        p, qrs, tw = _ondas(t, tipo)
+        salida[tipo] = np.stack([gp * p + gq * qrs + gt * tw
+                                 for gp, gq, gt in (CANALES[c] for c in canales)])
+    return salida
+
+
+class GeneradorHolter:
+    """
+    Configuración y planificación de un estudio sintético.
+    fc_base / fc_circadiana: FC media y amplitud del ciclo de 24 h (lpm).
+    tendencias: [(inicio_s, fin_s, delta_lpm)] — esfuerzo, sueño… (rampas suaves).
+    vfc: desviación relativa del ruido AR(1) de la frecuencia instantánea.
+    arritmia_resp: modulación respiratoria relativa (0,25 Hz).
+    fa: fracción del estudio en fibrilación auricular; fa_episodios: nº de tramos.
+    extrasistoles_v / extrasistoles_s: probabilidad por latido sinusal.
+    pausas_hora: paros sinusales de 2–3,5 s por hora.
+    deriva: amplitud de la deriva de línea de base (mV).
+    artefactos_hora: ráfagas de artefacto muscular / de movimiento por hora.
+    ruido: sigma del ruido blanco (mV); red_hz: interferencia de red (0 = sin).
+    """
+
+    def __init__(self, duracion_s: float, fs: float = GEN_FS,
+                 canales=("II",), fc_base: float = 72.0,
+                 fc_circadiana: float = 8.0, tendencias=(), vfc: float = 0.04,
+                 arritmia_resp: float = 0.03, fa: float = 0.0,
+                 fa_episodios: int = 1, extrasistoles_v: float = 0.002,
+                 extrasistoles_s: float = 0.002, pausas_hora: float = 0.0,
+                 deriva: float = 0.15, artefactos_hora: float = 2.0,
+                 ruido: float = 0.02, red_hz: float = 0.0,
+                 ganancia: float = GEN_GANANCIA, semilla: int = 0):
+        desconocidos = [c for c in canales if c not in CANALES]
+        if desconocidos:
+            raise ValueError(f"canales desconocidos: {desconocidos}")
+        self.duracion_s = float(duracion_s)
+        self.fs = fs
+        self.canales = list(canales)
+        self.n_muestras = int(self.duracion_s * fs)
+        self.fc_base, self.fc_circadiana = fc_base, fc_circadiana
+        self.tendencias = list(tendencias)
+        self.vfc, self.arritmia_resp = vfc, arritmia_resp
+        self.fa, self.fa_episodios = fa, max(1, fa_episodios)
+        self.extrasistoles_v, self.extrasistoles_s = extrasistoles_v, extrasistoles_s
+        self.pausas_hora, self.artefactos_hora = pausas_hora, artefactos_hora
+        self.deriva, self.ruido, self.red_hz = deriva, ruido, red_hz
+        self.ganancia = ganancia
+        self.semilla = semilla
+        self._planificar()
+
+    # ── Planificación (todo el estudio, vectorizada) ─────────────────────
+    def _fc_instantanea(self, t: np.ndarray, rng) -> np.ndarray:
+        fc = self.fc_base + self.fc_circadiana * np.cos(
+            2 * np.pi * (t / 3600.0 - 15.0) / 24.0)   # máximo a las 15 h de reloj
+        for inicio, fin, delta in self.tendencias:
+            # Rampa de coseno alzado de 60 s a cada lado
+            subida = np.clip((t - inicio) / 60.0, 0, 1)
+            bajada = np.clip((fin - t) / 60.0, 0, 1)
+            fc = fc + delta * 0.5 * (1 - np.cos(np.pi * np.minimum(subida, bajada)))
+        dt = t[1] - t[0]
+        a = np.exp(-dt / 20.0)   # AR(1) con constante de tiempo de 20 s
+        ar = lfilter([np.sqrt(1 - a * a)], [1, -a], rng.standard_normal(len(t)))
+        resp = self.arritmia_resp * np.sin(2 * np.pi * 0.25 * t)
+        return np.clip(fc * (1 + self.vfc * ar + resp), 30, 220)
+
+    def _planificar(self):
+        rng = np.random.default_rng(self.semilla)
+        dur = self.duracion_s
+        margen = 10.0
+
+        # Ritmo sinusal: latidos en los cruces enteros de la fase acumulada
+        dt = 0.05
+        t = np.arange(0, dur + margen, dt)
+        fase = np.concatenate([[0.0], np.cumsum(self._fc_instantanea(t, rng) / 60 * dt)])
+        t_fase = np.concatenate([t, [t[-1] + dt]])
+        tiempos = np.interp(np.arange(1, int(fase[-1])), fase, t_fase)
+
+        # Pausas: paro sinusal tras un latido; los siguientes se desplazan
+        self.pausas = []
+        n_pausas = rng.poisson(self.pausas_hora * dur / 3600.0)
+        if n_pausas and len(tiempos) > 2:
+            idx = np.sort(rng.choice(len(tiempos) - 1, size=min(n_pausas, len(tiempos) - 1),
+                                     replace=False))
+            rr = tiempos[idx + 1] - tiempos[idx]
+            duraciones = rng.uniform(2.0, 3.5, len(idx))
+            desplaz = np.zeros(len(tiempos))
+            desplaz[idx + 1] = np.maximum(0.0, duraciones - rr)
+            tiempos = tiempos + np.cumsum(desplaz)
+            self.pausas = [{"inicio_s": round(float(tiempos[i]), 3),
+                            "duracion_s": round(float(tiempos[i + 1] - tiempos[i]), 3)}
+                           for i in idx if tiempos[i + 1] < dur]
+
+        # Fibrilación auricular: tramos donde el ritmo sinusal se sustituye
+        self.segmentos_fa = []
+        tipos = np.full(len(tiempos), "N", dtype="<U1")
+        if self.fa > 0:
+            largo = self.fa * dur / self.fa_episodios
+            inicios = np.sort(rng.uniform(0, max(1e-3, dur - largo), self.fa_episodios))
+            nuevos_t, nuevos_tipo = [tiempos], [tipos]
+            conservar = np.ones(len(tiempos), dtype=bool)
+            for inicio in inicios:
+                fin = min(dur, inicio + largo)
+                if self.segmentos_fa and inicio < self.segmentos_fa[-1][1]:
+                    inicio = self.segmentos_fa[-1][1]
+                if fin <= inicio:
+                    continue
+                conservar &= ~((tiempos >= inicio) & (tiempos < fin))
+                rr_medio = 60.0 / (self.fc_base * 1.25)   # respuesta ventricular rápida
+                n = int((fin - inicio) / 0.3) + 2
+                rr = np.maximum(0.3, rng.gamma(6.0, rr_medio / 6.0, n))
+                t_fa = inicio + np.cumsum(rr)
+                t_fa = t_fa[t_fa < fin]
+                nuevos_t.append(t_fa)
+                nuevos_tipo.append(np.full(len(t_fa), "F", dtype="<U1"))
+                self.segmentos_fa.append((float(inicio), float(fin)))
+            nuevos_t[0], nuevos_tipo[0] = tiempos[conservar], tipos[conservar]
+            tiempos = np.concatenate(nuevos_t)
+            tipos = np.concatenate(nuevos_tipo)
+            orden = np.argsort(tiempos, kind="stable")
+            tiempos, tipos = tiempos[orden], tipos[orden]
+
+        # Extrasístoles: latido sinusal adelantado (pausa compensadora)
+        sinusales = np.flatnonzero(tipos == "N")
+        sinusales = sinusales[(sinusales > 0) & (sinusales < len(tiempos) - 1)]
+        sorteo = rng.random(len(sinusales))
+        for tipo, prob, adelanto in (("V", self.extrasistoles_v, 0.62),
+                                     ("S", self.extrasistoles_s, 0.72)):
+            elegidos = sinusales[sorteo < prob]
+            sorteo = np.where(sorteo < prob, 2.0, sorteo - prob)   # sin repetir
+            previo = tiempos[elegidos - 1]
+            tiempos[elegidos] = previo + adelanto * (tiempos[elegidos] - previo)
+            tipos[elegidos] = tipo
+
+        dentro = (tiempos >= GEN_PRE_S) & (tiempos < dur - GEN_POST_S)
+        self.tiempos = tiempos[dentro]
+        self.tipos = tipos[dentro]
+        self.muestras = np.round(self.tiempos * self.fs).astype(np.int64)
+        self.amplitudes = 1.0 + 0.04 * rng.standard_normal(len(self.tiempos))
+
+        # Artefactos: (inicio_s, duración_s, clase)
+        n_art = rng.poisson(self.artefactos_hora * dur / 3600.0)
+        self.artefactos = [
+            (float(i), float(d), str(c)) for i, d, c in zip(
+                rng.uniform(0, dur, n_art), rng.uniform(1.0, 8.0, n_art),
+                rng.choice(["muscular", "movimiento"], n_art))]
+
+        # Deriva de línea de base: 3 senoides lentas por canal
+        self._deriva_f = rng.uniform(0.05, 0.4, (len(self.canales), 3))
+        self._deriva_fase = rng.uniform(0, 2 * np.pi, (len(self.canales), 3))
+        self._plantillas = plantillas(self.fs, self.canales)
+
+    # ── Síntesis por bloques ─────────────────────────────────────────────
+    def bloque(self, s0: int, s1: int) -> np.ndarray:
+        """Señal en mV de las muestras [s0, s1) → array (n × canales)."""
+        n = s1 - s0
+        n_can = len(self.canales)
+        pre = int(GEN_PRE_S * self.fs)
+        largo = next(iter(self._plantillas.values())).shape[1]
+        senal = np.zeros((n_can, n))
+
+        # Latidos cuya plantilla toca el bloque
+        a = np.searchsorted(self.muestras, s0 - (largo - pre))
+        b = np.searchsorted(self.muestras, s1 + pre)
+        for tipo, plantilla in self._plantillas.items():
+            sel = np.flatnonzero(self.tipos[a:b] == tipo) + a
+            if not len(sel):
+                continue
+            idx = (self.muestras[sel] - pre - s0)[:, None] + np.arange(largo)[None, :]
+            valido = (idx >= 0) & (idx < n)
+            amp = np.broadcast_to(self.amplitudes[sel][:, None], idx.shape)[valido]
+            cols = idx[valido]
+            for c in range(n_can):
+                pesos = np.broadcast_to(plantilla[c], idx.shape)[valido] * amp
+                senal[c] += np.bincount(cols, weights=pesos, minlength=n)
+
+        t = (s0 + np.arange(n)) / self.fs
+        rng = np.random.default_rng([self.semilla, s0])
+
+        # Deriva de línea de base
+        if self.deriva:
+            for c in range(n_can):
+                senal[c] += self.deriva / 3 * np.sin(
+                    2 * np.pi * self._deriva_f[c][:, None] * t[None, :]
+                    + self._deriva_fase[c][:, None]).sum(axis=0)
+
+        # Ondas f durante la FA (4–8 Hz, amplitud variable)
+        for inicio, fin in self.segmentos_fa:
+            m = (t >= inicio) & (t < fin)
+            if m.any():
+                f = 6.0 + 0.8 * np.sin(2 * np.pi * 0.1 * t[m])
+                senal[:, m] += 0.05 * np.sin(2 * np.pi * f * t[m])
+
+        # Artefactos
+        for inicio, dur, clase in self.artefactos:
+            m = (t >= inicio) & (t < inicio + dur)
+            k = int(m.sum())
+            if not k:
+                continue
+            if clase == "muscular":
+                ruido_art = 0.15 * np.diff(rng.standard_normal((n_can, k + 1)), axis=1)
+            else:
+                ruido_art = 0.02 * np.cumsum(rng.standard_normal((n_can, k)), axis=1)
+            senal[:, m] += ruido_art
+
+        if self.red_hz:
+            senal += 0.03 * np.sin(2 * np.pi * self.red_hz * t)
+        if self.ruido:
+            senal += self.ruido * rng.standard_normal(senal.shape)
+        return senal.T
+
+    def anotaciones(self, s0: int, s1: int):
+        """Latidos con pico R en [s0, s1): (muestras, tipos)."""
+        a, b = np.searchsorted(self.muestras, [s0, s1])
+        return self.muestras[a:b], self.tipos[a:b]
+
+    def cabecera(self) -> dict:
+        """Cabecera (formato_holter) del .dat que produce escribir()."""
+        return {"fs": self.fs, "n_muestras": self.n_muestras, "formato": 16,
+                "desplazamiento": 0,
+                "canales": [{"nombre": c, "ganancia": self.ganancia, "base": 0,
+                             "unidades": "mV"} for c in self.canales]}
+
+    def metadatos(self) -> dict:
+        conteo = {t: int(np.sum(self.tipos == t)) for t in TIPOS}
+        return {
+            "formato":     "int16 little-endian, canales intercalados",
+            "fs":          self.fs,
+            "canales":     self.canales,
+            "ganancia":    self.ganancia,
+            "unidades":    "mV",
+            "n_muestras":  self.n_muestras,
+            "duracion_s":  self.duracion_s,
+            "semilla":     self.semilla,
+            "latidos":     conteo,
+            "segmentos_fa": [{"inicio_s": round(i, 3), "fin_s": round(f, 3)}
+                             for i, f in self.segmentos_fa],
+            "pausas":      self.pausas,
+            "artefactos":  [{"inicio_s": round(i, 3), "duracion_s": round(d, 3),
+                             "clase": c} for i, d, c in self.artefactos],
+        }
+
+    def escribir(self, ruta: str, bloque_s: float = GEN_BLOQUE_S) -> dict:
+        """
+        Sintetiza el estudio bloque a bloque y lo vuelca a `ruta` (.dat),
+        con la cabecera en <ruta>.hea, las anotaciones en
+        <ruta>.anotaciones.csv y los metadatos en <ruta>.json.
+        Devuelve los metadatos.
+        """
+        base = ruta[:-4] if ruta.endswith(".dat") else ruta
+        paso = max(1, int(bloque_s * self.fs))
+        with open(ruta, "wb") as datos, \
+                open(base + ".anotaciones.csv", "w", newline="") as anot:
+            escritor = csv.writer(anot)
+            escritor.writerow(["muestra", "tiempo_s", "tipo", "ritmo"])
+            for s0 in range(0, self.n_muestras, paso):
+                s1 = min(self.n_muestras, s0 + paso)
+                adc = np.rint(self.bloque(s0, s1) * self.ganancia)
+                np.clip(adc, -32768, 32767, out=adc)
+                adc.astype("<i2").tofile(datos)
+                muestras, tipos = self.anotaciones(s0, s1)
+                escritor.writerows(
+                    (int(m), f"{m / self.fs:.3f}", "N" if t == "F" else t,
+                     "AFIB" if t == "F" else "SR")
+                    for m, t in zip(muestras, tipos))
+        with open(base + ".hea", "w", encoding="utf-8") as f:
+            f.write(escribir_cabecera(os.path.basename(base), self.cabecera()))
+        meta = self.metadatos()
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        return meta
+
+
+def evaluar_deteccion(detectados, referencia, fs: float,
+                      tolerancia_s: float = 0.15) -> dict:
+    """
+    Sensibilidad y valor predictivo positivo de una detección de picos R
+    frente a las anotaciones: cada referencia casa con el detectado más
+    cercano dentro de ±tolerancia_s (emparejamiento vectorizado por orden).
+    """
+    detectados = np.sort(np.asarray(detectados, dtype=np.int64))
+    referencia = np.sort(np.asarray(referencia, dtype=np.int64))
+    if not len(referencia) or not len(detectados):
+        return {"referencia": int(len(referencia)), "detectados": int(len(detectados)),
+                "verdaderos": 0, "sensibilidad": 0.0, "vpp": 0.0}
+    tol = int(tolerancia_s * fs)
+    j = np.clip(np.searchsorted(detectados, referencia), 1, len(detectados) - 1)
+    cercano = np.where(np.abs(detectados[j - 1] - referencia) <= np.abs(detectados[j] - referencia),
+                       j - 1, j)
+    casa = np.abs(detectados[cercano] - referencia) <= tol
+    verdaderos = len(np.unique(cercano[casa]))
+    return {
+        "referencia":   int(len(referencia)),
+        "detectados":   int(len(detectados)),
+        "verdaderos":   int(verdaderos),
+        "sensibilidad": round(verdaderos / len(referencia), 4),
+        "vpp":          round(verdaderos / len(detectados), 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de Holter sintético")
+    parser.add_argument("salida", help="archivo .dat de salida")
+    parser.add_argument("--horas", type=float, default=1.0)
+    parser.add_argument("--fs", type=float, default=GEN_FS)
+    parser.add_argument("--canales", type=int, default=1, choices=(1, 2, 3))
+    parser.add_argument("--fc", type=float, default=72.0, help="FC media (lpm)")
+    parser.add_argument("--circadiana", type=float, default=8.0)
+    parser.add_argument("--vfc", type=float, default=0.04)
+    parser.add_argument("--fa", type=float, default=0.0,
+                        help="fracción del estudio en FA (0–1)")
+    parser.add_argument("--fa-episodios", type=int, default=1)
+    parser.add_argument("--ev", type=float, default=0.002,
+                        help="probabilidad de extrasístole ventricular por latido")
+    parser.add_argument("--esv", type=float, default=0.002,
+                        help="probabilidad de extrasístole supraventricular")
+    parser.add_argument("--pausas-hora", type=float, default=0.0)
+    parser.add_argument("--artefactos-hora", type=float, default=2.0)
+    parser.add_argument("--ruido", type=float, default=0.02)
+    parser.add_argument("--red", type=float, default=0.0, help="Hz de red (50/60)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--evaluar", action="store_true",
+                        help="analizar todos los canales con el motor Holter y medir exactitud")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    gen = GeneradorHolter(
+        args.horas * 3600, fs=args.fs, canales=list(CANALES)[:args.canales],
+        fc_base=args.fc, fc_circadiana=args.circadiana, vfc=args.vfc,
+        fa=args.fa, fa_episodios=args.fa_episodios, extrasistoles_v=args.ev,
+        extrasistoles_s=args.esv, pausas_hora=args.pausas_hora,
+        artefactos_hora=args.artefactos_hora, ruido=args.ruido,
+        red_hz=args.red, semilla=args.semilla)
+    meta = gen.escribir(args.salida)
+    dt = time.perf_counter() - t0
+    print(f"{args.salida}: {meta['duracion_s'] / 3600:.2f} h, {len(gen.canales)} canal(es), "
+          f"{sum(meta['latidos'].values())} latidos {meta['latidos']} — "
+          f"{dt:.1f} s ({meta['duracion_s'] / dt:.0f}× tiempo real)")
+
+    if args.evaluar:
+        from formato_holter import abrir_registro
+        from holter_stream import analizar_holter_completo
+        with abrir_registro(args.salida, gen.cabecera()) as registro:
+            t0 = time.perf_counter()
+            analizador, _ = analizar_holter_completo(registro.muestras, args.fs)
+            dt = time.perf_counter() - t0
+        res = evaluar_deteccion(analizador.picos, gen.muestras, args.fs)
+        print(f"Detección ({'+'.join(gen.canales)}): sensibilidad {res['sensibilidad']:.4f}, "
+              f"VPP {res['vpp']:.4f} — {dt:.1f} s ({meta['duracion_s'] / dt:.0f}× tiempo real)")
+
+
+if __name__ == "__main__":
+    main()
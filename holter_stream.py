@@ -0,0 +1,232 @@
+"""
+MediSumma — Análisis Holter por bloques (streaming)
+Recorre el registro completo por bloques con filtrado causal con estado
+(filtros.FiltroEstado: sosfilt + zi arrastrado entre bloques) y el
+detector QRS en línea (qrs.DetectorQRS), que arrastra su propio estado y
+por tanto encuentra los latidos que cruzan las fronteras de bloque. La
+memoria usada por la señal es constante (un bloque + los anillos del
+detector), sea cual sea la duración del estudio; solo crece la lista de
+posiciones R (8 bytes por latido).
+
+Los registros multicanal llegan como matriz (muestras × canales): cada
+canal se filtra por separado y la detección corre sobre su combinación
+(combinar_canales), así que un latido cuenta una vez aunque lo vean todos.
+"""
+
+import numpy as np
+from filtros import FiltroEstado
+from ingesta import ventanas
+from qrs import DetectorQRS, QRS_ANILLO_LOTE_S
+
+HOLTER_BLOQUE_S   = 30.0   # s — tamaño de bloque de análisis
+HOLTER_PAUSA_S    = 2.0    # s — RR a partir del cual se considera pausa
+HOLTER_VENTANA_FC = 8      # latidos por ventana para FC mín / máx
+
+
+def combinar_canales(filtrado: np.ndarray) -> np.ndarray:
+    """
+    Señal única para detectar latidos en una matriz filtrada (muestras ×
+    canales): media de los canales normalizados por su desviación típica,
+    cada uno con el signo de su asimetría (la polaridad dominante del QRS),
+    para que un V1 negativo sume en lugar de cancelar. Un vector o una
+    matriz de un canal se devuelven tal cual.
+    """
+    if filtrado.ndim == 1:
+        return filtrado
+    if filtrado.shape[1] == 1:
+        return filtrado[:, 0]
+    centrado = filtrado - filtrado.mean(axis=0)
+    escala = np.std(centrado, axis=0)
+    escala[escala == 0] = 1.0
+    z = centrado / escala
+    signo = np.sign(np.mean(z ** 3, axis=0))
+    signo[signo == 0] = 1.0
+    return z @ signo / len(signo)
+
+
+class AnalizadorHolterStream:
+    """
+    Analizador incremental: procesar(bloque) devuelve los picos R nuevos
+    (índices absolutos de muestra); finalizar() decide los que quedan
+    pendientes al final. Los umbrales del detector son adaptativos, así
+    que siguen los cambios de ganancia a lo largo del estudio.
+    """
+
+    def __init__(self, fs: float = 500, banda=(0.5, 40.0)):
+        self.fs = fs
+        self.filtro = FiltroEstado('band', banda, fs)
+        self.detector = DetectorQRS(fs, historia_s=QRS_ANILLO_LOTE_S)
+        self.n_muestras = 0
+        self._picos = np.empty(1024, dtype=np.int64)
+        self._n_picos = 0
+
+    @property
+    def picos(self) -> np.ndarray:
+        return self._picos[:self._n_picos]
+
+    def _agregar(self, nuevos: np.ndarray):
+        fin = self._n_picos + len(nuevos)
+        if fin > len(self._picos):
+            self._picos = np.resize(self._picos, max(fin, 2 * len(self._picos)))
+        self._picos[self._n_picos:fin] = nuevos
+        self._n_picos = fin
+
+    def procesar(self, bloque: np.ndarray, final: bool = False) -> np.ndarray:
+        """
+        Filtra un bloque nuevo de muestras crudas (vector, o matriz
+        muestras × canales) y detecta sus picos R.
+        """
+        bloque = np.asarray(bloque, dtype=np.float64)
+        nuevos = np.empty(0, dtype=np.int64)
+        if len(bloque):
+            filtrado = self.filtro.aplicar(bloque)
+            self.n_muestras += len(bloque)
+            nuevos = self.detector.push(combinar_canales(filtrado))
+        if final:
+            nuevos = np.concatenate([nuevos, self.detector.finalizar()])
+        if len(nuevos):
+            self._agregar(nuevos)
+        return nuevos
+
+    def finalizar(self) -> np.ndarray:
+        """Decide los picos que quedaron pendientes al final del registro."""
+        return self.procesar(np.empty(0), final=True)
+
+    def retirar_picos(self) -> np.ndarray:
+        """
+        Devuelve los picos acumulados y vacía la lista: así el estado que
+        viaja entre procesos entre bloque y bloque no crece con el estudio.
+        """
+        picos = self.picos.copy()
+        self._n_picos = 0
+        return picos
+
+    def agregar_picos(self, picos: np.ndarray):
+        """Repone picos retirados antes (en orden, delante de los nuevos)."""
+        self._agregar(np.asarray(picos, dtype=np.int64))
+
+    def resumen(self) -> dict:
+        """Métricas del estudio completo a partir de las posiciones R."""
+        return resumir_latidos(self.picos, self.fs, self.n_muestras)
+
+
+def resumir_latidos(picos: np.ndarray, fs: float, n_muestras: int) -> dict:
+    """
+    Conteo de latidos, FC mínima / media / máxima y pausas, vectorizado.
+    FC mín / máx sobre ventanas deslizantes de HOLTER_VENTANA_FC latidos
+    (suma acumulada de RR), para que un latido aislado no las dispare.
+    """
+    duracion_s = n_muestras / fs
+    resumen = {
+        "duracion_s":       round(duracion_s, 1),
+        "latidos":          int(len(picos)),
+        "fc_min":           0,
+        "fc_media":         0,
+        "fc_max":           0,
+        "pausas":           0,
+        "pausa_max_s":      0.0,
+        "pausas_detalle":   [],
+    }
+    if len(picos) < 2:
+        return resumen
+
+    rr = np.diff(picos).astype(np.float64) / fs
+    resumen["fc_media"] = int(round(60.0 * len(rr) / np.sum(rr)))
+
+    n_ventana = min(HOLTER_VENTANA_FC, len(rr))
+    acum = np.concatenate([[0.0], np.cumsum(rr)])
+    dur_ventanas = acum[n_ventana:] - acum[:-n_ventana]
+    fc_ventanas = 60.0 * n_ventana / dur_ventanas
+    resumen["fc_min"] = int(round(np.min(fc_ventanas)))
+    resumen["fc_max"] = int(round(np.max(fc_ventanas)))
+
+    idx_pausa = np.flatnonzero(rr >= HOLTER_PAUSA_S)
+    if len(idx_pausa):
+        resumen["pausas"] = int(len(idx_pausa))
+        resumen["pausa_max_s"] = round(float(np.max(rr[idx_pausa])), 2)
+        mayores = idx_pausa[np.argsort(rr[idx_pausa])[::-1][:10]]
+        resumen["pausas_detalle"] = [
+            {"inicio_s": round(float(picos[i] / fs), 2),
+             "duracion_s": round(float(rr[i]), 2)}
+            for i in np.sort(mayores)
+        ]
+    return resumen
+
+
+def analizar_holter_completo(senal_int16: np.ndarray, fs: float = 500,
+                             bloque_s: float = HOLTER_BLOQUE_S, progreso=None,
+                             analizador: AnalizadorHolterStream = None):
+    """
+    Recorre todo el registro en bloques de `bloque_s` segundos.
+    `senal_int16` puede ser un frombuffer/memmap, vector o matriz (muestras
+    × canales): cada bloque se convierte a float64 por separado, nunca el
+    registro entero. Con `analizador` (ver analizar_holter_trozos) solo se
+    recorre lo que queda desde su n_muestras.
+    Devuelve (analizador, resumen).
+    """
+    n_canales = senal_int16.shape[1] if senal_int16.ndim == 2 else 1
+    tam = max(1, int(bloque_s * fs))
+    desde = analizador.n_muestras if analizador is not None else 0
+    return analizar_holter_trozos((b for _, b in ventanas(senal_int16[desde:], tam)),
+                                  fs, n_canales, bloque_s, progreso, analizador)
+
+
+def _a_procesar(bloque: np.ndarray, n_canales: int) -> np.ndarray:
+    # Una matriz de un solo canal se analiza como vector
+    return bloque[:, 0] if bloque.ndim == 2 and n_canales == 1 else bloque
+
+
+def avanzar_holter(analizador: AnalizadorHolterStream, fotogramas: np.ndarray,
+                   bloque_s: float = HOLTER_BLOQUE_S) -> np.ndarray:
+    """
+    Pasa por el analizador `fotogramas` (muestras × canales), que deben
+    ser bloques enteros de `bloque_s` salvo el último trozo del registro:
+    el mismo troceo que analizar_holter_trozos, así que alternar ambas
+    sobre un mismo registro da el mismo resultado. Devuelve los picos nuevos.
+    """
+    n_canales = fotogramas.shape[1] if fotogramas.ndim == 2 else 1
+    tam = max(1, int(bloque_s * analizador.fs))
+    nuevos = [analizador.procesar(_a_procesar(bloque, n_canales))
+              for _, bloque in ventanas(fotogramas, tam)]
+    return np.concatenate(nuevos) if nuevos else np.empty(0, dtype=np.int64)
+
+
+def analizar_holter_trozos(trozos, fs: float = 500, n_canales: int = 1,
+                           bloque_s: float = HOLTER_BLOQUE_S, progreso=None,
+                           analizador: AnalizadorHolterStream = None):
+    """
+    Como analizar_holter_completo, con las muestras llegando en trozos de
+    cualquier tamaño.
+    Se reagrupan en bloques de `bloque_s` para que la normalización por
+    bloque de combinar_canales, y por tanto el resultado, sean los mismos
+    que con el archivo entero.
+    progreso: llamada opcional con las muestras procesadas tras cada bloque
+    (puede lanzar una excepción para abandonar el análisis).
+    analizador: uno ya alimentado con bloques enteros del principio del
+    registro (avanzar_holter); los trozos continúan donde lo dejó.
+    Devuelve (analizador, resumen).
+    """
+    if analizador is None:
+        analizador = AnalizadorHolterStream(fs)
+    tam = max(1, int(bloque_s * fs))
+    pendientes, n_pendientes = [], 0
+
+    for trozo in trozos:
+        pendientes.append(trozo)
+        n_pendientes += len(trozo)
+        if n_pendientes < tam:
+            continue
+        acumulado = np.concatenate(pendientes) if len(pendientes) > 1 else pendientes[0]
+        n_listos = n_pendientes - n_pendientes % tam
+        for inicio in range(0, n_listos, tam):
+            analizador.procesar(_a_procesar(acumulado[inicio:inicio + tam], n_canales))
+            if progreso is not None:
+                progreso(analizador.n_muestras)
+        pendientes = [acumulado[n_listos:]]
+        n_pendientes -= n_listos
+    if n_pendientes:
+        analizador.procesar(_a_procesar(np.concatenate(pendientes), n_canales))
+    analizador.finalizar()
+    if progreso is not None:
+        progreso(analizador.n_muestras)
+    return analizador, analizador.resumen()
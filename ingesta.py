@@ -0,0 +1,77 @@
+"""
+MediSumma — Ingesta de registros Holter
+Vuelca la subida a un archivo temporal por trozos y la abre como np.memmap
+int16 de solo lectura: el registro nunca se materializa en RAM del worker,
+las etapas posteriores leen ventanas como vistas sin copia y los procesos
+del pool reciben una ruta en lugar de cientos de MB serializados.
+
+    MEDISUMMA_TMP   directorio de los temporales (por defecto: el del sistema)
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+INGESTA_TROZO  = 1 << 20   # bytes leídos de la subida por iteración
+INGESTA_DIR    = os.environ.get("MEDISUMMA_TMP") or tempfile.gettempdir()
+
+
+async def volcar_subida(file, sufijo: str = ".dat", huella=None) -> str:
+    """
+    Copia un UploadFile a un temporal propio, trozo a trozo.
+    huella: objeto hashlib opcional que se alimenta con los mismos trozos.
+    Devuelve la ruta; el llamador la borra con descartar() al terminar.
+    """
+    destino, ruta = abrir_temporal(sufijo)
+    try:
+        with destino:
+            while True:
+                trozo = await file.read(INGESTA_TROZO)
+                if not trozo:
+                    break
+                destino.write(trozo)
+                if huella is not None:
+                    huella.update(trozo)
+    except BaseException:
+        descartar(ruta)
+        raise
+    return ruta
+
+
+def abrir_temporal(sufijo: str = ".dat"):
+    """Temporal propio para volcar una subida → (archivo binario abierto, ruta)."""
+    fd, ruta = tempfile.mkstemp(prefix="medisumma_", suffix=sufijo,
+                                dir=INGESTA_DIR)
+    return os.fdopen(fd, "wb"), ruta
+
+
+def descartar(ruta: str):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def abrir_int16(ruta: str) -> np.ndarray:
+    """
+    Abre un archivo de muestras int16 little-endian como memmap de solo lectura.
+    Lanza ValueError si el tamaño no es múltiplo de 2 bytes.
+    """
+    tam = os.path.getsize(ruta)
+    if tam % 2:
+        raise ValueError(f"tamaño de {tam} bytes no es múltiplo de int16")
+    if tam == 0:
+        return np.empty(0, dtype="<i2")
+    return np.memmap(ruta, dtype="<i2", mode="r")
+
+
+def ventanas(senal: np.ndarray, tam: int, paso: int = None):
+    """
+    Recorre la señal en ventanas de `tam` muestras avanzando `paso`
+    (por defecto sin solape). Cada ventana es una vista: no copia datos.
+    Produce (inicio, vista).
+    """
+    paso = paso or tam
+    for inicio in range(0, len(senal), paso):
+        yield inicio, senal[inicio:inicio + tam]
@@ -0,0 +1,193 @@
+"""
+MediSumma — Motor de intervalos por lotes
+Mide QRS, PR, QT y ST de todos los latidos a la vez: por cada ventana de
+interés se construye una matriz (latidos × muestras) de segmentos alineados
+alrededor de los picos R y las búsquedas (cruces de umbral, máximos locales,
+retorno a la línea de base) se resuelven con operaciones de array.
+Mismos criterios que el barrido latido a latido original; los latidos se
+procesan en lotes para acotar la memoria en registros Holter largos.
+"""
+
+import numpy as np
+
+INTERVALOS_LOTE = 2048   # latidos por lote de matrices
+
+
+def _segmentos(senal: np.ndarray, inicios: np.ndarray, ancho: int,
+               paso: int = 1):
+    """
+    Matriz (latidos × ancho) con senal[inicio + paso·k] y el vector k;
+    los índices fuera de la señal se recortan al borde (el llamador los
+    enmascara).
+    """
+    k = np.arange(ancho)
+    idx = inicios[:, None] + paso * k[None, :]
+    return senal[np.clip(idx, 0, len(senal) - 1)], k
+
+
+def _primer_verdadero(cond: np.ndarray):
+    """Índice del primer True por fila y si existe alguno."""
+    hay = cond.any(axis=1)
+    return np.argmax(cond, axis=1), hay
+
+
+def _maximos_locales(seg: np.ndarray, largo: np.ndarray) -> np.ndarray:
+    """
+    Máximos locales por fila dentro de seg[:, :largo], con la regla de
+    find_peaks: subida antes, bajada después; en una meseta el pico es su
+    muestra central; los extremos de la ventana nunca son pico.
+    """
+    m, ancho = seg.shape
+    if ancho < 3:
+        return np.zeros_like(seg, dtype=bool)
+    d = np.sign(np.diff(seg, axis=1))
+    d[np.arange(ancho - 1)[None, :] + 1 >= largo[:, None]] = 0
+    col = np.arange(ancho - 1)
+    # Último cambio no nulo a la izquierda y primero a la derecha de cada muestra
+    izq = np.maximum.accumulate(np.where(d != 0, col, -1), axis=1)
+    der = np.where(d != 0, col, ancho)[:, ::-1]
+    der = np.minimum.accumulate(der, axis=1)[:, ::-1]
+    filas = np.arange(m)[:, None]
+    i = np.arange(1, ancho - 1)[None, :]
+    l_idx = izq[:, :-1]          # último no nulo en d[:, :i]
+    r_idx = der[:, 1:]           # primero no nulo en d[:, i:]
+    sube = (l_idx >= 0) & (d[filas, np.maximum(l_idx, 0)] > 0)
+    baja = (r_idx < ancho - 1) & (d[filas, np.minimum(r_idx, ancho - 2)] < 0)
+    centro = i == (l_idx + 1 + r_idx) // 2
+    picos = np.zeros_like(seg, dtype=bool)
+    picos[:, 1:-1] = sube & baja & centro
+    return picos
+
+
+def _medias_ventana(acum: np.ndarray, ini: np.ndarray, fin: np.ndarray):
+    """Media de senal[ini:fin] por latido con la suma acumulada (NaN si vacía)."""
+    n = fin - ini
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = (acum[np.maximum(fin, 0)] - acum[np.maximum(ini, 0)]) / n
+    return np.where(n > 0, media, np.nan)
+
+
+def _ms(muestras, fs: float) -> np.ndarray:
+    return np.round(muestras / fs * 1000)
+
+
+def _medir_lote(senal, acum, p, fs):
+    n = len(senal)
+    amp_r = senal[p]
+    umbral = 0.15 * amp_r
+
+    w12 = int(0.12 * fs)
+    w22, w06, w15, w05 = int(0.22 * fs), int(0.06 * fs), int(0.15 * fs), int(0.05 * fs)
+    w60, w20, w08 = int(0.60 * fs), int(0.20 * fs), int(0.08 * fs)
+
+    # ── Inicio y fin QRS: primer cruce del 15 % de R hacia cada lado ──────
+    ancho_q = max(1, w12 - 1)
+    seg, k = _segmentos(senal, p - 1, ancho_q, paso=-1)
+    pos = (p - 1)[:, None] - k[None, :]
+    valido = (k[None, :] + 1 < w12) & (pos > 0)
+    j, hay = _primer_verdadero((seg <= umbral[:, None]) & valido)
+    ini_qrs = np.where(hay, p - 1 - j, p)
+
+    seg, k = _segmentos(senal, p + 1, ancho_q)
+    pos = (p + 1)[:, None] + k[None, :]
+    valido = (k[None, :] + 1 < w12) & (pos < n - 1)
+    j, hay = _primer_verdadero((seg <= umbral[:, None]) & valido)
+    fin_qrs = np.where(hay, p + 1 + j, p)
+
+    qrs_ms = _ms(fin_qrs - ini_qrs, fs)
+    qrs_ms = np.where((qrs_ms >= 30) & (qrs_ms <= 250), qrs_ms, np.nan)
+
+    # ── Onda P: máximo local más alto 220–60 ms antes del inicio QRS ──────
+    vp0 = np.maximum(0, ini_qrs - w22)
+    vp1 = np.maximum(0, ini_qrs - w06)
+    largo_p = vp1 - vp0
+    ancho_p = max(3, w22 - w06)
+    seg, k = _segmentos(senal, vp0, ancho_p)
+    candidatos = _maximos_locales(seg, largo_p) & \
+        (seg >= np.maximum(0.05 * amp_r, 0.0)[:, None])
+    alturas = np.where(candidatos, seg, -np.inf)
+    mejor_p = np.argmax(alturas, axis=1)
+    hay_p = candidatos.any(axis=1) & (largo_p >= 5)
+    pos_p = np.where(hay_p, vp0 + mejor_p, -1)
+    pr_ms = _ms(ini_qrs - pos_p, fs)
+    pr_ok = hay_p & (pr_ms >= 60) & (pr_ms <= 400)
+    pr_ms = np.where(pr_ok, pr_ms, np.nan)
+
+    # ── Onda T: máximo absoluto tras el ST, fin al volver a la base ───────
+    vt0 = fin_qrs + max(1, w05)
+    vt1 = np.minimum(n - 1, p + w60)
+    largo_t = vt1 - vt0
+    ancho_t = max(1, w60 - max(1, w05))
+    seg, k = _segmentos(senal, vt0, ancho_t)
+    dentro = k[None, :] < largo_t[:, None]
+    amp_abs = np.where(dentro, np.abs(seg), -np.inf)
+    pico_t = np.argmax(amp_abs, axis=1)
+    hay_t = (largo_t >= 5) & (np.max(amp_abs, axis=1) >= 0.05 * amp_r)
+    pos_t = vt0 + pico_t
+
+    base_t = np.where(ini_qrs > w15,
+                      _medias_ventana(acum, np.maximum(0, ini_qrs - w15),
+                                      np.maximum(1, ini_qrs - w05)),
+                      0.0)
+    ancho_ft = max(1, w20)
+    seg, k = _segmentos(senal, pos_t, ancho_ft)
+    valido = (pos_t[:, None] + k[None, :]) < np.minimum(n - 1, pos_t + w20)[:, None]
+    with np.errstate(invalid="ignore"):
+        cerca = np.abs(seg - base_t[:, None]) < (0.08 * amp_r)[:, None]
+    j, hay = _primer_verdadero(cerca & valido)
+    fin_t = np.where(hay, pos_t + j, pos_t)
+    qt_ms = _ms(fin_t - ini_qrs, fs)
+    qt_ok = hay_t & (qt_ms >= 200) & (qt_ms <= 750)
+    qt_ms = np.where(qt_ok, qt_ms, np.nan)
+
+    # ── Segmento ST en J+80 ms respecto al segmento TP ────────────────────
+    j80 = fin_qrs + w08
+    base_tp = _medias_ventana(acum, np.maximum(0, ini_qrs - w20),
+                              np.maximum(1, ini_qrs - w06))
+    st_delta = np.where(j80 < n, senal[np.minimum(j80, n - 1)] - base_tp, np.nan)
+
+    return {
+        "ini_qrs":  ini_qrs,
+        "fin_qrs":  fin_qrs,
+        "qrs_ms":   qrs_ms,
+        "pos_p":    pos_p,
+        "pr_ms":    pr_ms,
+        "pos_t":    np.where(hay_t, pos_t, -1),
+        "fin_t":    np.where(hay_t, fin_t, -1),
+        "qt_ms":    qt_ms,
+        "st_delta": st_delta,
+    }
+
+
+def medir_intervalos_lote(senal: np.ndarray, picos: np.ndarray,
+                          fs: float) -> dict:
+    """
+    Intervalos latido a latido → dict de arrays de longitud len(picos).
+    Los latidos con R ≤ 0 y las mediciones fuera de rango fisiológico
+    quedan como NaN (tiempos en ms) o −1 (posiciones en muestras).
+    """
+    senal = np.asarray(senal, dtype=np.float64)
+    picos = np.asarray(picos, dtype=np.int64)
+    m = len(picos)
+    salida = {
+        "ini_qrs":  np.full(m, -1, dtype=np.int64),
+        "fin_qrs":  np.full(m, -1, dtype=np.int64),
+        "pos_p":    np.full(m, -1, dtype=np.int64),
+        "pos_t":    np.full(m, -1, dtype=np.int64),
+        "fin_t":    np.full(m, -1, dtype=np.int64),
+        "qrs_ms":   np.full(m, np.nan),
+        "pr_ms":    np.full(m, np.nan),
+        "qt_ms":    np.full(m, np.nan),
+        "st_delta": np.full(m, np.nan),
+    }
+    if m == 0 or len(senal) == 0:
+        return salida
+
+    acum = np.concatenate([[0.0], np.cumsum(senal)])
+    medibles = np.flatnonzero(senal[picos] > 0)
+    for i in range(0, len(medibles), INTERVALOS_LOTE):
+        sel = medibles[i:i + INTERVALOS_LOTE]
+        lote = _medir_lote(senal, acum, picos[sel], fs)
+        for nombre, valores in lote.items():
+            salida[nombre][sel] = valores
+    return salida
@@ -1,30 +1,42 @@
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 
+from formato_holter import abrir_registro, leer_cabecera
+
 print("--- INICIANDO LECTURA DE HOLTER ---")
 
-archivo = "holter_prueba.dat"
+archivo = sys.argv[1] if len(sys.argv) > 1 else "holter_prueba.dat"
 
 try:
-    # 1. LEER EL ARCHIVO BINARIO
-    # Le decimos a Python: "Lee este archivo asumiendo que son enteros de 16 bits (int16)"
+    # 1. ABRIR EL ARCHIVO BINARIO (memmap: solo se lee del disco lo que se usa)
+    # Si hay una cabecera WFDB (.hea) al lado, manda ella: canales, fs,
+    # ganancia y formato (16 o 212). Sin cabecera: un canal int16 a 500 Hz.
     # Esto es CRÍTICO: Si nos equivocamos de formato (ej. int32), la señal saldrá deforme.
-    datos_crudos = np.fromfile(archivo, dtype=np.int16)
-    
+    ruta_hea = os.path.splitext(archivo)[0] + ".hea"
+    cabecera = None
+    if os.path.exists(ruta_hea):
+        with open(ruta_hea, encoding="utf-8") as f:
+            cabecera = leer_cabecera(f.read())
+        print(f"📄 Cabecera: {ruta_hea} (formato {cabecera['formato']})")
+    registro = abrir_registro(archivo, cabecera)
+
     print(f"✅ Archivo cargado exitosamente.")
-    print(f"📊 Muestras totales recuperadas: {len(datos_crudos)}")
-    
-    # Calcular duración real basada en la frecuencia (500 Hz)
-    fs = 500
-    duracion_minutos = (len(datos_crudos) / fs) / 60
+    print(f"📊 Muestras por canal: {registro.n_muestras} × {registro.n_canales} canal(es)")
+
+    # Calcular duración real basada en la frecuencia de la cabecera
+    fs = registro.fs
+    duracion_minutos = (registro.n_muestras / fs) / 60
     print(f"⏱️ Duración estimada del estudio: {duracion_minutos:.1f} minutos")
 
     # 2. VISUALIZAR (Haremos un Zoom)
     # No vamos a graficar todo el minuto porque se vería muy apretado.
-    # Vamos a ver solo los primeros 3 segundos (1500 muestras).
-    muestras_zoom = 1500
-    zoom_senal = datos_crudos[:muestras_zoom]
-    tiempo = np.arange(muestras_zoom) / fs
+    # Vamos a ver solo los primeros 3 segundos, en mV.
+    muestras_zoom = int(3 * fs)
+    zoom_senal = registro.a_mv(registro.muestras[:muestras_zoom])
+    tiempo = np.arange(len(zoom_senal)) / fs
 
     print("📈 Generando telemetría...")
     
@@ -32,18 +44,23 @@ try:
     ax = plt.gca()
     ax.set_facecolor('black')
     
-    # Graficamos en Cian (Cyan) estilo futurista
-    plt.plot(tiempo, zoom_senal, color='#00FFFF', linewidth=1.5)
+    # Graficamos en Cian (Cyan) estilo futurista, un canal sobre otro
+    for i, canal in enumerate(registro.canales):
+        plt.plot(tiempo, zoom_senal[:, i] - 2.0 * i, linewidth=1.5,
+                 color=('#00FFFF', '#FF00FF', '#FFFF00')[i % 3],
+                 label=canal["nombre"])
+    plt.legend(facecolor='black', labelcolor='white')
     
     plt.title(f"Visualización de Datos Crudos: {archivo}", color='white')
     plt.xlabel("Segundos", color='gray')
-    plt.ylabel("Amplitud (Digital)", color='gray')
+    plt.ylabel("Amplitud (mV, canales desplazados)", color='gray')
     plt.grid(color='#00FFFF', linestyle=':', alpha=0.2)
     plt.tick_params(colors='gray')
     
     plt.show()
+    registro.cerrar()
 
 except FileNotFoundError:
-    print("❌ ERROR: No encuentro el archivo 'holter_prueba.dat'.")
+    print(f"❌ ERROR: No encuentro el archivo '{archivo}'.")
     print("Asegúrate de haber ejecutado el paso anterior primero.")
     
\ No newline at end of file
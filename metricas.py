@@ -0,0 +1,248 @@
+"""
+MediSumma — Instrumentación por etapas
+Mide cuánto tarda cada etapa de los pipelines (decodificación, calibración,
+preprocesado, derivaciones, intervalos, diagnóstico…), la devuelve en la
+cabecera Server-Timing de cada respuesta y la agrega en histogramas que
+/metrics expone en formato de texto de Prometheus, junto con la cola del
+pool, las peticiones en vuelo y el tamaño de las subidas.
+
+Las etapas que corren en un proceso del pool se cronometran allí y viajan
+de vuelta dentro del resultado (clave CLAVE_TIEMPOS); el proceso principal
+las retira con recoger() antes de cachear o responder.
+
+Cada worker de gunicorn agrega solo sus propias peticiones.
+
+    MEDISUMMA_METRICAS   0 desactiva la instrumentación (por defecto: 1).
+                         Desactivada, etapa() devuelve un contexto nulo
+                         compartido, @cronometrado deja la función intacta
+                         y no se monta middleware ni /metrics.
+"""
+
+import contextvars
+import functools
+import os
+import time
+from contextlib import nullcontext
+
+METRICAS_ACTIVAS = os.environ.get("MEDISUMMA_METRICAS", "1") != "0"
+CLAVE_TIEMPOS = "_tiempos_ms"
+
+# Límites superiores de los histogramas (Prometheus: "le")
+BUCKETS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                    0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS_BYTES = (1 << 10, 1 << 14, 1 << 17, 1 << 20, 1 << 22, 1 << 24,
+                 1 << 26, 1 << 28)
+
+_NULO = nullcontext()
+
+
+class Cronometro:
+    """Tiempos por etapa de una petición (o de una llamada al pool), en ms."""
+
+    def __init__(self):
+        self.tiempos = {}
+        self.inicio = self.ultimo = time.perf_counter()
+        self.cerrado = False
+
+    def sumar(self, nombre: str, ms: float):
+        self.tiempos[nombre] = self.tiempos.get(nombre, 0.0) + ms
+
+    def etapa(self, nombre: str):
+        return _Etapa(self, nombre)
+
+    def tramo(self, nombre: str):
+        ahora = time.perf_counter()
+        self.sumar(nombre, (ahora - self.ultimo) * 1000)
+        self.ultimo = ahora
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.inicio) * 1000
+        partes = [f"{nombre};dur={ms:.2f}" for nombre, ms in self.tiempos.items()]
+        partes.append(f"total;dur={total:.2f}")
+        return ", ".join(partes)
+
+
+class _Etapa:
+    __slots__ = ("crono", "nombre", "t0")
+
+    def __init__(self, crono, nombre):
+        self.crono, self.nombre = crono, nombre
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.crono.sumar(self.nombre, (time.perf_counter() - self.t0) * 1000)
+        return False
+
+
+_actual = contextvars.ContextVar("medisumma_cronometro", default=None)
+
+
+def etapa(nombre: str):
+    """
+    Contexto que cronometra un bloque en el cronómetro activo (el de la
+    petición en curso o el de la llamada al pool); nulo si no hay ninguno.
+    """
+    crono = _actual.get()
+    if crono is None:
+        return _NULO
+    return crono.etapa(nombre)
+
+
+def tramo(nombre: str):
+    """
+    Cierra un tramo secuencial: atribuye a `nombre` el tiempo transcurrido
+    desde el tramo anterior (o desde el inicio). Pensado para pipelines
+    lineales, donde evita anidar cada etapa en un bloque with.
+    """
+    crono = _actual.get()
+    if crono is not None:
+        crono.tramo(nombre)
+
+
+def anotar(nombre: str, ms: float):
+    """
+    Suma al cronómetro activo un tiempo medido fuera de él (p. ej. en un
+    hilo auxiliar, que no hereda el contexto); nada si no hay ninguno.
+    """
+    crono = _actual.get()
+    if crono is not None:
+        crono.sumar(nombre, ms)
+
+
+def cronometrado(fn):
+    """
+    Decorador para funciones de pipeline que se envían al pool: activa un
+    cronómetro propio durante la llamada y, si el resultado es un dict,
+    le añade los tiempos por etapa en CLAVE_TIEMPOS.
+    """
+    if not METRICAS_ACTIVAS:
+        return fn
+
+    @functools.wraps(fn)
+    def envoltura(*args, **kwargs):
+        crono = Cronometro()
+        token = _actual.set(crono)
+        try:
+            resultado = fn(*args, **kwargs)
+        finally:
+            _actual.reset(token)
+        if isinstance(resultado, dict):
+            resultado[CLAVE_TIEMPOS] = crono.tiempos
+        return resultado
+
+    return envoltura
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# AGREGACIÓN
+# ─────────────────────────────────────────────────────────────────────────────
+
+class Histograma:
+    """Histograma acumulativo con etiquetas, al estilo de Prometheus."""
+
+    def __init__(self, nombre: str, ayuda: str, etiqueta: str, buckets: tuple):
+        self.nombre, self.ayuda, self.etiqueta = nombre, ayuda, etiqueta
+        self.buckets = buckets
+        self.series = {}  # valor de etiqueta → [conteos por bucket, suma, n]
+
+    def observar(self, valor_etiqueta: str, valor: float):
+        serie = self.series.get(valor_etiqueta)
+        if serie is None:
+            serie = self.series[valor_etiqueta] = [[0] * len(self.buckets), 0.0, 0]
+        conteos = serie[0]
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                conteos[i] += 1
+                break
+        serie[1] += valor
+        serie[2] += 1
+
+    def exponer(self) -> list:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}",
+                  f"# TYPE {self.nombre} histogram"]
+        for valor_etiqueta, (conteos, suma, n) in sorted(self.series.items()):
+            et = f'{self.etiqueta}="{valor_etiqueta}"'
+            acumulado = 0
+            for limite, c in zip(self.buckets, conteos):
+                acumulado += c
+                lineas.append(f'{self.nombre}_bucket{{{et},le="{limite:g}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{et},le="+Inf"}} {n}')
+            lineas.append(f"{self.nombre}_sum{{{et}}} {suma:.6f}")
+            lineas.append(f"{self.nombre}_count{{{et}}} {n}")
+        return lineas
+
+
+etapas = Histograma("medisumma_etapa_segundos",
+                    "Duración de cada etapa de análisis", "etapa",
+                    BUCKETS_SEGUNDOS)
+peticiones = Histograma("medisumma_peticion_segundos",
+                        "Duración total de la petición por ruta", "ruta",
+                        BUCKETS_SEGUNDOS)
+cargas = Histograma("medisumma_carga_bytes",
+                    "Tamaño del cuerpo de la petición por ruta", "ruta",
+                    BUCKETS_BYTES)
+en_vuelo = 0
+
+
+def recoger(resultado):
+    """
+    Retira del resultado los tiempos medidos en el pool y los suma al
+    cronómetro de la petición en curso. Si la respuesta ya salió (cuerpo
+    en streaming, como el lote NDJSON) van directos a los histogramas.
+    """
+    if not isinstance(resultado, dict):
+        return resultado
+    tiempos = resultado.pop(CLAVE_TIEMPOS, None)
+    if tiempos:
+        crono = _actual.get()
+        for nombre, ms in tiempos.items():
+            if crono is not None and not crono.cerrado:
+                crono.sumar(nombre, ms)
+            else:
+                etapas.observar(nombre, ms / 1000)
+    return resultado
+
+
+def exponer(medidores: dict) -> str:
+    """
+    Texto de exposición de Prometheus: histogramas + medidores que el
+    llamador lee en el momento del scrape, {nombre: (tipo, ayuda, valor)}
+    con tipo 'gauge' o 'counter'.
+    """
+    lineas = ["# HELP medisumma_peticiones_en_vuelo Peticiones HTTP en curso",
+              "# TYPE medisumma_peticiones_en_vuelo gauge",
+              f"medisumma_peticiones_en_vuelo {en_vuelo}"]
+    for nombre, (tipo, ayuda, valor) in medidores.items():
+        lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}",
+                   f"{nombre} {valor}"]
+    for hist in (etapas, peticiones, cargas):
+        lineas += hist.exponer()
+    return "\n".join(lineas) + "\n"
+
+
+async def middleware_tiempos(request, call_next):
+    """
+    Middleware HTTP: cronómetro por petición, cabecera Server-Timing,
+    duración y tamaño de carga por ruta, y contador de peticiones en vuelo.
+    """
+    global en_vuelo
+    crono = Cronometro()
+    token = _actual.set(crono)
+    en_vuelo += 1
+    try:
+        respuesta = await call_next(request)
+    finally:
+        en_vuelo -= 1
+        _actual.reset(token)
+    crono.cerrado = True
+    for nombre, ms in crono.tiempos.items():
+        etapas.observar(nombre, ms / 1000)
+    ruta = getattr(request.scope.get("route"), "path", "otra")
+    peticiones.observar(ruta, time.perf_counter() - crono.inicio)
+    longitud = request.headers.get("content-length")
+    if longitud and longitud.isdigit():
+        cargas.observar(ruta, int(longitud))
+    respuesta.headers["Server-Timing"] = crono.server_timing()
+    return respuesta
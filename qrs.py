@@ -0,0 +1,310 @@
+"""
+MediSumma — Detector QRS en línea (Pan-Tompkins)
+Un solo detector para todas las rutas: el monitor en vivo le pasa cada
+trama, el Holter cada bloque y la foto la tira entera (detectar_qrs, que
+no es más que un push seguido de finalizar).
+
+    pasa-banda 5–15 Hz causal (FiltroEstado) → derivada de 5 puntos →
+    cuadrado → integración en ventana móvil de 150 ms (MWI)
+
+Los máximos de la MWI dentro de ± un periodo refractario son candidatos
+(un criterio local: se decide igual llegue la señal en un trozo o en
+muchos); se clasifican como QRS o ruido con dos niveles adaptativos
+(medias exponenciales de los picos de señal y de ruido) y el umbral que
+sale de ellos. Además:
+    · un candidato a menos de 360 ms del QRS anterior y con menos de la
+      mitad de su pendiente máxima es una onda T;
+    · si pasan 1,66 RR medios sin QRS, se recupera el mayor candidato
+      descartado que supere la mitad del umbral (search-back). Esos
+      latidos llegan tarde: tras el último push, en `recuperados`.
+La posición R se busca en la señal de entrada alrededor del máximo del
+pasa-banda, descontado su retardo de grupo; el periodo refractario se
+respeta también entre posiciones R. Una señal plana (ceros, continua) no
+da candidatos: su MWI es solo error de redondeo (QRS_PLANA).
+
+Todo el estado vive en anillos duplicados preasignados (Anillo): cada push
+cuesta O(muestras nuevas) más una constante, dure lo que dure el registro.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+from scipy.signal import find_peaks, group_delay, sos2tf
+
+from filtros import FiltroEstado, obtener_sos
+
+QRS_BANDA         = (5.0, 15.0)  # Hz — pasa-banda de Pan-Tompkins
+QRS_VENTANA_S     = 0.15   # s — integración en ventana móvil
+QRS_REFRACTARIO_S = 0.2    # s — tras un QRS no puede haber otro
+QRS_ONDA_T_S      = 0.36   # s — tras un QRS se comprueba si es onda T
+QRS_SEARCHBACK    = 1.66   # RR medios sin QRS antes de buscar hacia atrás
+QRS_RR_MEDIO      = 8      # RR promediados para el search-back
+QRS_RR_INICIAL_S  = 1.0    # s — RR supuesto mientras no hay dos latidos
+QRS_APRENDIZAJE_S = 2.0    # s iniciales para fijar los niveles
+QRS_REFINAR_S     = 0.05   # s — ± alrededor del QRS para situar la R
+QRS_ANILLO_S      = 4.0    # s de historia en los anillos (en vivo)
+QRS_ANILLO_LOTE_S = 32.0   # ídem con bloques grandes: menos trozos por push
+QRS_CANDIDATOS    = 32     # candidatos de ruido guardados para el search-back
+QRS_PLANA         = 1e-8   # pasa-banda / amplitud de entrada por debajo: señal plana
+
+
+class Anillo:
+    """
+    Anillo duplicado de tamaño fijo: cada elemento se escribe en i y en
+    i + n, así que cualquier tramo de los últimos n es una vista contigua.
+    """
+
+    def __init__(self, n: int, dtype=np.float64):
+        self.n = n
+        self._datos = np.zeros(2 * n, dtype=dtype)
+        self.total = 0    # elementos escritos desde el principio
+
+    def escribir(self, valores: np.ndarray):
+        if len(valores) > self.n:
+            self.total += len(valores) - self.n
+            valores = valores[-self.n:]
+        i = self.total % self.n
+        primero = min(len(valores), self.n - i)
+        for base in (0, self.n):
+            self._datos[base + i:base + i + primero] = valores[:primero]
+            self._datos[base:base + len(valores) - primero] = valores[primero:]
+        self.total += len(valores)
+
+    def agregar(self, valor):
+        i = self.total % self.n
+        self._datos[i] = self._datos[i + self.n] = valor
+        self.total += 1
+
+    def tramo(self, i0: int, i1: int) -> np.ndarray:
+        """
+        Elementos de índice absoluto [i0, i1), con total - n <= i0 y
+        i1 <= total. Índices negativos (antes del primero) leen ceros.
+        """
+        desplazamiento = self.total % self.n + self.n - self.total
+        return self._datos[desplazamiento + i0:desplazamiento + i1]
+
+    def ultimos(self, k: int = None) -> np.ndarray:
+        k = min(self.n if k is None else k, self.total, self.n)
+        return self.tramo(self.total - k, self.total)
+
+
+@lru_cache(maxsize=32)
+def _retardo_grupo(fs: float, banda: tuple) -> int:
+    """Retardo de grupo del pasa-banda en su frecuencia central, en muestras."""
+    b, a = sos2tf(obtener_sos('band', banda, fs))
+    _, retardo = group_delay((b, a), w=[float(np.sqrt(banda[0] * banda[1]))], fs=fs)
+    return max(0, int(round(float(retardo[0]))))
+
+
+class DetectorQRS:
+    """
+    Detector QRS incremental: push(muestras) devuelve los picos R
+    confirmados (índices absolutos de muestra, crecientes) y finalizar()
+    decide los que quedan pendientes al final de la señal. Un pico se
+    confirma cuando hay un periodo refractario de señal detrás.
+    """
+
+    def __init__(self, fs: float = 500, banda=QRS_BANDA,
+                 historia_s: float = QRS_ANILLO_S):
+        banda = (banda[0], min(banda[1], 0.45 * fs))
+        self.fs = fs
+        self.filtro = FiltroEstado('band', banda, fs)
+        self.retardo = _retardo_grupo(float(fs), banda)
+        self.ventana = max(1, int(round(QRS_VENTANA_S * fs)))
+        self.refractario = max(2, int(round(QRS_REFRACTARIO_S * fs)))
+        self.onda_t = int(round(QRS_ONDA_T_S * fs))
+        self.refinar = max(1, int(round(QRS_REFINAR_S * fs)))
+        self.aprendizaje = int(QRS_APRENDIZAJE_S * fs)
+
+        # Un push se trocea a un cuarto del anillo: lo que queda por
+        # decidir (y su vecindad hacia atrás) siempre sigue en el anillo,
+        # y el aprendizaje inicial también tras el trozo que lo completa
+        margen = self.ventana + self.refractario + self.retardo + self.refinar
+        n = max(int(historia_s * fs), 8 * margen,
+                (self.aprendizaje + margen) * 4 // 3 + 1) + 4
+        self.tam_push = n // 4
+        self._x     = Anillo(n)   # entrada
+        self._bp    = Anillo(n)   # pasa-banda
+        self._cuad  = Anillo(n)   # derivada al cuadrado
+        self._mwi   = Anillo(n)   # integración en ventana móvil
+        self._rr    = Anillo(QRS_RR_MEDIO)
+        self._candidatos = np.zeros((QRS_CANDIDATOS, 4))   # (índice, pico, pendiente, R)
+        self._n_candidatos = 0
+
+        self.nivel_senal = None
+        self.nivel_ruido = 0.0
+        self.latidos = 0
+        self._amplitud = 0.0        # máximo |entrada| visto (suelo de la MWI)
+        self._revisado = 0          # índices MWI ya juzgados
+        self._ultimo = None         # índice MWI del último QRS
+        self._ultima_r = None       # y su posición R
+        self._ultima_pendiente = 0.0
+        self.recuperados = np.empty(0, dtype=np.int64)   # por search-back, último push
+        self._recuperados = []
+
+    @property
+    def n_muestras(self) -> int:
+        return self._x.total
+
+    @property
+    def umbral(self) -> float:
+        return self.nivel_ruido + 0.25 * (self.nivel_senal - self.nivel_ruido)
+
+    @property
+    def snr(self) -> float:
+        """Nivel de señal / nivel de ruido (0 mientras aprende los niveles)."""
+        if self.nivel_senal is None:
+            return 0.0
+        return self.nivel_senal / self.nivel_ruido if self.nivel_ruido > 0 else float("inf")
+
+    def push(self, muestras: np.ndarray) -> np.ndarray:
+        muestras = np.asarray(muestras, dtype=np.float64)
+        nuevos, self._recuperados = [], []
+        for i in range(0, len(muestras), self.tam_push):
+            self._avanzar(muestras[i:i + self.tam_push], nuevos)
+        self.recuperados = np.asarray(self._recuperados, dtype=np.int64)
+        return np.asarray(nuevos, dtype=np.int64)
+
+    def finalizar(self) -> np.ndarray:
+        nuevos, self._recuperados = [], []
+        if self._x.total:
+            if self.nivel_senal is None:
+                self._iniciar_niveles()
+            self._decidir(self._x.total, nuevos)
+        self.recuperados = np.asarray(self._recuperados, dtype=np.int64)
+        return np.asarray(nuevos, dtype=np.int64)
+
+    def _avanzar(self, x: np.ndarray, nuevos: list):
+        m = len(x)
+        if m:
+            self._amplitud = max(self._amplitud, float(np.max(np.abs(x))))
+        self._x.escribir(x)
+        self._bp.escribir(self.filtro.aplicar(x))
+        total = self._x.total
+        b = self._bp.tramo(total - m - 4, total)
+        d = 2 * b[4:] + b[3:-1] - b[1:-3] - 2 * b[:-4]
+        self._cuad.escribir(d * d)
+        acumulada = np.cumsum(self._cuad.tramo(total - m - self.ventana, total))
+        self._mwi.escribir((acumulada[self.ventana:] - acumulada[:m]) / self.ventana)
+
+        if self.nivel_senal is None:
+            if total < self.aprendizaje:
+                return
+            self._iniciar_niveles()
+        self._decidir(total - self.refractario, nuevos)
+
+    def _iniciar_niveles(self):
+        # Siempre los mismos QRS_APRENDIZAJE_S iniciales, llegue la señal
+        # en un push o en muchos: el resultado no depende del troceo
+        mwi = self._mwi.tramo(0, min(self.aprendizaje, self._mwi.total))
+        self.nivel_senal = float(np.max(mwi)) / 3
+        self.nivel_ruido = float(np.mean(mwi)) / 2
+
+    def _decidir(self, limite: int, nuevos: list):
+        """Juzga los máximos locales de la MWI en [_revisado, limite)."""
+        total = self._mwi.total
+        if limite > self._revisado:
+            # Vecindad de un refractario a cada lado para el máximo local
+            desde = max(self._revisado - self.refractario, total - self._mwi.n)
+            mwi = self._mwi.tramo(desde, total)
+            locales, _ = find_peaks(mwi)
+            maximo = maximum_filter1d(mwi, 2 * self.refractario + 1, mode='nearest')
+            locales = locales[mwi[locales] >= maximo[locales]] + desde
+            locales = locales[(locales >= self._revisado) & (locales < limite)]
+            # Señal plana (continua, ceros): la MWI es solo error de redondeo
+            # y los niveles adaptativos la seguirían hasta ver "latidos"
+            piso = (QRS_PLANA * self._amplitud) ** 2
+            locales = locales[mwi[locales - desde] > piso]
+            self._revisado = limite
+            if not len(locales):
+                self._buscar_atras(limite, nuevos)
+                return
+            # Pendiente y posición R de todos los candidatos de una vez;
+            # el bucle solo lleva la lógica de umbrales, que es secuencial
+            picos = mwi[locales - desde]
+            pendientes = np.sqrt(np.max(
+                _ventanas(self._cuad, locales - self.ventana, self.ventana + 1), axis=1))
+            erres = self._localizar_r(locales)
+            for i, pico, pendiente, r in zip(locales.tolist(), picos.tolist(),
+                                             pendientes.tolist(), erres.tolist()):
+                self._buscar_atras(i, nuevos)
+                self._clasificar(i, pico, pendiente, r, nuevos)
+        self._buscar_atras(limite, nuevos)
+
+    def _clasificar(self, i: int, pico: float, pendiente: float, r: int,
+                    nuevos: list):
+        if self._ultimo is not None and (i - self._ultimo < self.refractario
+                                         or r - self._ultima_r < self.refractario):
+            return      # mismo QRS (en la MWI o ya situada la R)
+        if pico > self.umbral:
+            if (self._ultimo is not None and i - self._ultimo < self.onda_t
+                    and pendiente < 0.5 * self._ultima_pendiente):
+                self.nivel_ruido = 0.125 * pico + 0.875 * self.nivel_ruido
+                return
+            self.nivel_senal = 0.125 * pico + 0.875 * self.nivel_senal
+            self._aceptar(i, pendiente, r, nuevos)
+            return
+        self.nivel_ruido = 0.125 * pico + 0.875 * self.nivel_ruido
+        if self._n_candidatos < QRS_CANDIDATOS:
+            self._candidatos[self._n_candidatos] = (i, pico, pendiente, r)
+            self._n_candidatos += 1
+
+    def _buscar_atras(self, hasta: int, nuevos: list):
+        """Search-back: recupera el mayor candidato si falta un latido."""
+        while self._n_candidatos:
+            rr = (np.mean(self._rr.ultimos()) if self._rr.total
+                  else QRS_RR_INICIAL_S * self.fs)
+            if hasta - (self._ultimo or 0) <= QRS_SEARCHBACK * rr:
+                return
+            candidatos = self._candidatos[:self._n_candidatos]
+            j = int(np.argmax(candidatos[:, 1]))
+            i, pico, pendiente, r = candidatos[j]
+            if pico <= 0.5 * self.umbral:
+                return
+            self.nivel_senal = 0.25 * pico + 0.75 * self.nivel_senal
+            resto = candidatos[j + 1:]
+            resto = resto[(resto[:, 0] >= i + self.refractario)
+                          & (resto[:, 3] >= r + self.refractario)].copy()
+            self._aceptar(int(i), pendiente, int(r), nuevos)
+            self._recuperados.append(int(r))
+            self._candidatos[:len(resto)] = resto
+            self._n_candidatos = len(resto)
+
+    def _aceptar(self, i: int, pendiente: float, r: int, nuevos: list):
+        if self._ultimo is not None:
+            self._rr.agregar(i - self._ultimo)
+        self._ultimo = i
+        self._ultima_r = r
+        self._ultima_pendiente = pendiente
+        self._n_candidatos = 0
+        self.latidos += 1
+        nuevos.append(r)
+
+    def _localizar_r(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Máximo de la entrada en la ventana de integración que dio cada
+        máximo de la MWI (descontado el retardo del pasa-banda, con
+        QRS_REFINAR_S de holgura): cubre también un QRS ancho, cuyo máximo
+        de la MWI llega bastante después de la R.
+        """
+        largo = self.ventana + 2 * self.refinar + 1
+        total = self._x.total
+        a = np.clip(indices - self.ventana - self.retardo - self.refinar,
+                    max(0, total - self._x.n), max(0, total - largo))
+        erres = a + np.argmax(_ventanas(self._x, a, largo), axis=1)
+        return np.minimum(erres, total - 1)
+
+
+def _ventanas(anillo: Anillo, inicios: np.ndarray, largo: int) -> np.ndarray:
+    """Matriz (len(inicios) × largo) de tramos del anillo, por índice absoluto."""
+    base = anillo.total - anillo.n
+    datos = anillo.tramo(base, anillo.total)
+    return datos[(inicios - base)[:, None] + np.arange(largo)]
+
+
+def detectar_qrs(senal: np.ndarray, fs: float) -> np.ndarray:
+    """Picos R de una señal completa en memoria (vector)."""
+    detector = DetectorQRS(fs, historia_s=QRS_ANILLO_LOTE_S)
+    picos = detector.push(senal)
+    return np.concatenate([picos, detector.finalizar()])
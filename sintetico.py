@@ -0,0 +1,157 @@
+"""
+MediSumma — ECG sintético en papel
+Renderiza una hoja de 12 derivaciones (3 filas × 4 columnas de 2,5 s) más la
+tira de ritmo en DII, a 25 mm/s y 10 mm/mV, con el latido PQRST de
+cerebro.crear_latido. Permite variar resolución, color de cuadrícula,
+rotación, ruido y gradiente de iluminación para simular fotos de móvil;
+es la entrada reproducible del benchmark (benchmark.py).
+"""
+
+import cv2
+import numpy as np
+
+from cerebro import crear_latido
+
+VELOCIDAD_MM_S = 25.0   # mm/s
+GANANCIA_MM_MV = 10.0   # mm/mV
+ANCHO_MM       = 270.0  # 4 columnas de 62,5 mm + márgenes
+ALTO_MM        = 200.0
+MARGEN_MM      = 10.0
+BASES_MM       = (40.0, 85.0, 130.0, 175.0)   # línea de base de cada fila
+
+LAYOUT = [
+    ["I",   "aVR", "V1", "V4"],
+    ["II",  "aVL", "V2", "V5"],
+    ["III", "aVF", "V3", "V6"],
+]
+
+# Escala del latido modelo por derivación (eje ~60°, progresión precordial)
+GANANCIA_DERIVACION = {
+    "I": 0.55, "II": 1.0, "III": 0.5, "aVR": -0.75, "aVL": 0.15, "aVF": 0.75,
+    "V1": -0.45, "V2": -0.2, "V3": 0.5, "V4": 1.1, "V5": 1.0, "V6": 0.8,
+}
+
+# (línea fina, línea gruesa) en BGR
+COLORES_CUADRICULA = {
+    "rosa":  ((200, 200, 255), (140, 140, 240)),
+    "rojo":  ((165, 165, 250), (80, 80, 220)),
+    "verde": ((200, 235, 200), (110, 190, 110)),
+    "gris":  ((215, 215, 215), (150, 150, 150)),
+}
+
+
+def senal_latidos(fc: float, duracion_s: float, fs: float,
+                  variabilidad: float = 0.0, rng=None):
+    """
+    Señal en mV con latidos de crear_latido cada 60/fc s (± variabilidad
+    relativa del RR). Cada latido se evalúa en toda la ventana: sus
+    gaussianas decaen solas, sin recortes entre latidos.
+    Devuelve (señal, instantes de los picos R en s).
+    """
+    rng = rng or np.random.default_rng(0)
+    rr = 60.0 / fc
+    n_latidos = int(duracion_s / rr) + 3
+    rrs = rr * (1.0 + variabilidad * rng.standard_normal(n_latidos))
+    # El pico R del modelo está en t = 0,40 s del latido
+    inicios = np.cumsum(rrs) - rr - 0.40
+    t = np.arange(int(duracion_s * fs)) / fs
+    senal = np.zeros_like(t)
+    for inicio in inicios:
+        local = t - inicio
+        ventana = (local > -0.1) & (local < 1.1)
+        senal[ventana] += crear_latido(local[ventana])
+    picos = inicios + 0.40
+    return senal, picos[(picos >= 0) & (picos < duracion_s)]
+
+
+def _dibujar_cuadricula(alto: int, ancho: int, px_mm: float, colores) -> np.ndarray:
+    fina, gruesa = colores
+    papel = np.full((alto, ancho, 3), 252, dtype=np.uint8)
+    grosor_fino = max(1, int(round(px_mm / 10)))
+    grosor_grueso = max(grosor_fino + 1, int(round(px_mm / 6)))
+    for eje, largo in ((0, alto), (1, ancho)):
+        n_mm = int(largo / px_mm) + 1
+        for mm in range(n_mm):
+            gruesa_ = mm % 5 == 0
+            p = int(round(mm * px_mm))
+            g = grosor_grueso if gruesa_ else grosor_fino
+            sl = slice(p, min(largo, p + g))
+            color = gruesa if gruesa_ else fina
+            if eje == 0:
+                papel[sl, :] = color
+            else:
+                papel[:, sl] = color
+    return papel
+
+
+def renderizar_ecg(px_mm: float = 8.0, fc: float = 75, cuadricula: str = "rosa",
+                   rotacion_grados: float = 0.0, ruido: float = 0.0,
+                   gradiente: float = 0.0, variabilidad: float = 0.02,
+                   semilla: int = 0):
+    """
+    Hoja ECG sintética en BGR y su verdad de referencia.
+    px_mm: resolución (px por mm de papel); ruido: sigma del ruido gaussiano
+    en niveles de gris; gradiente: oscurecimiento relativo máximo de la
+    iluminación (0 = uniforme, 0.5 = una esquina a media luz).
+    Devuelve (imagen, verdad) con verdad = {fc, px_mm, picos_r_s}.
+    """
+    rng = np.random.default_rng(semilla)
+    alto, ancho = int(ALTO_MM * px_mm), int(ANCHO_MM * px_mm)
+    img = _dibujar_cuadricula(alto, ancho, px_mm, COLORES_CUADRICULA[cuadricula])
+
+    fs = px_mm * VELOCIDAD_MM_S          # una muestra por píxel horizontal
+    duracion = 10.0
+    base, picos = senal_latidos(fc, duracion, fs, variabilidad, rng)
+    x0 = MARGEN_MM * px_mm
+    grosor = max(2, int(round(0.3 * px_mm)))
+    n_col = int(2.5 * fs)
+
+    def trazar(senal_mv, x_inicio, y_base_mm):
+        xs = x_inicio + np.arange(len(senal_mv))
+        ys = y_base_mm * px_mm - senal_mv * GANANCIA_MM_MV * px_mm
+        pts = np.round(np.stack([xs, ys], axis=1) * 16).astype(np.int32)
+        cv2.polylines(img, [pts.reshape(-1, 1, 2)], False, (30, 30, 30),
+                      grosor, cv2.LINE_AA, shift=4)
+
+    for fila, derivaciones in enumerate(LAYOUT):
+        for col, nombre in enumerate(derivaciones):
+            tramo = base[col * n_col:(col + 1) * n_col] * GANANCIA_DERIVACION[nombre]
+            trazar(tramo, x0 + col * n_col, BASES_MM[fila])
+    trazar(base[:4 * n_col], x0, BASES_MM[3])   # tira de ritmo DII
+
+    # Iluminación: rampa lineal en una dirección aleatoria
+    if gradiente > 0:
+        ang = rng.uniform(0, 2 * np.pi)
+        yy, xx = np.mgrid[0:alto, 0:ancho].astype(np.float32)
+        rampa = (np.cos(ang) * xx / ancho + np.sin(ang) * yy / alto)
+        rampa = (rampa - rampa.min()) / max(1e-6, np.ptp(rampa))
+        img = (img * (1.0 - gradiente * rampa)[..., None]).astype(np.uint8)
+
+    if rotacion_grados:
+        m = cv2.getRotationMatrix2D((ancho / 2, alto / 2), rotacion_grados, 1.0)
+        img = cv2.warpAffine(img, m, (ancho, alto), flags=cv2.INTER_LINEAR,
+                             borderValue=(245, 245, 245))
+
+    if ruido > 0:
+        img = np.clip(img + rng.normal(0, ruido, img.shape), 0, 255).astype(np.uint8)
+
+    verdad = {"fc": float(fc), "px_mm": float(px_mm),
+              "picos_r_s": np.round(picos, 3).tolist()}
+    return img, verdad
+
+
+def codificar(img: np.ndarray, formato: str = "jpg", calidad: int = 90) -> bytes:
+    """Bytes de la imagen como los subiría la app (JPEG por defecto)."""
+    parametros = [cv2.IMWRITE_JPEG_QUALITY, calidad] if formato == "jpg" else []
+    ok, buf = cv2.imencode("." + formato, img, parametros)
+    if not ok:
+        raise ValueError(f"no se pudo codificar como {formato}")
+    return buf.tobytes()
+
+
+if __name__ == "__main__":
+    import sys
+    imagen, _ = renderizar_ecg()
+    destino = sys.argv[1] if len(sys.argv) > 1 else "ecg_sintetico.jpg"
+    cv2.imwrite(destino, imagen)
+    print(f"ECG sintético guardado en '{destino}'")
@@ -0,0 +1,149 @@
+"""
+MediSumma — Subidas en streaming
+Dos piezas para que una subida grande no se acumule en la memoria del
+worker antes de hacer nada:
+
+    LimiteCuerpo        middleware ASGI con un tope de bytes por ruta: si
+                        Content-Length lo supera responde 413 sin leer el
+                        cuerpo; si no lo declara (chunked) o miente, cuenta
+                        los bytes según llegan y corta con 413 en cuanto se
+                        pasa, sin esperar al final.
+    eventos_multipart   lee un cuerpo multipart/form-data trozo a trozo y
+                        produce los eventos de cada parte, sin el volcado
+                        previo de todo el formulario que hace Starlette:
+                        quien lo consume puede escribir y analizar cada
+                        trozo mientras sigue llegando el resto.
+
+    MEDISUMMA_MAX_FOTO_MB     tope de /analizar_ecg_foto (por defecto: 20)
+    MEDISUMMA_MAX_LOTE_MB     tope de /analizar_ecg_foto_lote y /trabajos/fotos (por defecto: 200)
+    MEDISUMMA_MAX_HOLTER_MB   tope de /analizar_holter y /trabajos/holter (por defecto: 1024)
+    MEDISUMMA_MAX_MB          resto de rutas (por defecto: 2)
+"""
+
+import json
+
+from fastapi import HTTPException
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from config import real_env
+
+MB = 1024 * 1024
+SUBIDA_MAX_CAMPO = 64 * 1024   # bytes de un campo que no es archivo
+
+
+LIMITES_RUTA = {
+    "/analizar_ecg_foto":      int(real_env("MEDISUMMA_MAX_FOTO_MB", 20) * MB),
+    "/analizar_ecg_foto_lote": int(real_env("MEDISUMMA_MAX_LOTE_MB", 200) * MB),
+    "/analizar_holter":        int(real_env("MEDISUMMA_MAX_HOLTER_MB", 1024) * MB),
+}
+LIMITES_RUTA["/trabajos/fotos"] = LIMITES_RUTA["/analizar_ecg_foto_lote"]
+LIMITES_RUTA["/trabajos/holter"] = LIMITES_RUTA["/analizar_holter"]
+LIMITE_DEFECTO = int(real_env("MEDISUMMA_MAX_MB", 2) * MB)
+
+
+def _detalle(limite: int) -> str:
+    return f"Archivo demasiado grande — máximo {limite / MB:g} MB para esta ruta"
+
+
+class LimiteCuerpo:
+    """Middleware ASGI: tope de tamaño del cuerpo por ruta (HTTP 413)."""
+
+    def __init__(self, app, limites: dict = None, defecto: int = LIMITE_DEFECTO):
+        self.app = app
+        self.limites = LIMITES_RUTA if limites is None else limites
+        self.defecto = defecto
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limite = self.limites.get(scope["path"], self.defecto)
+
+        longitud = dict(scope["headers"]).get(b"content-length", b"")
+        if longitud.isdigit() and int(longitud) > limite:
+            cuerpo = json.dumps({"detail": _detalle(limite)},
+                                ensure_ascii=False).encode()
+            await send({"type": "http.response.start", "status": 413,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(cuerpo)).encode()),
+                                    (b"connection", b"close")]})
+            await send({"type": "http.response.body", "body": cuerpo})
+            return
+
+        recibido = 0
+
+        async def recibir():
+            nonlocal recibido
+            mensaje = await receive()
+            if mensaje["type"] == "http.request":
+                recibido += len(mensaje.get("body", b""))
+                if recibido > limite:
+                    # FastAPI deja pasar las HTTPException del parseo del cuerpo
+                    raise HTTPException(status_code=413, detail=_detalle(limite))
+            return mensaje
+
+        await self.app(scope, recibir, send)
+
+
+async def eventos_multipart(request):
+    """
+    Recorre un cuerpo multipart/form-data según llega. Produce:
+        ("parte", {"nombre", "archivo"})   inicio de una parte (archivo: filename o None)
+        ("datos", bytes)                   contenido de la parte en curso
+        ("fin", None)                      fin de la parte
+    Lanza HTTPException 400 si el cuerpo no es multipart o está mal formado.
+    """
+    tipo, opciones = parse_options_header(request.headers.get("content-type", ""))
+    limite = opciones.get(b"boundary")
+    if tipo != b"multipart/form-data" or not limite:
+        raise HTTPException(status_code=400,
+                            detail="Se esperaba multipart/form-data")
+
+    eventos = []
+    cabecera = {"campo": b"", "valor": b"", "disposicion": b""}
+
+    def on_header_field(datos, ini, fin):
+        cabecera["campo"] += datos[ini:fin]
+
+    def on_header_value(datos, ini, fin):
+        cabecera["valor"] += datos[ini:fin]
+
+    def on_header_end():
+        if cabecera["campo"].lower() == b"content-disposition":
+            cabecera["disposicion"] = cabecera["valor"]
+        cabecera["campo"] = cabecera["valor"] = b""
+
+    def on_headers_finished():
+        _, op = parse_options_header(cabecera["disposicion"])
+        archivo = op.get(b"filename")
+        eventos.append(("parte", {
+            "nombre": op.get(b"name", b"").decode("utf-8", "replace"),
+            "archivo": archivo.decode("utf-8", "replace") if archivo is not None else None,
+        }))
+        cabecera["disposicion"] = b""
+
+    def on_part_data(datos, ini, fin):
+        eventos.append(("datos", bytes(datos[ini:fin])))
+
+    def on_part_end():
+        eventos.append(("fin", None))
+
+    parser = MultipartParser(limite, callbacks={
+        "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data, "on_part_end": on_part_end})
+    try:
+        async for trozo in request.stream():
+            parser.write(trozo)
+            listos = eventos[:]
+            eventos.clear()
+            for evento in listos:
+                yield evento
+        parser.finalize()
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400,
+                            detail=f"Cuerpo multipart no válido: {e}") from e
+    for evento in eventos:
+        yield evento
@@ -0,0 +1,62 @@
+"""
+Sesión del monitor en vivo (monitor.SesionMonitor): puerta de calidad
+sobre ruido y marca de los latidos que llegan tarde por search-back.
+"""
+
+import numpy as np
+
+from generador_holter import GeneradorHolter
+from monitor import SesionMonitor
+
+TRAMA = 20             # muestras por trama: 40 ms a 500 Hz
+MONITOR_INICIO = 16    # latidos hasta llenar la ventana de calidad
+
+
+def _sesion(muestras_int16):
+    sesion = SesionMonitor(500)
+    picos, tardios, calidad = [], [], []
+    for i in range(0, len(muestras_int16), TRAMA):
+        trama = muestras_int16[i:i + TRAMA]
+        nuevos = sesion.procesar(trama.tobytes())
+        picos += [(int(r), sesion.n_muestras) for r in nuevos]
+        tardios += sesion.tardios.tolist()
+        if len(nuevos):
+            calidad.append(sesion.calidad_baja)
+    return sesion, picos, tardios, calidad
+
+
+def _ecg(**opciones):
+    gen = GeneradorHolter(120, semilla=2, **opciones)
+    return np.rint(gen.bloque(0, gen.n_muestras)[:, 0] * gen.ganancia).astype("<i2")
+
+
+def test_ecg_calidad_buena_y_retardo():
+    _, picos, tardios, calidad = _sesion(_ecg(extrasistoles_v=0.08))
+    assert not any(calidad[MONITOR_INICIO:])
+    tardios = set(tardios)
+    # Fuera del aprendizaje inicial, los latidos normales llegan en < 0,5 s
+    retardos = [(aviso - r) / 500 for r, aviso in picos
+                if r > 1500 and r not in tardios]
+    assert max(retardos) < 0.5
+    assert tardios
+
+
+def test_taquicardia_no_se_confunde_con_ruido():
+    _, _, _, calidad = _sesion(_ecg(fc_base=200, fc_circadiana=0))
+    assert not any(calidad[MONITOR_INICIO:])
+
+
+def test_ruido_calidad_baja():
+    rng = np.random.default_rng(0)
+    for ruido in (rng.standard_normal(60000) * 50,
+                  np.diff(rng.standard_normal(60001)) * 150):
+        _, picos, _, calidad = _sesion(np.rint(ruido).astype("<i2"))
+        assert picos                        # el detector sí "ve" latidos…
+        assert all(calidad[MONITOR_INICIO:])   # …pero no se da FC
+
+
+def test_linea_plana_sin_latidos():
+    sesion, picos, _, _ = _sesion(np.full(30000, 200, dtype="<i2"))
+    assert not picos
+    assert sesion.sin_latidos_s() == 60.0
+
@@ -0,0 +1,127 @@
+"""
+Detector QRS en línea (qrs.DetectorQRS / detectar_qrs): igualdad entre el
+análisis de la señal entera y por trozos, exactitud frente a las
+anotaciones de generador_holter y casos límite (silencio, ruido).
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from filtros import filtrar
+from formato_holter import abrir_registro
+from generador_holter import GeneradorHolter, evaluar_deteccion
+from holter_stream import combinar_canales
+from qrs import DetectorQRS, QRS_REFRACTARIO_S, detectar_qrs
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _estudio(duracion_s=120.0, semilla=1, **opciones):
+    gen = GeneradorHolter(duracion_s, semilla=semilla, **opciones)
+    senal = gen.bloque(0, gen.n_muestras)[:, 0]
+    return gen, senal, gen.anotaciones(0, gen.n_muestras)[0]
+
+
+def _por_trozos(senal, fs, tam):
+    detector = DetectorQRS(fs)
+    picos = [detector.push(senal[i:i + tam]) for i in range(0, len(senal), tam)]
+    return np.concatenate(picos + [detector.finalizar()])
+
+
+# ── Lote frente a trozos ─────────────────────────────────────────────────
+
+@pytest.mark.parametrize("tam", [1, 37, 500, 4096, 30000])
+def test_trozos_igual_que_lote(tam):
+    # Extrasístoles y pausas: también ejercita el search-back
+    gen, senal, _ = _estudio(extrasistoles_v=0.05, extrasistoles_s=0.05,
+                             pausas_hora=60, semilla=2)
+    assert np.array_equal(_por_trozos(senal, gen.fs, tam), detectar_qrs(senal, gen.fs))
+
+
+def test_trozos_igual_que_lote_con_ruido():
+    senal = np.random.default_rng(0).standard_normal(20000) * 0.02
+    assert np.array_equal(_por_trozos(senal, 500, 333), detectar_qrs(senal, 500))
+
+
+# ── Exactitud frente a las anotaciones ───────────────────────────────────
+
+@pytest.mark.parametrize("opciones", [
+    {},
+    {"fc_base": 140},
+    {"fc_base": 45},
+    {"extrasistoles_v": 0.05, "extrasistoles_s": 0.05},
+    {"fa": 1.0},
+    {"pausas_hora": 60},
+    {"ruido": 0.08, "red_hz": 50},
+], ids=["sinusal", "taquicardia", "bradicardia", "extrasistoles", "fa",
+        "pausas", "ruido"])
+@pytest.mark.parametrize("semilla", [1, 2])
+def test_sensibilidad_y_vpp(opciones, semilla):
+    gen, senal, referencia = _estudio(300, semilla, **opciones)
+    evaluacion = evaluar_deteccion(detectar_qrs(senal, gen.fs), referencia, gen.fs)
+    assert evaluacion["sensibilidad"] >= 0.99
+    assert evaluacion["vpp"] >= 0.99
+
+
+def test_picos_multicanal_combinados():
+    gen = GeneradorHolter(120, canales=("II", "V1"), semilla=2)
+    senal = filtrar(gen.bloque(0, gen.n_muestras), 'band', (0.5, 40.0), gen.fs, eje=0)
+    evaluacion = evaluar_deteccion(detectar_qrs(combinar_canales(senal), gen.fs),
+                                   gen.anotaciones(0, gen.n_muestras)[0], gen.fs)
+    assert evaluacion["sensibilidad"] >= 0.99
+    assert evaluacion["vpp"] >= 0.99
+
+
+def test_r_de_latidos_ventriculares():
+    # QRS ancho: el máximo de la MWI llega bastante después de la R
+    gen = GeneradorHolter(300, semilla=2, extrasistoles_v=0.08)
+    senal = gen.bloque(0, gen.n_muestras)[:, 0]
+    referencia, tipos = gen.anotaciones(0, gen.n_muestras)
+    picos = detectar_qrs(senal, gen.fs)
+    ventriculares = referencia[tipos == "V"]
+    cercanos = picos[np.abs(picos[None, :] - ventriculares[:, None]).argmin(axis=1)]
+    error_ms = np.abs(cercanos - ventriculares) / gen.fs * 1000
+    assert np.median(error_ms) <= 20
+
+
+# ── Registros de ejemplo del repositorio ─────────────────────────────────
+
+@pytest.mark.parametrize("archivo, latidos, fc", [
+    ("holter_prueba.dat", 10, 60),
+    ("paciente_taquicardia.dat", 22, 140),
+])
+def test_registros_de_ejemplo(archivo, latidos, fc):
+    # Los 10 s iniciales, filtrados como en el análisis rápido de /analizar_holter
+    with abrir_registro(os.path.join(RAIZ, archivo)) as registro:
+        fs = registro.fs
+        senal = registro.muestras[:int(10 * fs)].astype(np.float64)
+    senal = filtrar(senal, 'band', (0.5, 40.0), fs, eje=0)
+    senal = filtrar(senal, 'high', 0.5, fs, eje=0)
+    picos = detectar_qrs(combinar_canales(senal), fs)
+    assert len(picos) == latidos
+    assert round(60.0 / np.median(np.diff(picos) / fs)) == fc
+
+
+# ── Casos límite ─────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("senal", [
+    np.empty(0),
+    np.zeros(5000),
+    np.full(5000, 3.0),
+], ids=["vacia", "silencio", "continua"])
+def test_sin_latidos(senal):
+    assert len(detectar_qrs(senal, 500)) == 0
+    assert len(_por_trozos(senal, 500, 128)) == 0
+
+
+def test_ruido_respeta_el_refractario():
+    # Sobre ruido puro el detector adaptativo encuentra "latidos"; al menos
+    # han de ser picos válidos: crecientes, dentro de la señal y separados
+    # por el periodo refractario (la puerta de calidad es de monitor.py)
+    senal = np.random.default_rng(1).standard_normal(10000) * 0.02
+    picos = detectar_qrs(senal, 500)
+    assert np.all((picos >= 0) & (picos < len(senal)))
+    assert np.all(np.diff(picos) >= int(round(QRS_REFRACTARIO_S * 500)))
+
@@ -0,0 +1,287 @@
+"""
+MediSumma — Cola de trabajos persistente
+Los análisis largos (un Holter completo, un lote grande de fotos) no caben
+en el timeout HTTP de un cliente móvil: se envían como trabajo, se
+consultan por ID y su estado vive en un SQLite local (modo WAL), así que
+sobrevive a reinicios de gunicorn y lo comparten todos sus workers.
+
+Ciclo de vida:
+
+    pendiente ──reclamar──▶ en_curso ──terminar──▶ terminado
+        ▲                      │  └────fallar (sin reintentos)──▶ fallido
+        └──fallar / arriendo ──┘
+           vencido
+    pendiente | en_curso ──cancelar──▶ cancelado
+
+Un worker reclama un trabajo con un arriendo de TRABAJOS_ARRIENDO_S que
+renueva mientras lo ejecuta; si muere, el arriendo vence y otro lo
+reclama (hasta TRABAJOS_INTENTOS veces en total). El progreso se mide en
+las unidades del trabajo (muestras de un Holter, fotos de un lote) y lo
+escribe el propio proceso del pool, que en esa misma escritura se entera
+de una cancelación o de un arriendo perdido y abandona (TrabajoCancelado).
+
+Las entradas subidas se guardan en <TRABAJOS_DIR>/<id>/ y se borran al
+terminar; los trabajos finalizados se purgan tras TRABAJOS_RETENCION_H.
+
+    MEDISUMMA_TRABAJOS_DIR        directorio de la base y las entradas (por defecto: temporal del sistema)
+    MEDISUMMA_TRABAJOS_SIMULTANEOS trabajos en ejecución por worker (por defecto: 1)
+    MEDISUMMA_TRABAJOS_INTENTOS   ejecuciones de un trabajo antes de darlo por fallido (por defecto: 3)
+    MEDISUMMA_TRABAJOS_RETENCION_H horas que se conservan los trabajos finalizados (por defecto: 24)
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from config import entero_env
+
+TRABAJOS_DIR = (os.environ.get("MEDISUMMA_TRABAJOS_DIR")
+                or os.path.join(tempfile.gettempdir(), "medisumma_trabajos"))
+
+TRABAJOS_SIMULTANEOS = entero_env("MEDISUMMA_TRABAJOS_SIMULTANEOS", 1, minimo=1)
+TRABAJOS_INTENTOS    = entero_env("MEDISUMMA_TRABAJOS_INTENTOS", 3, minimo=1)
+TRABAJOS_RETENCION_H = entero_env("MEDISUMMA_TRABAJOS_RETENCION_H", 24, minimo=1)
+TRABAJOS_ARRIENDO_S  = 30.0    # s de arriendo; se renueva cada tercio
+TRABAJOS_SONDEO_S    = 1.0     # s entre consultas a la cola
+TRABAJOS_AVISO_S     = 1.0     # s mínimos entre escrituras de progreso
+
+ESTADOS_FINALES = ("terminado", "fallido", "cancelado")
+
+
+class TrabajoCancelado(Exception):
+    """El trabajo se canceló (o perdió su arriendo) mientras se ejecutaba."""
+
+
+class ColaTrabajos:
+    """Estado de los trabajos en SQLite, compartido entre procesos."""
+
+    def __init__(self, directorio: str = TRABAJOS_DIR,
+                 intentos: int = TRABAJOS_INTENTOS,
+                 arriendo_s: float = TRABAJOS_ARRIENDO_S):
+        self.directorio = directorio
+        self.ruta_db = os.path.join(directorio, "medisumma_trabajos.sqlite")
+        self.intentos = intentos
+        self.arriendo_s = arriendo_s
+        self._lock = threading.Lock()
+        self._conexion = None
+        self._pid = None
+
+    def _db(self):
+        # Una conexión por proceso: las conexiones SQLite no sobreviven a fork
+        if self._conexion is None or self._pid != os.getpid():
+            os.makedirs(self.directorio, exist_ok=True)
+            con = sqlite3.connect(self.ruta_db, timeout=10.0,
+                                  check_same_thread=False,
+                                  isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""CREATE TABLE IF NOT EXISTS trabajos (
+                               id         TEXT PRIMARY KEY,
+                               tipo       TEXT NOT NULL,
+                               estado     TEXT NOT NULL,
+                               parametros TEXT NOT NULL,
+                               progreso   INTEGER NOT NULL DEFAULT 0,
+                               total      INTEGER NOT NULL DEFAULT 0,
+                               unidad     TEXT NOT NULL,
+                               intentos   INTEGER NOT NULL DEFAULT 0,
+                               arriendo   REAL NOT NULL DEFAULT 0,
+                               dueno      TEXT,
+                               resultado  TEXT,
+                               error      TEXT,
+                               creado     REAL NOT NULL,
+                               actualizado REAL NOT NULL)""")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_cola "
+                        "ON trabajos(estado, creado)")
+            self._conexion, self._pid = con, os.getpid()
+        return self._conexion
+
+    def _ejecutar(self, sql: str, *args) -> int:
+        with self._lock:
+            return self._db().execute(sql, args).rowcount
+
+    # ── Entradas ─────────────────────────────────────────────────────────
+    def nuevo(self) -> tuple:
+        """ID nuevo y su directorio de entradas (ya creado) → (id, ruta)."""
+        trabajo_id = uuid.uuid4().hex
+        ruta = os.path.join(self.directorio, trabajo_id)
+        os.makedirs(ruta)
+        return trabajo_id, ruta
+
+    def entradas(self, trabajo_id: str) -> str:
+        return os.path.join(self.directorio, trabajo_id)
+
+    def borrar_entradas(self, trabajo_id: str):
+        shutil.rmtree(self.entradas(trabajo_id), ignore_errors=True)
+
+    # ── Ciclo de vida ────────────────────────────────────────────────────
+    def enviar(self, trabajo_id: str, tipo: str, parametros: dict, total: int,
+               unidad: str, resultado: dict = None):
+        """
+        Encola un trabajo cuyas entradas ya están en su directorio. Con
+        `resultado` (p. ej. de la caché) se registra ya terminado.
+        """
+        ahora = time.time()
+        estado = "pendiente" if resultado is None else "terminado"
+        self._ejecutar(
+            "INSERT INTO trabajos (id, tipo, estado, parametros, total, unidad, "
+            "progreso, resultado, creado, actualizado) VALUES (?,?,?,?,?,?,?,?,?,?)",
+            trabajo_id, tipo, estado, json.dumps(parametros), int(total), unidad,
+            0 if resultado is None else int(total),
+            None if resultado is None else json.dumps(resultado, ensure_ascii=False),
+            ahora, ahora)
+
+    def reclamar(self, dueno: str):
+        """
+        Toma el trabajo pendiente más antiguo, o uno en curso cuyo arriendo
+        venció (su worker murió). Los que agotaron sus intentos pasan a
+        fallido. Devuelve {id, tipo, parametros, total, intentos} o None.
+        """
+        with self._lock:
+            con = self._db()
+            ahora = time.time()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                con.execute(
+                    "UPDATE trabajos SET estado = 'fallido', actualizado = ?, "
+                    "error = 'el análisis se interrumpió demasiadas veces' "
+                    "WHERE estado = 'en_curso' AND arriendo < ? AND intentos >= ?",
+                    (ahora, ahora, self.intentos))
+                fila = con.execute(
+                    "SELECT id, tipo, parametros, total, intentos FROM trabajos "
+                    "WHERE estado = 'pendiente' OR (estado = 'en_curso' AND arriendo < ?) "
+                    "ORDER BY creado LIMIT 1", (ahora,)).fetchone()
+                if fila is not None:
+                    con.execute(
+                        "UPDATE trabajos SET estado = 'en_curso', dueno = ?, "
+                        "arriendo = ?, intentos = intentos + 1, actualizado = ? "
+                        "WHERE id = ?",
+                        (dueno, ahora + self.arriendo_s, ahora, fila["id"]))
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        if fila is None:
+            return None
+        return {"id": fila["id"], "tipo": fila["tipo"], "dueno": dueno,
+                "parametros": json.loads(fila["parametros"]),
+                "total": fila["total"], "intentos": fila["intentos"] + 1}
+
+    def renovar(self, trabajo_id: str, dueno: str, progreso: int = None) -> bool:
+        """
+        Prolonga el arriendo (y anota el progreso). False si el trabajo ya
+        no es de `dueno` o se canceló: quien lo ejecuta debe abandonar.
+        """
+        ahora = time.time()
+        if progreso is None:
+            return self._ejecutar(
+                "UPDATE trabajos SET arriendo = ? WHERE id = ? AND dueno = ? "
+                "AND estado = 'en_curso'",
+                ahora + self.arriendo_s, trabajo_id, dueno) == 1
+        return self._ejecutar(
+            "UPDATE trabajos SET arriendo = ?, progreso = ?, actualizado = ? "
+            "WHERE id = ? AND dueno = ? AND estado = 'en_curso'",
+            ahora + self.arriendo_s, int(progreso), ahora, trabajo_id, dueno) == 1
+
+    def terminar(self, trabajo_id: str, dueno: str, resultado: dict) -> bool:
+        return self._ejecutar(
+            "UPDATE trabajos SET estado = 'terminado', resultado = ?, "
+            "progreso = total, actualizado = ? "
+            "WHERE id = ? AND dueno = ? AND estado = 'en_curso'",
+            json.dumps(resultado, ensure_ascii=False), time.time(),
+            trabajo_id, dueno) == 1
+
+    def fallar(self, trabajo_id: str, dueno: str, error: str) -> str:
+        """Vuelve a pendiente si le quedan intentos; si no, fallido. Devuelve el estado."""
+        ahora = time.time()
+        self._ejecutar(
+            "UPDATE trabajos SET error = ?, actualizado = ?, arriendo = 0, "
+            "estado = CASE WHEN intentos < ? THEN 'pendiente' ELSE 'fallido' END "
+            "WHERE id = ? AND dueno = ? AND estado = 'en_curso'",
+            error, ahora, self.intentos, trabajo_id, dueno)
+        estado = self.consultar(trabajo_id)
+        return estado["estado"] if estado else None
+
+    def cancelar(self, trabajo_id: str):
+        """Cancela un trabajo no finalizado. Devuelve el estado que tenía, o None."""
+        with self._lock:
+            con = self._db()
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                fila = con.execute("SELECT estado FROM trabajos WHERE id = ?",
+                                   (trabajo_id,)).fetchone()
+                if fila is not None and fila["estado"] not in ESTADOS_FINALES:
+                    con.execute("UPDATE trabajos SET estado = 'cancelado', "
+                                "actualizado = ? WHERE id = ?", (time.time(), trabajo_id))
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        return None if fila is None else fila["estado"]
+
+    # ── Consulta ─────────────────────────────────────────────────────────
+    def consultar(self, trabajo_id: str):
+        """Estado y progreso de un trabajo (sin el resultado), o None."""
+        with self._lock:
+            fila = self._db().execute(
+                "SELECT id, tipo, estado, progreso, total, unidad, intentos, "
+                "error, creado, actualizado FROM trabajos WHERE id = ?",
+                (trabajo_id,)).fetchone()
+        if fila is None:
+            return None
+        estado = dict(fila)
+        estado["fraccion"] = (round(estado["progreso"] / estado["total"], 4)
+                              if estado["total"] else None)
+        return estado
+
+    def resultado(self, trabajo_id: str):
+        with self._lock:
+            fila = self._db().execute(
+                "SELECT resultado FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        return None if fila is None or fila["resultado"] is None else json.loads(fila["resultado"])
+
+    def purgar(self, retencion_h: float = TRABAJOS_RETENCION_H) -> int:
+        """Borra los trabajos finalizados hace más de `retencion_h` y sus entradas."""
+        limite = time.time() - retencion_h * 3600
+        with self._lock:
+            con = self._db()
+            ids = [f["id"] for f in con.execute(
+                "SELECT id FROM trabajos WHERE estado IN (?,?,?) AND actualizado < ?",
+                (*ESTADOS_FINALES, limite))]
+            con.executemany("DELETE FROM trabajos WHERE id = ?", [(i,) for i in ids])
+        for trabajo_id in ids:
+            self.borrar_entradas(trabajo_id)
+        return len(ids)
+
+
+class AvisoProgreso:
+    """
+    Llamada de progreso para el proceso que ejecuta un trabajo: anota las
+    unidades hechas como mucho cada TRABAJOS_AVISO_S (renovando el
+    arriendo) y lanza TrabajoCancelado si el trabajo ya no es suyo. Con
+    `total`, el progreso anotado se queda por debajo: solo terminar()
+    marca el trabajo completo.
+    """
+
+    def __init__(self, cola: ColaTrabajos, trabajo_id: str, dueno: str,
+                 total: int = None):
+        self.cola = cola
+        self.trabajo_id = trabajo_id
+        self.dueno = dueno
+        self.total = total
+        self._ultimo = 0.0
+
+    def __call__(self, hechas: int):
+        ahora = time.monotonic()
+        if ahora - self._ultimo < TRABAJOS_AVISO_S:
+            return
+        self._ultimo = ahora
+        if self.total:
+            hechas = min(hechas, self.total - 1)
+        if not self.cola.renovar(self.trabajo_id, self.dueno, hechas):
+            raise TrabajoCancelado(self.trabajo_id)